@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+""" Reference client for the SIP indicator Bloom filter.
+
+Downloads the Bloom filter of the indicators from GET /api/indicators/bloom, reads values from stdin one per line,
+and prints the ones that are probably indicators. Only those values need to be checked with the API. The filter is
+saved with its ETag, so later runs only download it again after something was written to SIP.
+
+Only the Python standard library is used, so this file can be copied to the systems that run the checks:
+
+    $ tail -F /var/log/squid/domains.log | ./bloom_client.py https://sip.local/api --type "URI - Domain Name"
+"""
+
+import argparse
+import hashlib
+import os
+import ssl
+import struct
+import sys
+import urllib.error
+import urllib.parse
+import urllib.request
+
+# Must match project/api/bloom.py.
+BLOOM_MAGIC = b'SIPB'
+BLOOM_VERSION = 1
+BLOOM_HEADER = struct.Struct('>4sBBQQ')
+
+
+def value_digest(value):
+    """ Returns the SHA256 hex digest of the lowercase value, which is what SIP adds to the filter. """
+
+    return hashlib.sha256(value.lower().encode('utf-8')).hexdigest()
+
+
+class BloomFilter:
+
+    def __init__(self, data):
+        magic, version, self.num_hashes, self.num_bits, self.count = BLOOM_HEADER.unpack_from(data)
+        if magic != BLOOM_MAGIC or version != BLOOM_VERSION:
+            raise ValueError('Not a version {} indicator Bloom filter'.format(BLOOM_VERSION))
+        self.bits = data[BLOOM_HEADER.size:]
+
+    def __contains__(self, value):
+        """ Returns True if the value is probably an indicator and False if it is definitely not. """
+
+        digest = value_digest(value)
+        h1 = int(digest[:16], 16)
+        h2 = int(digest[16:32], 16) | 1
+        for i in range(self.num_hashes):
+            position = (h1 + i * h2) % self.num_bits
+            if not self.bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+def download(url, apikey=None, params=None, cache_path=None, verify=True):
+    """ Returns the Bloom filter from the API, or the one saved at cache_path if it has not changed. """
+
+    url = url.rstrip('/') + '/indicators/bloom'
+    if params:
+        url += '?' + urllib.parse.urlencode(params)
+
+    request = urllib.request.Request(url)
+    if apikey:
+        request.add_header('Authorization', 'Apikey ' + apikey)
+
+    # The cache file holds the ETag on the first line and the filter after it.
+    cached = None
+    if cache_path and os.path.exists(cache_path):
+        with open(cache_path, 'rb') as f:
+            etag, cached = f.read().split(b'\n', 1)
+        request.add_header('If-None-Match', etag.decode('ascii'))
+
+    context = None if verify else ssl._create_unverified_context()
+    try:
+        with urllib.request.urlopen(request, context=context) as response:
+            data = response.read()
+            etag = response.headers.get('ETag')
+    except urllib.error.HTTPError as e:
+        if e.code == 304 and cached is not None:
+            return BloomFilter(cached)
+        raise
+
+    if cache_path and etag:
+        with open(cache_path + '.tmp', 'wb') as f:
+            f.write(etag.encode('ascii') + b'\n' + data)
+        os.replace(cache_path + '.tmp', cache_path)
+
+    return BloomFilter(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prints the values from stdin that are probably SIP indicators.')
+    parser.add_argument('url', help='URL of the SIP API, such as https://sip.local/api')
+    parser.add_argument('--apikey', default=os.environ.get('SIP_APIKEY'), help='Defaults to $SIP_APIKEY')
+    parser.add_argument('--cache', help='File to save the filter in between runs')
+    parser.add_argument('--false-positive-rate', type=float)
+    parser.add_argument('--insecure', action='store_true', help='Do not verify the certificate of the API')
+    parser.add_argument('--status')
+    parser.add_argument('--type')
+    args = parser.parse_args()
+
+    params = {}
+    if args.false_positive_rate:
+        params['false_positive_rate'] = args.false_positive_rate
+    if args.status:
+        params['status'] = args.status
+    if args.type:
+        params['type'] = args.type
+
+    bloom = download(args.url, apikey=args.apikey, params=params, cache_path=args.cache, verify=not args.insecure)
+    for line in sys.stdin:
+        value = line.rstrip('\r\n')
+        if value and value in bloom:
+            print(value, flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -393,6 +393,296 @@ def import_crits_campaigns():
     current_app.logger.info('CRITS IMPORT: Imported {}/{} campaigns in {}'.format(num_new_campaigns, line_count, time.time() - start))
 
 
+@cli.command()
+@click.option('--sizes', default='1000,10000,100000', help='Comma-separated list of indicator counts to benchmark')
+def benchmark_bulk_create(sizes):
+    """ Compares the ORM and the executemany bulk indicator create paths. Changes are rolled back. """
+
+    from project.api.bulk import BulkIndicatorCreator
+
+    def create_supporting_objects():
+        user = models.User(active=True,
+                           email='benchmark@localhost',
+                           first_name='Benchmark',
+                           last_name='Benchmark',
+                           password='',
+                           roles=[],
+                           username='benchmark')
+        source = models.IntelSource(value='benchmark')
+        objects = {'user': user,
+                   'type': models.IndicatorType(value='benchmark'),
+                   'confidence': models.IndicatorConfidence(value='benchmark'),
+                   'impact': models.IndicatorImpact(value='benchmark'),
+                   'status': models.IndicatorStatus(value='benchmark'),
+                   'campaigns': [models.Campaign(name='benchmark{}'.format(i)) for i in range(5)],
+                   'references': [models.IntelReference(reference='benchmark{}'.format(i), source=source, user=user)
+                                  for i in range(5)],
+                   'tags': [models.Tag(value='benchmark{}'.format(i)) for i in range(5)]}
+        db.session.add_all([objects['user'], objects['type'], objects['confidence'], objects['impact'],
+                            objects['status']] + objects['campaigns'] + objects['references'] + objects['tags'])
+        db.session.flush()
+        return objects
+
+    def create_items(size):
+        return [{'campaigns': ['benchmark{}'.format(i % 5)],
+                 'confidence': 'benchmark',
+                 'impact': 'benchmark',
+                 'references': [{'source': 'benchmark', 'reference': 'benchmark{}'.format(i % 5)}],
+                 'status': 'benchmark',
+                 'tags': ['benchmark{}'.format(i % 5), 'benchmark{}'.format((i + 1) % 5)],
+                 'type': 'benchmark',
+                 'username': 'benchmark',
+                 'value': 'benchmark{}.example.com'.format(i)} for i in range(size)]
+
+    for size in [int(s) for s in sizes.split(',')]:
+        items = create_items(size)
+
+        # ORM path: one Indicator object per item with its relationship collections.
+        objects = create_supporting_objects()
+        campaigns = {c.name: c for c in objects['campaigns']}
+        references = {r.reference: r for r in objects['references']}
+        tags = {t.value: t for t in objects['tags']}
+        start = time.time()
+        for data in items:
+            indicator = models.Indicator(case_sensitive=False,
+                                         confidence=objects['confidence'],
+                                         impact=objects['impact'],
+                                         status=objects['status'],
+                                         substring=False,
+                                         type=objects['type'],
+                                         user=objects['user'],
+                                         value=data['value'])
+            indicator.campaigns = [campaigns[c] for c in data['campaigns']]
+            indicator.references = [references[r['reference']] for r in data['references']]
+            indicator.tags = [tags[t] for t in data['tags']]
+            db.session.add(indicator)
+        db.session.flush()
+        orm_time = time.time() - start
+        db.session.rollback()
+
+        # Bulk path: multi-row INSERT statements and executemany for the mapping tables.
+        create_supporting_objects()
+        start = time.time()
+        creator = BulkIndicatorCreator()
+        creator.find_existing(items)
+        for data in items:
+            creator.add(data)
+        creator.flush()
+        bulk_time = time.time() - start
+        db.session.rollback()
+
+        current_app.logger.info('BENCHMARK: {} indicators: ORM {:.2f}s, bulk {:.2f}s ({:.1f}x)'.format(
+            size, orm_time, bulk_time, orm_time / bulk_time if bulk_time else 0))
+
+
+@cli.command()
+@click.option('--size', default=100000, help='Number of synthetic indicators to load')
+@click.option('--repeat', default=3, help='Number of times to run each filter. The fastest run is reported.')
+def benchmark_indexes(size, repeat):
+    """ Reports the query plan and time of the indicator list filters with and without the secondary indexes.
+    Changes are rolled back. """
+
+    from datetime import datetime, timedelta
+    from project.api.bulk import BulkIndicatorCreator
+    from project.api.filters import build_indicator_statement, parse_indicator_filters
+    from project.api.helpers import chunk_list
+
+    # Dropping the indexes would commit the synthetic dataset in MySQL, so the runs without them tell it to
+    # ignore them instead. The other databases only report the runs with the indexes.
+    secondary_indexes = {
+        models.Indicator.__table__: ['ix_indicator_confidence_id', 'ix_indicator_created_time', 'ix_indicator_impact_id',
+                                     'ix_indicator_modified_time_id', 'ix_indicator_status_id'],
+        models.IntelReference.__table__: ['ix_intel_reference_user_id'],
+        models.indicator_campaign_association: ['ix_indicator_campaign_mapping_campaign_id_indicator_id'],
+        models.indicator_reference_association: ['ix_indicator_reference_mapping_intel_reference_id_indicator_id'],
+        models.indicator_tag_association: ['ix_indicator_tag_mapping_tag_id_indicator_id']
+    }
+    dialect = db.engine.dialect
+    runs = [('without indexes', True), ('with indexes', False)] if dialect.name == 'mysql' else [('with indexes', False)]
+    explain = 'EXPLAIN QUERY PLAN ' if dialect.name == 'sqlite' else 'EXPLAIN '
+
+    # One percent of the indicators have the "benchmark1" value of each filter (the user filter matches the user of
+    # their references), and each indicator was created and modified one minute before the previous one.
+    users = [models.User(active=True,
+                         email='benchmark{}@localhost'.format(i),
+                         first_name='Benchmark',
+                         last_name='Benchmark',
+                         password='',
+                         roles=[],
+                         username='benchmark{}'.format(i)) for i in range(2)]
+    source = models.IntelSource(value='benchmark')
+    db.session.add_all(users + [models.IndicatorType(value='benchmark')])
+    for i in range(2):
+        db.session.add_all([models.IndicatorConfidence(value='benchmark{}'.format(i)),
+                            models.IndicatorImpact(value='benchmark{}'.format(i)),
+                            models.IndicatorStatus(value='benchmark{}'.format(i))])
+    for i in range(100):
+        db.session.add_all([models.Campaign(name='benchmark{}'.format(i)),
+                            models.IntelReference(reference='benchmark{}'.format(i), source=source, user=users[int(i == 1)]),
+                            models.Tag(value='benchmark{}'.format(i))])
+    db.session.flush()
+
+    start = time.time()
+    items = []
+    for i in range(size):
+        rare = 'benchmark{}'.format(int(i % 100 == 1))
+        items.append({'campaigns': ['benchmark{}'.format(i % 100)],
+                      'confidence': rare,
+                      'impact': rare,
+                      'references': [{'source': 'benchmark', 'reference': 'benchmark{}'.format(i % 100)}],
+                      'status': rare,
+                      'tags': ['benchmark{}'.format(i % 100)],
+                      'type': 'benchmark',
+                      'username': 'benchmark0',
+                      'value': 'benchmark{}.example.com'.format(i)})
+    creator = BulkIndicatorCreator()
+    creator.find_existing(items)
+    for data in items:
+        creator.add(data)
+    creator.flush()
+
+    now = datetime.utcnow()
+    indicator = models.Indicator.__table__
+    ids = [x[0] for x in db.session.query(models.Indicator.id).filter(
+        models.Indicator.user_id.in_([u.id for u in users])).order_by(models.Indicator.id.desc())]
+    statement = indicator.update().where(indicator.c.id == db.bindparam('_id')).values(
+        created_time=db.bindparam('_time'), modified_time=db.bindparam('_time'))
+    rows = [{'_id': x, '_time': now - timedelta(minutes=n)} for n, x in enumerate(ids)]
+    for rows_chunk in chunk_list(rows, current_app.config['BULK_INSERT_CHUNK_SIZE']):
+        db.session.execute(statement, rows_chunk)
+    current_app.logger.info('BENCHMARK: Loaded {} indicators in {:.2f}s'.format(size, time.time() - start))
+
+    newest = (now - timedelta(minutes=size // 100)).strftime('%Y-%m-%d %H:%M:%S')
+    oldest = (now - timedelta(minutes=size - size // 100)).strftime('%Y-%m-%d %H:%M:%S')
+    filters = [{'campaigns': 'benchmark1'},
+               {'confidence': 'benchmark1'},
+               {'created_after': newest},
+               {'created_before': oldest},
+               {'impact': 'benchmark1'},
+               {'modified_after': newest},
+               {'modified_before': oldest},
+               {'reference': 'benchmark1'},
+               {'status': 'benchmark1'},
+               {'tags': 'benchmark1'},
+               {'user': 'benchmark1'}]
+
+    connection = db.session.connection()
+    for args in filters:
+        shape, params = parse_indicator_filters(args)
+        for name, ignore_indexes in runs:
+            statement = build_indicator_statement(shape)
+            if ignore_indexes:
+                for table, index_names in secondary_indexes.items():
+                    statement = statement.with_hint(table, 'IGNORE INDEX ({})'.format(', '.join(index_names)), 'mysql')
+
+            compiled = statement.compile(dialect=dialect)
+            compiled_params = compiled.construct_params(params)
+            if compiled.positional:
+                compiled_params = [compiled_params[x] for x in compiled.positiontup]
+            plan = connection.execute(explain + str(compiled), compiled_params).fetchall()
+
+            timings = []
+            for _ in range(repeat):
+                start = time.time()
+                count = len(connection.execute(statement, params).fetchall())
+                timings.append(time.time() - start)
+
+            current_app.logger.info('BENCHMARK: {} {}: {} indicators in {:.4f}s'.format(
+                json.dumps(args), name, count, min(timings)))
+            for row in plan:
+                current_app.logger.info('    {}'.format(' | '.join(str(x) for x in row)))
+
+    db.session.rollback()
+
+
+@cli.command()
+@click.option('--batch-size', default=10000, help='Number of indicators to index per transaction')
+def build_trigram_index(batch_size):
+    """ Builds the trigram index used by substring searches for all of the existing indicators. """
+
+    start = time.time()
+    num_indicators = 0
+    last_id = 0
+
+    # Replace the trigrams one batch of indicators at a time so that searches keep working while this runs.
+    while True:
+        rows = db.session.query(models.Indicator.id, models.Indicator.value).filter(models.Indicator.id > last_id)\
+            .order_by(models.Indicator.id).limit(batch_size).all()
+        if not rows:
+            break
+
+        trigram_rows = []
+        for indicator_id, value in rows:
+            trigram_rows += models.trigram_rows(indicator_id, value)
+
+        db.session.execute(models.indicator_trigram.delete().where(
+            models.indicator_trigram.c.indicator_id.between(rows[0][0], rows[-1][0])))
+        if trigram_rows:
+            db.session.execute(models.indicator_trigram.insert(), trigram_rows)
+        db.session.commit()
+
+        last_id = rows[-1][0]
+        num_indicators += len(rows)
+
+    current_app.logger.info('TRIGRAM INDEX: Indexed {} indicators in {}'.format(num_indicators, time.time() - start))
+
+
+@cli.command()
+def build_indicator_counts():
+    """ Rebuilds the indicator count tables used by count requests from the indicators. """
+
+    start = time.time()
+
+    # Replace the counts in a single transaction so that count requests never see a partial rebuild.
+    indicator = models.Indicator.__table__
+    count_columns = [indicator.c.type_id, indicator.c.status_id, indicator.c.confidence_id, indicator.c.impact_id]
+    mapping_tables = [(models.indicator_campaign_count, models.indicator_campaign_association, 'campaign_id'),
+                      (models.indicator_tag_count, models.indicator_tag_association, 'tag_id')]
+
+    db.session.execute(models.indicator_count.delete())
+    db.session.execute(models.indicator_count.insert().from_select(
+        [c.name for c in count_columns] + ['count'],
+        db.select(count_columns + [db.func.count()]).group_by(*count_columns)))
+
+    for count_table, mapping_table, column in mapping_tables:
+        db.session.execute(count_table.delete())
+        db.session.execute(count_table.insert().from_select(
+            [column, 'count'],
+            db.select([mapping_table.c[column], db.func.count()]).group_by(mapping_table.c[column])))
+
+    db.session.commit()
+
+    current_app.logger.info('INDICATOR COUNTS: Rebuilt the indicator counts in {}'.format(time.time() - start))
+
+
+@cli.command()
+@click.option('--watch', is_flag=True, help='Keep running and rebuild the feeds whenever the write generation changes')
+def build_feeds(watch):
+    """ Writes the indicator feed files to INDICATOR_FEED_DIR. """
+
+    from project.api.feeds import build_feeds, read_feed_generation
+
+    directory = current_app.config['INDICATOR_FEED_DIR']
+    if not directory:
+        current_app.logger.error('FEEDS: INDICATOR_FEED_DIR is not set')
+        return
+    os.makedirs(directory, exist_ok=True)
+
+    built = read_feed_generation(directory)
+    while True:
+        # End the previous transaction so that the generation and the feeds are read from a new snapshot.
+        db.session.rollback()
+        if not watch or models.get_write_generation() != built:
+            start = time.time()
+            built = build_feeds(directory)
+            current_app.logger.info('FEEDS: Built the feeds for generation {} in {:.2f}s'.format(
+                built, time.time() - start))
+
+        if not watch:
+            break
+        time.sleep(current_app.config['INDICATOR_FEED_INTERVAL_SECONDS'])
+
+
 @cli.command()
 @click.option('--yes', is_flag=True, expose_value=False, prompt='Are you sure?')
 def setupdb():
@@ -0,0 +1,63 @@
+"""indicator closure
+
+Revision ID: 3b5d1c7a2e64
+Revises: 9039a356241d
+Create Date: 2026-10-17 10:41:05.274319
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b5d1c7a2e64'
+down_revision = '9039a356241d'
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH_SIZE = 10000
+
+
+def upgrade():
+    op.create_table('indicator_closure',
+    sa.Column('ancestor_id', sa.Integer(), nullable=False),
+    sa.Column('descendant_id', sa.Integer(), nullable=False),
+    sa.Column('depth', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['ancestor_id'], ['indicator.id'], ),
+    sa.ForeignKeyConstraint(['descendant_id'], ['indicator.id'], ),
+    sa.PrimaryKeyConstraint('ancestor_id', 'descendant_id')
+    )
+    op.create_index('ix_indicator_closure_descendant_id_depth', 'indicator_closure', ['descendant_id', 'depth'], unique=False)
+
+    # Walk up from every child indicator to build its ancestor paths from the existing relationships.
+    conn = op.get_bind()
+    relationship = sa.table('indicator_relationship_mapping', sa.column('parent_id'), sa.column('child_id'))
+    closure = sa.table('indicator_closure', sa.column('ancestor_id'), sa.column('descendant_id'), sa.column('depth'))
+
+    parents = {child_id: parent_id for parent_id, child_id in conn.execute(
+        sa.select([relationship.c.parent_id, relationship.c.child_id])).fetchall()}
+
+    rows = []
+    for child_id in parents:
+        ancestor_id = parents[child_id]
+        depth = 1
+        seen = {child_id}
+
+        # The old relationship code did not prevent loops, so stop when one is found.
+        while ancestor_id is not None and ancestor_id not in seen:
+            rows.append({'ancestor_id': ancestor_id, 'descendant_id': child_id, 'depth': depth})
+            seen.add(ancestor_id)
+            ancestor_id = parents.get(ancestor_id)
+            depth += 1
+
+        if len(rows) >= BACKFILL_BATCH_SIZE:
+            conn.execute(closure.insert(), rows)
+            rows = []
+
+    if rows:
+        conn.execute(closure.insert(), rows)
+
+
+def downgrade():
+    op.drop_index('ix_indicator_closure_descendant_id_depth', table_name='indicator_closure')
+    op.drop_table('indicator_closure')
@@ -0,0 +1,69 @@
+"""indicator ip range
+
+Revision ID: 5d7e2b9f4c13
+Revises: 9c1e7a4b2d58
+Create Date: 2026-10-17 21:37:52.604913
+
+"""
+from alembic import op
+import ipaddress
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d7e2b9f4c13'
+down_revision = '9c1e7a4b2d58'
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH_SIZE = 10000
+
+
+def _ip_range(value):
+    try:
+        network = ipaddress.IPv4Network(value.strip(), strict=False)
+    except ValueError:
+        return None, None
+    return int(network.network_address), int(network.broadcast_address)
+
+
+def upgrade():
+    op.add_column('indicator', sa.Column('ip_end', sa.BigInteger(), nullable=True))
+    op.add_column('indicator', sa.Column('ip_start', sa.BigInteger(), nullable=True))
+
+    # Backfill the ranges in batches. Every IPv4 address or CIDR block has at least three dots in it.
+    indicator = sa.table('indicator',
+                         sa.column('id', sa.Integer),
+                         sa.column('value', sa.UnicodeText),
+                         sa.column('ip_end', sa.BigInteger),
+                         sa.column('ip_start', sa.BigInteger))
+    update = indicator.update().where(indicator.c.id == sa.bindparam('_id')).values(
+        ip_start=sa.bindparam('_ip_start'), ip_end=sa.bindparam('_ip_end'))
+
+    conn = op.get_bind()
+    last_id = 0
+    while True:
+        rows = conn.execute(sa.select([indicator.c.id, indicator.c.value])
+                            .where(indicator.c.id > last_id)
+                            .where(indicator.c.value.like('%.%.%.%'))
+                            .order_by(indicator.c.id)
+                            .limit(BACKFILL_BATCH_SIZE)).fetchall()
+        if not rows:
+            break
+
+        params = []
+        for r in rows:
+            ip_start, ip_end = _ip_range(r[1])
+            if ip_start is not None:
+                params.append({'_id': r[0], '_ip_start': ip_start, '_ip_end': ip_end})
+        if params:
+            conn.execute(update, params)
+        last_id = rows[-1][0]
+
+    op.create_index('ix_indicator_ip_start_ip_end', 'indicator', ['ip_start', 'ip_end'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_indicator_ip_start_ip_end', table_name='indicator')
+    op.drop_column('indicator', 'ip_start')
+    op.drop_column('indicator', 'ip_end')
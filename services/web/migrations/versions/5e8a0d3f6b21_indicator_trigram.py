@@ -0,0 +1,68 @@
+"""indicator trigram
+
+Revision ID: 5e8a0d3f6b21
+Revises: 7c2f9e4b8a13
+Create Date: 2026-10-17 13:05:52.610348
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import unicodedata
+
+
+# revision identifiers, used by Alembic.
+revision = '5e8a0d3f6b21'
+down_revision = '7c2f9e4b8a13'
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH_SIZE = 10000
+
+# Must match project/models.py.
+UNFOLDED_TRIGRAM = b'\xff'
+
+
+def _fold(value):
+    value = unicodedata.normalize('NFKD', value.lower())
+    return ''.join(c for c in value if not unicodedata.combining(c))
+
+
+def upgrade():
+    op.create_table('indicator_trigram',
+    sa.Column('trigram', sa.VARBINARY(length=12), nullable=False),
+    sa.Column('indicator_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['indicator_id'], ['indicator.id'], ),
+    sa.PrimaryKeyConstraint('trigram', 'indicator_id')
+    )
+    op.create_index('ix_indicator_trigram_indicator_id', 'indicator_trigram', ['indicator_id'], unique=False)
+
+    # Index the existing indicators one batch at a time, since the value filter only searches the indicators that
+    # have trigrams. The trigrams are the three character substrings of the folded values, like in the models.
+    conn = op.get_bind()
+    indicator = sa.table('indicator', sa.column('id'), sa.column('value'))
+    trigram = sa.table('indicator_trigram', sa.column('trigram'), sa.column('indicator_id'))
+
+    last_id = 0
+    while True:
+        rows = conn.execute(sa.select([indicator.c.id, indicator.c.value]).where(indicator.c.id > last_id)
+                            .order_by(indicator.c.id).limit(BACKFILL_BATCH_SIZE)).fetchall()
+        if not rows:
+            break
+
+        trigram_rows = []
+        for indicator_id, value in rows:
+            value = _fold(value)
+            if value.isascii():
+                trigrams = {value[i:i + 3].encode('utf-8') for i in range(len(value) - 2)}
+            else:
+                trigrams = {UNFOLDED_TRIGRAM}
+            trigram_rows += [{'trigram': t, 'indicator_id': indicator_id} for t in trigrams]
+        if trigram_rows:
+            conn.execute(trigram.insert(), trigram_rows)
+
+        last_id = rows[-1][0]
+
+
+def downgrade():
+    op.drop_index('ix_indicator_trigram_indicator_id', table_name='indicator_trigram')
+    op.drop_table('indicator_trigram')
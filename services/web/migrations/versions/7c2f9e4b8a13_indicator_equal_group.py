@@ -0,0 +1,55 @@
+"""indicator equal group
+
+Revision ID: 7c2f9e4b8a13
+Revises: 3b5d1c7a2e64
+Create Date: 2026-10-17 11:20:47.902635
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c2f9e4b8a13'
+down_revision = '3b5d1c7a2e64'
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH_SIZE = 10000
+
+
+def upgrade():
+    op.add_column('indicator', sa.Column('equal_group_id', sa.Integer(), nullable=True))
+    op.create_index(op.f('ix_indicator_equal_group_id'), 'indicator', ['equal_group_id'], unique=False)
+
+    # Union-find over the existing equal links, with each group labeled by its lowest indicator ID.
+    conn = op.get_bind()
+    equal = sa.table('indicator_equal_mapping', sa.column('left_id'), sa.column('right_id'))
+    indicator = sa.table('indicator', sa.column('id'), sa.column('equal_group_id'))
+
+    parents = {}
+
+    def find(i):
+        parents.setdefault(i, i)
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
+
+    for left_id, right_id in conn.execute(sa.select([equal.c.left_id, equal.c.right_id])).fetchall():
+        left_root = find(left_id)
+        right_root = find(right_id)
+        if left_root != right_root:
+            parents[max(left_root, right_root)] = min(left_root, right_root)
+
+    update = indicator.update().where(indicator.c.id == sa.bindparam('_id')).values(
+        equal_group_id=sa.bindparam('_group_id'))
+
+    rows = [{'_id': i, '_group_id': find(i)} for i in list(parents)]
+    for start in range(0, len(rows), BACKFILL_BATCH_SIZE):
+        conn.execute(update, rows[start:start + BACKFILL_BATCH_SIZE])
+
+
+def downgrade():
+    op.drop_index(op.f('ix_indicator_equal_group_id'), table_name='indicator')
+    op.drop_column('indicator', 'equal_group_id')
@@ -0,0 +1,39 @@
+"""job
+
+Revision ID: 9039a356241d
+Revises: e94885038103
+Create Date: 2026-10-17 10:02:18.530117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision = '9039a356241d'
+down_revision = 'e94885038103'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('job',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('created', sa.Integer(), nullable=False),
+    sa.Column('created_time', sa.DateTime(), nullable=True),
+    sa.Column('errors', sa.UnicodeText().with_variant(mysql.MEDIUMTEXT(), 'mysql'), nullable=True),
+    sa.Column('failed', sa.Integer(), nullable=False),
+    sa.Column('modified_time', sa.DateTime(), nullable=True),
+    sa.Column('payload', sa.LargeBinary().with_variant(mysql.LONGBLOB(), 'mysql'), nullable=True),
+    sa.Column('skipped', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=32), nullable=False),
+    sa.Column('total', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('job')
@@ -0,0 +1,54 @@
+"""secondary indexes
+
+Revision ID: 9c1e7a4b2d58
+Revises: f3b8e5a1c7d4
+Create Date: 2026-10-17 18:24:09.503716
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c1e7a4b2d58'
+down_revision = 'f3b8e5a1c7d4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # A downgrade on MySQL leaves behind the indexes that back the foreign keys, so only create the missing ones.
+    inspector = sa.inspect(op.get_bind())
+    existing = {}
+
+    def create_index(name, table, columns):
+        if table not in existing:
+            existing[table] = {index['name'] for index in inspector.get_indexes(table)}
+        if name not in existing[table]:
+            op.create_index(name, table, columns, unique=False)
+
+    create_index(op.f('ix_indicator_confidence_id'), 'indicator', ['confidence_id'])
+    create_index(op.f('ix_indicator_created_time'), 'indicator', ['created_time'])
+    create_index(op.f('ix_indicator_impact_id'), 'indicator', ['impact_id'])
+    create_index(op.f('ix_indicator_status_id'), 'indicator', ['status_id'])
+    create_index('ix_indicator_campaign_mapping_campaign_id_indicator_id', 'indicator_campaign_mapping', ['campaign_id', 'indicator_id'])
+    create_index('ix_indicator_reference_mapping_intel_reference_id_indicator_id', 'indicator_reference_mapping', ['intel_reference_id', 'indicator_id'])
+    create_index('ix_indicator_tag_mapping_tag_id_indicator_id', 'indicator_tag_mapping', ['tag_id', 'indicator_id'])
+    create_index(op.f('ix_intel_reference_user_id'), 'intel_reference', ['user_id'])
+
+
+def downgrade():
+    op.drop_index(op.f('ix_indicator_created_time'), table_name='indicator')
+
+    # MySQL replaced the indexes it creates for the foreign keys with these ones, so they cannot be dropped there.
+    # The upgrade skips them if they are still there.
+    if op.get_bind().dialect.name == 'mysql':
+        return
+
+    op.drop_index(op.f('ix_intel_reference_user_id'), table_name='intel_reference')
+    op.drop_index('ix_indicator_tag_mapping_tag_id_indicator_id', table_name='indicator_tag_mapping')
+    op.drop_index('ix_indicator_reference_mapping_intel_reference_id_indicator_id', table_name='indicator_reference_mapping')
+    op.drop_index('ix_indicator_campaign_mapping_campaign_id_indicator_id', table_name='indicator_campaign_mapping')
+    op.drop_index(op.f('ix_indicator_status_id'), table_name='indicator')
+    op.drop_index(op.f('ix_indicator_impact_id'), table_name='indicator')
+    op.drop_index(op.f('ix_indicator_confidence_id'), table_name='indicator')
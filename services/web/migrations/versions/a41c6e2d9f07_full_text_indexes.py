@@ -0,0 +1,27 @@
+"""full text indexes
+
+Revision ID: a41c6e2d9f07
+Revises: 5e8a0d3f6b21
+Create Date: 2026-10-17 13:48:30.117482
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a41c6e2d9f07'
+down_revision = '5e8a0d3f6b21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # InnoDB rebuilds the table the first time a FULLTEXT index is added to it.
+    op.create_index('ix_indicator_value_fulltext', 'indicator', ['value'], unique=False, mysql_prefix='FULLTEXT')
+    op.create_index('ix_intel_reference_reference_fulltext', 'intel_reference', ['reference'], unique=False,
+                    mysql_prefix='FULLTEXT')
+
+
+def downgrade():
+    op.drop_index('ix_intel_reference_reference_fulltext', table_name='intel_reference')
+    op.drop_index('ix_indicator_value_fulltext', table_name='indicator')
@@ -0,0 +1,52 @@
+"""indicator counts
+
+Revision ID: b83d5f1c2a96
+Revises: a41c6e2d9f07
+Create Date: 2026-10-17 15:02:11.604218
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b83d5f1c2a96'
+down_revision = 'a41c6e2d9f07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('indicator_count',
+    sa.Column('type_id', sa.Integer(), nullable=False),
+    sa.Column('status_id', sa.Integer(), nullable=False),
+    sa.Column('confidence_id', sa.Integer(), nullable=False),
+    sa.Column('impact_id', sa.Integer(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('type_id', 'status_id', 'confidence_id', 'impact_id')
+    )
+    op.create_table('indicator_campaign_count',
+    sa.Column('campaign_id', sa.Integer(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('campaign_id')
+    )
+    op.create_table('indicator_tag_count',
+    sa.Column('tag_id', sa.Integer(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('tag_id')
+    )
+
+    # Fill in the counts of the existing indicators.
+    op.execute('INSERT INTO indicator_count (type_id, status_id, confidence_id, impact_id, count) '
+               'SELECT type_id, status_id, confidence_id, impact_id, count(*) FROM indicator '
+               'GROUP BY type_id, status_id, confidence_id, impact_id')
+    op.execute('INSERT INTO indicator_campaign_count (campaign_id, count) '
+               'SELECT campaign_id, count(*) FROM indicator_campaign_mapping GROUP BY campaign_id')
+    op.execute('INSERT INTO indicator_tag_count (tag_id, count) '
+               'SELECT tag_id, count(*) FROM indicator_tag_mapping GROUP BY tag_id')
+
+
+def downgrade():
+    op.drop_table('indicator_tag_count')
+    op.drop_table('indicator_campaign_count')
+    op.drop_table('indicator_count')
@@ -0,0 +1,31 @@
+"""write generation
+
+Revision ID: d2a7c94e1f38
+Revises: b83d5f1c2a96
+Create Date: 2026-10-17 15:41:27.339051
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2a7c94e1f38'
+down_revision = 'b83d5f1c2a96'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    write_generation = op.create_table('write_generation',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('generation', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+    # Create the single row now so that writes never race to insert it.
+    op.bulk_insert(write_generation, [{'id': 1, 'generation': 0}])
+
+
+def downgrade():
+    op.drop_table('write_generation')
@@ -0,0 +1,93 @@
+"""indicator value hash
+
+Revision ID: e94885038103
+Revises: fc9854dd0bc0
+Create Date: 2026-10-17 09:12:41.118204
+
+"""
+from alembic import op
+import hashlib
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e94885038103'
+down_revision = 'fc9854dd0bc0'
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH_SIZE = 10000
+
+# Number of duplicate indicators listed when the upgrade stops because of them.
+DUPLICATE_REPORT_LIMIT = 100
+
+
+def _hash(value):
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()
+
+
+def upgrade():
+    # MySQL commits every DDL statement on its own, so a failed upgrade can leave some of these behind.
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    columns = {c['name'] for c in inspector.get_columns('indicator')}
+    if 'value_hash' not in columns:
+        op.add_column('indicator', sa.Column('value_hash', sa.String(length=64), nullable=True))
+    if 'value_lower_hash' not in columns:
+        op.add_column('indicator', sa.Column('value_lower_hash', sa.String(length=64), nullable=True))
+
+    # Backfill the digests in batches so that large indicator tables do not need to fit in memory.
+    indicator = sa.table('indicator',
+                         sa.column('id', sa.Integer),
+                         sa.column('type_id', sa.Integer),
+                         sa.column('value', sa.UnicodeText),
+                         sa.column('value_hash', sa.String),
+                         sa.column('value_lower_hash', sa.String))
+    update = indicator.update().where(indicator.c.id == sa.bindparam('_id')).values(
+        value_hash=sa.bindparam('_value_hash'), value_lower_hash=sa.bindparam('_value_lower_hash'))
+
+    last_id = 0
+    while True:
+        rows = conn.execute(sa.select([indicator.c.id, indicator.c.value])
+                            .where(indicator.c.id > last_id)
+                            .order_by(indicator.c.id)
+                            .limit(BACKFILL_BATCH_SIZE)).fetchall()
+        if not rows:
+            break
+
+        conn.execute(update, [{'_id': r[0], '_value_hash': _hash(r[1]), '_value_lower_hash': _hash(r[1].lower())}
+                              for r in rows])
+        last_id = rows[-1][0]
+
+    # Only the checks in the API kept the values unique before, so racing requests could have saved the same value
+    # twice for a type. Those indicators have to be merged by hand before the unique constraint can be added.
+    duplicates = conn.execute(sa.select([indicator.c.type_id, indicator.c.value_hash])
+                              .group_by(indicator.c.type_id, indicator.c.value_hash)
+                              .having(sa.func.count() > 1)
+                              .limit(DUPLICATE_REPORT_LIMIT)).fetchall()
+    if duplicates:
+        lines = []
+        for type_id, value_hash in duplicates:
+            ids = [r[0] for r in conn.execute(sa.select([indicator.c.id]).where(sa.and_(
+                indicator.c.type_id == type_id, indicator.c.value_hash == value_hash)).order_by(indicator.c.id))]
+            lines.append('type_id {}: indicator IDs {}'.format(type_id, ', '.join(str(i) for i in ids)))
+        raise RuntimeError('Merge or delete the duplicate indicators and run the upgrade again (showing at most {} '
+                           'groups):\n{}'.format(DUPLICATE_REPORT_LIMIT, '\n'.join(lines)))
+
+    op.alter_column('indicator', 'value_hash', existing_type=sa.String(length=64), nullable=False)
+    op.alter_column('indicator', 'value_lower_hash', existing_type=sa.String(length=64), nullable=False)
+
+    indexes = {i['name'] for i in inspector.get_indexes('indicator')}
+    indexes |= {c['name'] for c in inspector.get_unique_constraints('indicator')}
+    if 'uq_indicator_type_id_value_hash' not in indexes:
+        op.create_unique_constraint('uq_indicator_type_id_value_hash', 'indicator', ['type_id', 'value_hash'])
+    if 'ix_indicator_type_id_value_lower_hash' not in indexes:
+        op.create_index('ix_indicator_type_id_value_lower_hash', 'indicator', ['type_id', 'value_lower_hash'],
+                        unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_indicator_type_id_value_lower_hash', table_name='indicator')
+    op.drop_constraint('uq_indicator_type_id_value_hash', 'indicator', type_='unique')
+    op.drop_column('indicator', 'value_lower_hash')
+    op.drop_column('indicator', 'value_hash')
@@ -0,0 +1,32 @@
+"""indicator changes
+
+Revision ID: f3b8e5a1c7d4
+Revises: d2a7c94e1f38
+Create Date: 2026-10-17 17:02:45.118392
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b8e5a1c7d4'
+down_revision = 'd2a7c94e1f38'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('indicator_tombstone',
+    sa.Column('indicator_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('deleted_time', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('indicator_id')
+    )
+    op.create_index('ix_indicator_tombstone_deleted_time_indicator_id', 'indicator_tombstone', ['deleted_time', 'indicator_id'], unique=False)
+    op.create_index('ix_indicator_modified_time_id', 'indicator', ['modified_time', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_indicator_modified_time_id', table_name='indicator')
+    op.drop_index('ix_indicator_tombstone_deleted_time_indicator_id', table_name='indicator_tombstone')
+    op.drop_table('indicator_tombstone')
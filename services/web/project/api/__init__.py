@@ -2,9 +2,13 @@ from flask import Blueprint
 
 bp = Blueprint('api', __name__, url_prefix='/api')
 
+from project.api.routes import cache
+
 from project.api.routes import campaign
 from project.api.routes import campaign_alias
 
+from project.api.routes import feed
+
 from project.api.routes import indicator
 from project.api.routes import indicator_confidence
 from project.api.routes import indicator_equal
@@ -16,6 +20,10 @@ from project.api.routes import indicator_type
 from project.api.routes import intel_reference
 from project.api.routes import intel_source
 
+from project.api.routes import job
+
+from project.api.routes import match
+
 from project.api.routes import role
 
 from project.api.routes import tag
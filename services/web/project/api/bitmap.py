@@ -0,0 +1,358 @@
+import threading
+import time
+
+from array import array
+from datetime import datetime, timedelta
+from flask import current_app
+
+from project import db
+from project.models import Campaign, Indicator, Tag, get_write_generation, indicator_campaign_association, \
+    indicator_tag_association, indicator_tombstone
+
+# The index is built the first time it is used since it is only enabled by the app config.
+bitmap_index = None
+
+# The indicator list filters that the bitmap index evaluates instead of the database.
+BITMAP_FILTERS = ('campaigns', 'no_campaigns', 'no_tags', 'not_campaigns', 'not_tags', 'tags')
+
+# Indicators modified or deleted this long before the previous refresh are read again in case their
+# transaction committed after the refresh ran. MySQL also rounds the modified times to the second.
+REFRESH_OVERLAP = timedelta(minutes=5)
+
+# The bitmaps split the IDs into chunks of 65,536 by their high bits, like a roaring bitmap. A chunk with up
+# to ARRAY_MAX_SIZE IDs keeps their low 16 bits in a sorted array (2 bytes per ID), and a fuller chunk keeps
+# them as the bits of a 65,536 bit integer (8 KB), which is smaller from that point on.
+CHUNK_BITS = 16
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+DENSE_BYTES = (1 << CHUNK_BITS) // 8
+ARRAY_MAX_SIZE = 4096
+
+
+def get_bitmap_index():
+    """ Returns the bitmap index after refreshing it if it is stale, or None if it is not enabled. """
+
+    global bitmap_index
+
+    if not current_app.config['INDICATOR_BITMAP_INDEX']:
+        return None
+
+    if bitmap_index is None:
+        bitmap_index = BitmapIndex()
+    bitmap_index.refresh(current_app.config['INDICATOR_BITMAP_REFRESH_SECONDS'], get_write_generation())
+    return bitmap_index
+
+
+def _iter_bits(value):
+    # Searching the binary string is much faster than shifting through a large integer one bit at a time.
+    bits = bin(value)[:1:-1]
+    i = bits.find('1')
+    while i != -1:
+        yield i
+        i = bits.find('1', i + 1)
+
+
+def _to_dense(container):
+    if isinstance(container, int):
+        return container
+    bits = bytearray(DENSE_BYTES)
+    for low in container:
+        bits[low >> 3] |= 1 << (low & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def _normalize(container):
+    # Returns the container in the smaller of the two layouts, or None if it is empty.
+    if isinstance(container, int):
+        if not container:
+            return None
+        count = bin(container).count('1')
+        return array('H', _iter_bits(container)) if count <= ARRAY_MAX_SIZE else container
+    if not container:
+        return None
+    return _to_dense(container) if len(container) > ARRAY_MAX_SIZE else container
+
+
+def _filter(container, dense, keep):
+    # Returns the IDs of the array container that are (or are not, if keep is False) set in the dense container.
+    bits = dense.to_bytes(DENSE_BYTES, 'little')
+    return array('H', (low for low in container if bool(bits[low >> 3] & (1 << (low & 7))) == keep))
+
+
+def _and(a, b):
+    if isinstance(a, int) and isinstance(b, int):
+        return _normalize(a & b)
+    if isinstance(a, int):
+        a, b = b, a
+    if isinstance(b, int):
+        return _normalize(_filter(a, b, True))
+    b = set(b)
+    return _normalize(array('H', (low for low in a if low in b)))
+
+
+def _or(a, b):
+    if isinstance(a, int) or isinstance(b, int) or len(a) + len(b) > ARRAY_MAX_SIZE:
+        return _normalize(_to_dense(a) | _to_dense(b))
+    return array('H', sorted(set(a).union(b)))
+
+
+def _andnot(a, b):
+    if isinstance(a, int):
+        return _normalize(a & ~_to_dense(b))
+    if isinstance(b, int):
+        return _normalize(_filter(a, b, False))
+    b = set(b)
+    return _normalize(array('H', (low for low in a if low not in b)))
+
+
+class Bitmap:
+    """ A compressed set of indicator IDs.
+
+    The containers map the high bits of the IDs to their low 16 bits in either a sorted array or a dense
+    integer, so a bitmap costs about 2 bytes per ID and at most 8 KB per 65,536 IDs instead of one bit for
+    every ID up to the largest one. The operators return new bitmaps and share the unchanged containers. """
+
+    __slots__ = ('containers',)
+
+    def __init__(self, containers=None):
+        self.containers = containers if containers is not None else {}
+
+    @classmethod
+    def from_ids(cls, ids):
+        chunks = {}
+        for i in ids:
+            chunks.setdefault(i >> CHUNK_BITS, set()).add(i & CHUNK_MASK)
+        return cls({key: _normalize(array('H', sorted(lows))) for key, lows in chunks.items()})
+
+    def __len__(self):
+        return sum(len(c) if not isinstance(c, int) else bin(c).count('1') for c in self.containers.values())
+
+    def __bool__(self):
+        return bool(self.containers)
+
+    def __iter__(self):
+        """ Yields the IDs in ascending order. """
+
+        for key in sorted(self.containers):
+            container = self.containers[key]
+            base = key << CHUNK_BITS
+            for low in (_iter_bits(container) if isinstance(container, int) else container):
+                yield base | low
+
+    def _combine(self, other, keys, operation):
+        containers = {}
+        for key in keys:
+            if key not in self.containers:
+                container = other.containers[key]
+            elif key not in other.containers:
+                container = self.containers[key]
+            else:
+                container = operation(self.containers[key], other.containers[key])
+            if container is not None:
+                containers[key] = container
+        return Bitmap(containers)
+
+    def __and__(self, other):
+        return self._combine(other, self.containers.keys() & other.containers.keys(), _and)
+
+    def __or__(self, other):
+        return self._combine(other, self.containers.keys() | other.containers.keys(), _or)
+
+    def __sub__(self, other):
+        containers = dict(self.containers)
+        for key in self.containers.keys() & other.containers.keys():
+            container = _andnot(self.containers[key], other.containers[key])
+            if container is None:
+                del containers[key]
+            else:
+                containers[key] = container
+        return Bitmap(containers)
+
+    def intersects(self, other):
+        return any(_and(self.containers[key], other.containers[key]) is not None
+                   for key in self.containers.keys() & other.containers.keys())
+
+    def after(self, after_id):
+        """ Returns the bitmap of the IDs greater than after_id. """
+
+        key, low = after_id >> CHUNK_BITS, after_id & CHUNK_MASK
+        containers = {k: c for k, c in self.containers.items() if k > key}
+        if key in self.containers:
+            container = self.containers[key]
+            if isinstance(container, int):
+                container = _normalize(container >> (low + 1) << (low + 1))
+            else:
+                container = _normalize(array('H', (x for x in container if x > low)))
+            if container is not None:
+                containers[key] = container
+        return Bitmap(containers)
+
+    def size(self):
+        """ Returns the approximate number of bytes used by the containers. """
+
+        return sum(DENSE_BYTES if isinstance(c, int) else 2 * len(c) for c in self.containers.values())
+
+
+def iter_bitmap_chunks(bitmap, size):
+    """ Yields lists of at most size IDs from the bitmap in ascending order. """
+
+    chunk = []
+    for i in bitmap:
+        chunk.append(i)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _group_bitmaps(rows):
+    # Turn (indicator_id, group_id) rows into a bitmap for each group.
+    groups = {}
+    for indicator_id, group_id in rows:
+        groups.setdefault(group_id, []).append(indicator_id)
+    return {group_id: Bitmap.from_ids(ids) for group_id, ids in groups.items()}
+
+
+def _union(bitmaps):
+    result = Bitmap()
+    for bitmap in bitmaps:
+        result |= bitmap
+    return result
+
+
+class BitmapIndex:
+    """ An in-memory index of which indicators have each tag and campaign.
+
+    Each tag and campaign ID maps to a compressed bitmap of its indicator IDs, so the tag and campaign filters
+    of the indicator list are evaluated with set algebra instead of joining and grouping the mapping tables.
+    Every worker process keeps its own index. """
+
+    def __init__(self):
+        self.all_ids = Bitmap()
+        self.campaigns = {}
+        self.tags = {}
+        self.any_campaign = Bitmap()
+        self.any_tag = Bitmap()
+        self.generation = None
+        self.refresh_time = None
+        self.synced_time = None
+        self._lock = threading.Lock()
+
+    def refresh(self, max_age, generation):
+        """ Reads the indicators modified or deleted since the last refresh if the write generation has changed
+        since then or if it is more than max_age seconds old. """
+
+        with self._lock:
+            if self.refresh_time is not None and time.monotonic() - self.refresh_time < max_age and \
+                    generation == self.generation:
+                return
+
+            started = datetime.utcnow()
+            if self.synced_time is None:
+                self._build()
+            else:
+                self._update(self.synced_time - REFRESH_OVERLAP)
+
+            self.generation = generation
+            self.refresh_time = time.monotonic()
+            self.synced_time = started
+
+    def _build(self):
+        self.all_ids = Bitmap.from_ids(i for i, in db.session.query(Indicator.id))
+
+        rows = db.session.query(indicator_campaign_association).all()
+        self.campaigns = _group_bitmaps(rows)
+        self.any_campaign = Bitmap.from_ids(indicator_id for indicator_id, campaign_id in rows)
+
+        rows = db.session.query(indicator_tag_association).all()
+        self.tags = _group_bitmaps(rows)
+        self.any_tag = Bitmap.from_ids(indicator_id for indicator_id, tag_id in rows)
+
+    def _update(self, modified_after):
+        # Deleted indicators leave a tombstone behind, so they are found the same way as the modified ones.
+        modified = [i for i, in db.session.query(Indicator.id).filter(Indicator.modified_time >= modified_after)]
+        deleted = [i for i, in db.session.query(indicator_tombstone.c.indicator_id).filter(
+            indicator_tombstone.c.deleted_time >= modified_after)]
+        if not modified and not deleted:
+            return
+
+        changed = Bitmap.from_ids(modified + deleted)
+        self.all_ids = (self.all_ids - changed) | Bitmap.from_ids(modified)
+
+        for attr, table, column in [('campaigns', indicator_campaign_association, 'campaign_id'),
+                                    ('tags', indicator_tag_association, 'tag_id')]:
+            rows = []
+            for chunk in iter_bitmap_chunks(Bitmap.from_ids(modified), current_app.config['BULK_QUERY_CHUNK_SIZE']):
+                rows += db.session.query(table.c.indicator_id, table.c[column]).filter(
+                    table.c.indicator_id.in_(chunk)).all()
+            current = _group_bitmaps(rows)
+
+            # Only the groups that had one of the changed indicators or have one now are rebuilt. Checking a
+            # group only looks at its containers for the chunks of the changed IDs.
+            bitmaps = getattr(self, attr)
+            for group_id, bitmap in list(bitmaps.items()):
+                if group_id not in current and bitmap.intersects(changed):
+                    bitmap -= changed
+                    if bitmap:
+                        bitmaps[group_id] = bitmap
+                    else:
+                        del bitmaps[group_id]
+            for group_id, bitmap in current.items():
+                bitmaps[group_id] = (bitmaps.get(group_id, Bitmap()) - changed) | bitmap
+
+            any_attr = 'any_campaign' if attr == 'campaigns' else 'any_tag'
+            setattr(self, any_attr, (getattr(self, any_attr) - changed) |
+                    Bitmap.from_ids(indicator_id for indicator_id, group_id in rows))
+
+    def _lookup(self, bitmaps, column, value):
+        # Look up the names in the database so they match the same rows as the SQL filters do.
+        return _union(bitmaps.get(group_id, Bitmap()) for group_id, in
+                      db.session.query(column.class_.id).filter(column == value))
+
+    def evaluate(self, shape, params):
+        """ Evaluates the tag and campaign filters of the shape.
+
+        Returns the bitmap of the indicators that match them and the shape of the remaining filters, or None
+        and the original shape if the shape does not use any of them. """
+
+        if not any(name in BITMAP_FILTERS for name, *options in shape):
+            return None, shape
+
+        remaining = []
+        matched = self.all_ids
+
+        for name, *options in shape:
+
+            if name in ['campaigns', 'tags']:
+                bitmaps, column = (self.campaigns, Campaign.name) if name == 'campaigns' else (self.tags, Tag.value)
+                values = [self._lookup(bitmaps, column, params['{}_{}'.format(name, i)]) for i in range(options[1])]
+                if options[0] == 'and':
+                    for bitmap in values:
+                        matched &= bitmap
+                else:
+                    matched &= _union(values)
+
+            elif name in ['not_campaigns', 'not_tags']:
+                bitmaps, column = (self.campaigns, Campaign.name) if name == 'not_campaigns' else (self.tags, Tag.value)
+                for i in range(options[0]):
+                    matched -= self._lookup(bitmaps, column, params['{}_{}'.format(name, i)])
+
+            elif name == 'no_campaigns':
+                matched -= self.any_campaign
+
+            elif name == 'no_tags':
+                matched -= self.any_tag
+
+            else:
+                remaining.append((name, *options))
+
+        return matched, tuple(remaining)
+
+    def to_dict(self):
+        bitmaps = [self.all_ids, self.any_campaign, self.any_tag, *self.campaigns.values(), *self.tags.values()]
+        return {'bytes': sum(bitmap.size() for bitmap in bitmaps),
+                'campaigns': len(self.campaigns),
+                'generation': self.generation,
+                'indicators': len(self.all_ids),
+                'synced_time': self.synced_time,
+                'tags': len(self.tags)}
@@ -0,0 +1,60 @@
+import math
+import struct
+
+# A serialized filter starts with the magic bytes, the format version, the number of hash functions, the number of
+# bits and the number of values that were added, all big-endian. The bits follow, with bit i in byte i // 8 at
+# position i % 8 from the least significant bit. lib/bloom_client.py reads this format.
+BLOOM_MAGIC = b'SIPB'
+BLOOM_VERSION = 1
+BLOOM_HEADER = struct.Struct('>4sBBQQ')
+
+
+def bloom_size(count, false_positive_rate):
+    """ Returns the number of bits and hash functions of a filter for count values at the false positive rate. """
+
+    count = max(count, 1)
+    num_bits = max(int(math.ceil(-count * math.log(false_positive_rate) / math.log(2) ** 2)), 8)
+    num_hashes = min(max(int(round(num_bits / count * math.log(2))), 1), 255)
+    return num_bits, num_hashes
+
+
+def bloom_positions(digest, num_hashes, num_bits):
+    """ Returns the bit positions of a SHA256 hex digest.
+
+    The positions are found by double hashing with the first two 64-bit words of the digest, so the values do
+    not need to be hashed again for each hash function. """
+
+    h1 = int(digest[:16], 16)
+    h2 = int(digest[16:32], 16) | 1
+    return [(h1 + i * h2) % num_bits for i in range(num_hashes)]
+
+
+class BloomFilter:
+    """ A Bloom filter of the SHA256 digests of the lowercase indicator values.
+
+    These are the value_lower_hash digests that are already saved with every indicator, so the filter is built
+    without reading or hashing the values themselves. """
+
+    def __init__(self, num_bits, num_hashes):
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.count = 0
+        self.bits = bytearray((num_bits + 7) // 8)
+
+    @classmethod
+    def for_count(cls, count, false_positive_rate):
+        return cls(*bloom_size(count, false_positive_rate))
+
+    def add(self, digest):
+        bits = self.bits
+        for position in bloom_positions(digest, self.num_hashes, self.num_bits):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, digest):
+        bits = self.bits
+        return all(bits[x >> 3] & (1 << (x & 7)) for x in bloom_positions(digest, self.num_hashes, self.num_bits))
+
+    def to_bytes(self):
+        header = BLOOM_HEADER.pack(BLOOM_MAGIC, BLOOM_VERSION, self.num_hashes, self.num_bits, self.count)
+        return header + bytes(self.bits)
@@ -0,0 +1,514 @@
+import datetime
+
+from collections import Counter
+from flask import current_app
+from sqlalchemy import and_, exc
+
+from project import db
+from project.api.helpers import chunk_list
+from project.models import Campaign, Indicator, IndicatorConfidence, IndicatorImpact, IndicatorStatus, IndicatorType, \
+    IntelReference, IntelSource, Tag, User, add_indicator_counts, hash_value, mark_write, \
+    hash_value_lower, indicator_campaign_association, indicator_reference_association, indicator_tag_association, \
+    indicator_trigram, ip_range, trigram_rows
+
+
+# Number of times a chunk is written before giving up when other requests keep creating the same indicators.
+CREATE_CHUNK_ATTEMPTS = 5
+
+
+class BulkCreateError(Exception):
+    """ Raised when an indicator in a bulk request cannot be created. """
+
+    def __init__(self, status_code, msg):
+        super().__init__(msg)
+        self.status_code = status_code
+        self.msg = msg
+
+
+class BulkIndicatorCreator:
+    """ Creates indicators in bulk using Core executemany statements instead of the ORM unit of work.
+
+    The supporting objects (users, types, tags, etc) are looked up, cached and automatically created following
+    the same INDICATOR_AUTO_CREATE_* config rules as the single create route. The indicators themselves are queued
+    as plain rows and written with multi-row INSERT statements when flush() is called. The new indicator IDs are
+    read back through the unique type+value_hash index so that the mapping tables can be filled the same way.
+    """
+
+    def __init__(self, apikey=None):
+        self.apikey = apikey
+        self.reset()
+
+    def reset(self):
+        """ Clears the cached supporting objects, e.g. after the session was rolled back. """
+
+        # Set up cache to limit the number of required database queries.
+        self.cache = {'usernames': {},
+                      'apikeys': {},
+                      'types': {},
+                      'confidences': {},
+                      'default_confidence': None,
+                      'impacts': {},
+                      'default_impact': None,
+                      'statuses': {},
+                      'default_status': None,
+                      'campaigns': {},
+                      'references': {},
+                      'sources': {},
+                      'tags': {}}
+
+        # Holds (type, case_sensitive, digest) tuples for the existing indicators and for the ones queued below.
+        self.existing = set()
+
+        self.pending = []
+
+    def find_existing(self, items):
+        """ Finds which of the given indicator dictionaries already exist in the database.
+
+        The digests of the values are grouped by type and case-sensitivity so that the indicators that already
+        exist can be found with a few chunked IN queries instead of one query per item.
+        """
+
+        grouped_digests = {}
+        for data in items:
+            if data.get('case_sensitive', False):
+                key = (data['type'], True)
+                digest = hash_value(data['value'])
+            else:
+                key = (data['type'], False)
+                digest = hash_value_lower(data['value'])
+
+            if key not in grouped_digests:
+                grouped_digests[key] = set()
+            grouped_digests[key].add(digest)
+
+        for (type_value, case_sensitive), digests in grouped_digests.items():
+            column = Indicator.value_hash if case_sensitive else Indicator.value_lower_hash
+            for digests_chunk in chunk_list(list(digests), current_app.config['BULK_QUERY_CHUNK_SIZE']):
+                query = db.session.query(column).join(IndicatorType, Indicator.type_id == IndicatorType.id)
+                query = query.filter(IndicatorType.value == type_value, column.in_(digests_chunk))
+                self.existing.update((type_value, case_sensitive, x[0]) for x in query)
+
+    def add(self, data):
+        """ Queues an indicator dictionary to be created. Returns False if the indicator is a duplicate. """
+
+        # The supporting objects that are automatically created for the indicator are only added to the session
+        # once it passes every check. Otherwise a rejected indicator would leave them behind when the rest of its
+        # chunk is committed.
+        created = []
+        try:
+            queued = self._add(data, created)
+        except BulkCreateError:
+            self._forget(created)
+            raise
+
+        if queued:
+            db.session.add_all(created)
+        else:
+            self._forget(created)
+        return queued
+
+    def _forget(self, created):
+        # Remove the objects that were never added to the session from the cache.
+        created_ids = {id(x) for x in created}
+        for cache in self.cache.values():
+            if isinstance(cache, dict):
+                for key in [k for k, v in cache.items() if id(v) in created_ids]:
+                    del cache[key]
+
+    def _add(self, data, created):
+
+        # Verify the user exists.
+        user = None
+        if 'username' in data:
+
+            # Check the cache for this username.
+            if data['username'] in self.cache['usernames']:
+                user = self.cache['usernames'][data['username']]
+            else:
+                user = User.query.filter_by(username=data['username']).first()
+                if not user:
+                    raise BulkCreateError(404, 'User not found by username')
+
+                # Add the user to the cache.
+                self.cache['usernames'][data['username']] = user
+        else:
+            if self.apikey:
+
+                # Check the cache for this apikey.
+                if self.apikey in self.cache['apikeys']:
+                    user = self.cache['apikeys'][self.apikey]
+                else:
+                    user = User.query.filter_by(apikey=self.apikey).first()
+                    if not user:
+                        raise BulkCreateError(404, 'User not found by API key')
+
+                    # Add the user to the cache.
+                    self.cache['apikeys'][self.apikey] = user
+            else:
+                raise BulkCreateError(401, 'You must supply either username or API key')
+
+        # Verify the user is active.
+        if not user.active:
+            raise BulkCreateError(401, 'Cannot create an indicator with an inactive user')
+
+        # Check the cache for this indicator type.
+        if data['type'] in self.cache['types']:
+            indicator_type = self.cache['types'][data['type']]
+        else:
+            # Verify the indicator type.
+            indicator_type = IndicatorType.query.filter_by(value=data['type']).first()
+            if not indicator_type:
+                if current_app.config['INDICATOR_AUTO_CREATE_INDICATORTYPE']:
+                    indicator_type = IndicatorType(value=data['type'])
+                    created.append(indicator_type)
+                else:
+                    raise BulkCreateError(404, 'Indicator type not found: {}'.format(data['type']))
+
+            # Add the indicator type to the cache.
+            self.cache['types'][data['type']] = indicator_type
+
+        # Verify the case-sensitive value (defaults to False).
+        if 'case_sensitive' in data:
+            case_sensitive = data['case_sensitive']
+        else:
+            case_sensitive = False
+
+        # Verify this type+value does not already exist (or was not already queued) based off of case_sensitive.
+        value_hash = hash_value(data['value'])
+        value_lower_hash = hash_value_lower(data['value'])
+        exact_key = (data['type'], True, value_hash)
+        lower_key = (data['type'], False, value_lower_hash)
+        if case_sensitive:
+            if exact_key in self.existing:
+                return False
+        else:
+            if lower_key in self.existing:
+                return False
+
+        # Verify the confidence (has default).
+        if 'confidence' not in data:
+            # Check the cache for the default indicator confidence.
+            if self.cache['default_confidence']:
+                confidence = self.cache['default_confidence']
+            else:
+                confidence = IndicatorConfidence.query.order_by(IndicatorConfidence.id).limit(1).first()
+                if not confidence:
+                    raise BulkCreateError(400, 'No indicator confidence values exist to use as default')
+
+                # Add the default confidence to the cache.
+                self.cache['default_confidence'] = confidence
+        else:
+            # Check the cache for this indicator confidence.
+            if data['confidence'] in self.cache['confidences']:
+                confidence = self.cache['confidences'][data['confidence']]
+            else:
+                confidence = IndicatorConfidence.query.filter_by(value=data['confidence']).first()
+                if not confidence:
+                    if current_app.config['INDICATOR_AUTO_CREATE_INDICATORCONFIDENCE']:
+                        confidence = IndicatorConfidence(value=data['confidence'])
+                        created.append(confidence)
+                    else:
+                        raise BulkCreateError(404, 'Indicator confidence not found: {}'.format(data['confidence']))
+
+                # Add the indicator confidence to the cache.
+                self.cache['confidences'][data['confidence']] = confidence
+
+        # Verify the impact (has default).
+        if 'impact' not in data:
+            # Check the cache for the default indicator impact.
+            if self.cache['default_impact']:
+                impact = self.cache['default_impact']
+            else:
+                impact = IndicatorImpact.query.order_by(IndicatorImpact.id).limit(1).first()
+                if not impact:
+                    raise BulkCreateError(400, 'No indicator impact values exist to use as default')
+
+                # Add the default impact to the cache.
+                self.cache['default_impact'] = impact
+        else:
+            # Check the cache for this indicator impact.
+            if data['impact'] in self.cache['impacts']:
+                impact = self.cache['impacts'][data['impact']]
+            else:
+                impact = IndicatorImpact.query.filter_by(value=data['impact']).first()
+                if not impact:
+                    if current_app.config['INDICATOR_AUTO_CREATE_INDICATORIMPACT']:
+                        impact = IndicatorImpact(value=data['impact'])
+                        created.append(impact)
+                    else:
+                        raise BulkCreateError(404, 'Indicator impact not found: {}'.format(data['impact']))
+
+                # Add the indicator impact to the cache.
+                self.cache['impacts'][data['impact']] = impact
+
+        # Verify the status (has default).
+        if 'status' not in data:
+            # Check the cache for the default indicator status.
+            if self.cache['default_status']:
+                status = self.cache['default_status']
+            else:
+                status = IndicatorStatus.query.order_by(IndicatorStatus.id).limit(1).first()
+                if not status:
+                    raise BulkCreateError(400, 'No indicator status values exist to use as default')
+
+                # Add the default status to the cache.
+                self.cache['default_status'] = status
+        else:
+            # Check the cache for this indicator status.
+            if data['status'] in self.cache['statuses']:
+                status = self.cache['statuses'][data['status']]
+            else:
+                status = IndicatorStatus.query.filter_by(value=data['status']).first()
+                if not status:
+                    if current_app.config['INDICATOR_AUTO_CREATE_INDICATORSTATUS']:
+                        status = IndicatorStatus(value=data['status'])
+                        created.append(status)
+                    else:
+                        raise BulkCreateError(404, 'Indicator status not found: {}'.format(data['status']))
+
+                # Add the indicator status to the cache.
+                self.cache['statuses'][data['status']] = status
+
+        # Verify the substring value (defaults to False).
+        if 'substring' in data:
+            substring = data['substring']
+        else:
+            substring = False
+
+        # Verify any campaign that was specified.
+        campaigns = []
+        if 'campaigns' in data:
+            for value in data['campaigns']:
+                # Check the cache for this campaign.
+                if value in self.cache['campaigns']:
+                    campaign = self.cache['campaigns'][value]
+                else:
+                    campaign = Campaign.query.filter_by(name=value).first()
+                    if not campaign:
+                        if current_app.config['INDICATOR_AUTO_CREATE_CAMPAIGN']:
+                            campaign = Campaign(name=value)
+                            created.append(campaign)
+                        else:
+                            raise BulkCreateError(404, 'Campaign not found: {}'.format(value))
+
+                    # Add this campaign to the cache.
+                    self.cache['campaigns'][value] = campaign
+
+                campaigns.append(campaign)
+
+        # Verify any references that were specified.
+        references = []
+        if 'references' in data:
+            for item in data['references']:
+
+                # Check the cache for this source+reference pair.
+                if '{}{}'.format(item['source'], item['reference']) in self.cache['references']:
+                    reference = self.cache['references']['{}{}'.format(item['source'], item['reference'])]
+                else:
+                    reference = IntelReference.query.filter(and_(IntelReference.reference == item['reference'],
+                                                                 IntelReference.source.has(
+                                                                     IntelSource.value == item['source']))).first()
+                    if not reference:
+                        if current_app.config['INDICATOR_AUTO_CREATE_INTELREFERENCE']:
+
+                            # Check the cache for this source.
+                            if item['source'] in self.cache['sources']:
+                                source = self.cache['sources'][item['source']]
+                            else:
+                                source = IntelSource.query.filter_by(value=item['source']).first()
+                                if not source:
+                                    source = IntelSource(value=item['source'])
+                                    created.append(source)
+
+                                # Add this source to the cache.
+                                self.cache['sources'][item['source']] = source
+
+                            reference = IntelReference(reference=item['reference'], source=source, user=user)
+                            created.append(reference)
+                        else:
+                            raise BulkCreateError(404, 'Intel reference not found: {}'.format(item['reference']))
+
+                    # Add this reference to the cache.
+                    self.cache['references']['{}{}'.format(item['source'], item['reference'])] = reference
+
+                references.append(reference)
+
+        # Verify any tags that were specified.
+        tags = []
+        if 'tags' in data:
+            for value in data['tags']:
+
+                # Check the cache for this tag.
+                if value in self.cache['tags']:
+                    tag = self.cache['tags'][value]
+                else:
+                    tag = Tag.query.filter_by(value=value).first()
+                    if not tag:
+                        if current_app.config['INDICATOR_AUTO_CREATE_TAG']:
+                            tag = Tag(value=value)
+                            created.append(tag)
+                        else:
+                            raise BulkCreateError(404, 'Tag not found: {}'.format(value))
+
+                    # Add this tag to the cache.
+                    self.cache['tags'][value] = tag
+
+                tags.append(tag)
+
+        self.existing.add(exact_key)
+        self.existing.add(lower_key)
+
+        self.pending.append({'case_sensitive': case_sensitive,
+                             'confidence': confidence,
+                             'impact': impact,
+                             'ip_range': ip_range(data['value']),
+                             'status': status,
+                             'substring': substring,
+                             'type': indicator_type,
+                             'user': user,
+                             'value': data['value'],
+                             'value_hash': value_hash,
+                             'value_lower_hash': value_lower_hash,
+                             'campaigns': campaigns,
+                             'references': references,
+                             'tags': tags})
+        return True
+
+    def flush(self):
+        """ Writes the queued indicators and their mappings to the database. Returns the number of indicators.
+
+        The caller is expected to commit right afterward, since the modified times are set for a prompt commit. """
+
+        if not self.pending:
+            return 0
+
+        chunk_size = current_app.config['BULK_INSERT_CHUNK_SIZE']
+
+        # Flush any automatically created supporting objects so that they have IDs.
+        db.session.flush()
+
+        # Insert the indicators with multi-row INSERT statements.
+        now = datetime.datetime.utcnow()
+        rows = [{'case_sensitive': p['case_sensitive'],
+                 'confidence_id': p['confidence'].id,
+                 'created_time': now,
+                 'impact_id': p['impact'].id,
+                 'ip_end': p['ip_range'][1],
+                 'ip_start': p['ip_range'][0],
+                 'modified_time': now,
+                 'status_id': p['status'].id,
+                 'substring': p['substring'],
+                 'type_id': p['type'].id,
+                 'user_id': p['user'].id,
+                 'value': p['value'],
+                 'value_hash': p['value_hash'],
+                 'value_lower_hash': p['value_lower_hash']} for p in self.pending]
+        for rows_chunk in chunk_list(rows, chunk_size):
+            db.session.execute(Indicator.__table__.insert(), rows_chunk)
+
+        # Read the new IDs back through the unique type+value_hash index.
+        grouped_digests = {}
+        for p in self.pending:
+            if p['type'].id not in grouped_digests:
+                grouped_digests[p['type'].id] = []
+            grouped_digests[p['type'].id].append(p['value_hash'])
+
+        ids = {}
+        for type_id, digests in grouped_digests.items():
+            for digests_chunk in chunk_list(digests, current_app.config['BULK_QUERY_CHUNK_SIZE']):
+                query = db.session.query(Indicator.id, Indicator.value_hash)
+                query = query.filter(Indicator.type_id == type_id, Indicator.value_hash.in_(digests_chunk))
+                for x in query:
+                    ids[(type_id, x[1])] = x[0]
+
+        # Build the mapping table rows.
+        campaign_rows = set()
+        reference_rows = set()
+        tag_rows = set()
+        for p in self.pending:
+            indicator_id = ids[(p['type'].id, p['value_hash'])]
+            campaign_rows.update((indicator_id, c.id) for c in p['campaigns'])
+            reference_rows.update((indicator_id, r.id) for r in p['references'])
+            tag_rows.update((indicator_id, t.id) for t in p['tags'])
+
+        mappings = [(indicator_campaign_association, 'campaign_id', campaign_rows),
+                    (indicator_reference_association, 'intel_reference_id', reference_rows),
+                    (indicator_tag_association, 'tag_id', tag_rows)]
+        for table, column, mapping_rows in mappings:
+            mapping_rows = [{'indicator_id': x[0], column: x[1]} for x in mapping_rows]
+            for rows_chunk in chunk_list(mapping_rows, chunk_size):
+                db.session.execute(table.insert(), rows_chunk)
+
+        # The Core inserts skip the mapper events, so index the values for substring searches here.
+        trigram_insert_rows = []
+        for p in self.pending:
+            trigram_insert_rows += trigram_rows(ids[(p['type'].id, p['value_hash'])], p['value'])
+        for rows_chunk in chunk_list(trigram_insert_rows, chunk_size):
+            db.session.execute(indicator_trigram.insert(), rows_chunk)
+
+        # The count tables are kept by a session event that only sees ORM changes, so add these here too.
+        counts = Counter()
+        tag_counts = Counter()
+        campaign_counts = Counter()
+        for p in self.pending:
+            counts[(p['type'].id, p['status'].id, p['confidence'].id, p['impact'].id)] += 1
+        for x in tag_rows:
+            tag_counts[x[1]] += 1
+        for x in campaign_rows:
+            campaign_counts[x[1]] += 1
+        add_indicator_counts(db.session.connection(), counts, tag_counts, campaign_counts)
+        mark_write(db.session)
+
+        # The change feed holds back the changes newer than INDICATOR_CHANGES_DELAY_SECONDS until they are visible.
+        # If writing the indicators took a good part of that, a client could already be past their modified time
+        # by the time the caller commits, so move it up to now.
+        modified_time = datetime.datetime.utcnow()
+        if (modified_time - now).total_seconds() >= current_app.config['INDICATOR_CHANGES_DELAY_SECONDS'] / 2:
+            for ids_chunk in chunk_list(list(ids.values()), current_app.config['BULK_QUERY_CHUNK_SIZE']):
+                db.session.execute(Indicator.__table__.update().where(Indicator.id.in_(ids_chunk)).values(
+                    modified_time=modified_time))
+
+        num_created = len(self.pending)
+        self.pending = []
+        return num_created
+
+    def create_chunk(self, items):
+        """ Creates and commits a chunk of indicator dictionaries, skipping the ones that cannot be created.
+
+        Returns a (result, msg) tuple for each item, where result is "created", "skipped", or "error".
+
+        If another request commits an identical indicator while the chunk is being written, the unique type+value
+        index rolls back the whole chunk. The chunk is then checked against the database again and retried, so
+        only the items that were created in the meantime are reported as errors.
+        """
+
+        attempted = set()
+        for attempt in range(CREATE_CHUNK_ATTEMPTS):
+
+            # Duplicates from any earlier chunks are already committed, so only this chunk needs to be tracked.
+            self.existing.clear()
+            self.find_existing(items)
+
+            results = []
+            for i, data in enumerate(items):
+                try:
+                    if self.add(data):
+                        results.append(('created', None))
+                        attempted.add(i)
+                    elif i in attempted:
+                        results.append(('error', 'Indicator already exists'))
+                    else:
+                        results.append(('skipped', None))
+                except BulkCreateError as e:
+                    results.append(('error', e.msg))
+
+            try:
+                self.flush()
+                db.session.commit()
+                return results
+            except exc.IntegrityError:
+                # Any automatically created supporting objects in the cache were rolled back too.
+                db.session.rollback()
+                self.reset()
+                if attempt == CREATE_CHUNK_ATTEMPTS - 1:
+                    raise
@@ -0,0 +1,195 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+from collections import OrderedDict
+from flask import current_app
+
+
+class StatementCache:
+    """ A least recently used cache of compiled SQL statements with hit and miss counters.
+
+    The statements are compiled with bound parameters in place of the request values, so the same
+    compiled statement is reused by every request with the same shape. """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._statements = OrderedDict()
+
+    def get(self, key, build):
+        """ Returns the statement for the key, calling build() to create it if it is not cached. """
+
+        with self._lock:
+            statement = self._statements.get(key)
+            if statement is not None:
+                self._statements.move_to_end(key)
+                self.hits += 1
+                return statement
+            self.misses += 1
+
+        # Build the statement outside of the lock since it is the slow part.
+        statement = build()
+
+        with self._lock:
+            self._statements[key] = statement
+            self._statements.move_to_end(key)
+            while len(self._statements) > self.max_size:
+                self._statements.popitem(last=False)
+
+        return statement
+
+    def clear(self):
+        with self._lock:
+            self._statements.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def to_dict(self):
+        return {'hits': self.hits,
+                'max_size': self.max_size,
+                'misses': self.misses,
+                'size': len(self._statements)}
+
+
+class ResultCache:
+    """ A least recently used cache of API response bodies, bounded by their total size in bytes.
+
+    Every entry belongs to the write generation it was read at. Once the generation changes, the older
+    entries are never returned again and are dropped. If a directory is given, the entries are also saved
+    there so that the other web workers on the host can use them. """
+
+    def __init__(self, max_size, directory=None):
+        self.max_size = max_size
+        self.directory = directory
+        self.disk_hits = 0
+        self.hits = 0
+        self.misses = 0
+        self._generation = None
+        self._lock = threading.Lock()
+        self._responses = OrderedDict()
+        self._size = 0
+
+    def _path(self, key, generation):
+        digest = hashlib.sha256(json.dumps(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, str(generation), digest)
+
+    def _set_generation(self, generation):
+        # Drop everything from older generations. Must be called with the lock held.
+        if generation != self._generation:
+            self._responses.clear()
+            self._size = 0
+            self._generation = generation
+
+    def _add(self, key, headers, body):
+        # Must be called with the lock held.
+        if len(body) > self.max_size:
+            return
+
+        if key in self._responses:
+            self._size -= len(self._responses.pop(key)[1])
+        self._responses[key] = (headers, body)
+        self._size += len(body)
+
+        while self._size > self.max_size:
+            self._size -= len(self._responses.popitem(last=False)[1][1])
+
+    def get(self, key, generation):
+        """ Returns the (headers, body) tuple for the key at the generation, or None if it is not cached. """
+
+        with self._lock:
+            self._set_generation(generation)
+            response = self._responses.get(key)
+            if response is not None:
+                self._responses.move_to_end(key)
+                self.hits += 1
+                return response
+
+        if self.directory:
+            try:
+                with open(self._path(key, generation), 'rb') as f:
+                    headers, body = f.read().split(b'\n', 1)
+                response = (json.loads(headers.decode('utf-8')), body)
+            except (OSError, ValueError):
+                response = None
+
+            if response is not None:
+                with self._lock:
+                    self._add(key, *response)
+                    self.disk_hits += 1
+                return response
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, generation, headers, body):
+        """ Saves the headers and body of a response read at the generation. """
+
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._add(key, headers, body)
+
+        if self.directory:
+            self._save(key, generation, headers, body)
+
+    def _save(self, key, generation, headers, body):
+        path = self._path(key, generation)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            # Write to a temporary file first so the other workers never read a partial file.
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, 'wb') as f:
+                f.write(json.dumps(headers).encode('utf-8') + b'\n' + body)
+            os.replace(temp_path, path)
+
+            # Remove the directories of the older generations.
+            for name in os.listdir(self.directory):
+                if name.isdigit() and int(name) < generation:
+                    shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+        except OSError:
+            current_app.logger.exception('RESULT CACHE: Unable to save a response in {}'.format(self.directory))
+
+    def clear(self):
+        with self._lock:
+            self._responses.clear()
+            self._size = 0
+            self._generation = None
+            self.disk_hits = 0
+            self.hits = 0
+            self.misses = 0
+
+    def to_dict(self):
+        return {'directory': self.directory,
+                'disk_hits': self.disk_hits,
+                'entries': len(self._responses),
+                'generation': self._generation,
+                'hits': self.hits,
+                'max_size': self.max_size,
+                'misses': self.misses,
+                'size': self._size}
+
+
+# The result cache is created the first time it is used since its size comes from the app config.
+result_cache = None
+
+
+def get_result_cache():
+    """ Returns the result cache, or None if it is disabled. """
+
+    global result_cache
+
+    if not current_app.config['INDICATOR_RESULT_CACHE_SIZE']:
+        return None
+
+    if result_cache is None:
+        result_cache = ResultCache(current_app.config['INDICATOR_RESULT_CACHE_SIZE'],
+                                   directory=current_app.config['INDICATOR_RESULT_CACHE_DIR'])
+    return result_cache
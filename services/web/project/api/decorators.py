@@ -1,14 +1,17 @@
 import gzip
+import hashlib
+import json
 
-from flask import current_app, request, after_this_request
+from flask import current_app, make_response, request, after_this_request, Response
 from functools import wraps
 from jsonschema import validate
 from jsonschema.exceptions import SchemaError, ValidationError
 from werkzeug.exceptions import BadRequest
 
 from project import db
+from project.api.cache import get_result_cache
 from project.api.errors import error_response
-from project.models import User
+from project.models import User, get_write_generation
 
 
 def gzipped_response(function):
@@ -36,6 +39,65 @@ def gzipped_response(function):
     return decorated_function
 
 
+def _request_key():
+    # The stream parameter only changes how the response is sent, so it is not part of the key.
+    params = tuple(sorted((k, v) for k, v in request.args.items(multi=True) if k != 'stream'))
+    return request.path, params
+
+
+def etag_response(function):
+    """ Adds a strong ETag to the response and returns 304 Not Modified if the client already has it.
+
+    The read routes can only return something different after a write to the database, so the ETag is
+    built from the request and the write generation without calling the route. """
+
+    @wraps(function)
+    def decorated_function(*args, **kwargs):
+        etag = hashlib.sha1(json.dumps([get_write_generation(), *_request_key()]).encode('utf-8')).hexdigest()
+
+        if etag in request.if_none_match:
+            response = Response(status=304)
+            response.set_etag(etag)
+            return response
+
+        response = make_response(function(*args, **kwargs))
+        if response.status_code == 200:
+            response.set_etag(etag)
+        return response
+
+    return decorated_function
+
+
+def cache_response(function):
+    """ Returns the cached response if nothing has been written to the database since it was cached.
+
+    The responses are cached by the request path and query parameters. The stream parameter only changes how
+    the response is sent, so it is ignored, and streamed responses are not cached. """
+
+    @wraps(function)
+    def decorated_function(*args, **kwargs):
+        result_cache = get_result_cache()
+        if result_cache is None:
+            return function(*args, **kwargs)
+
+        key = _request_key()
+        generation = get_write_generation()
+
+        cached = result_cache.get(key, generation)
+        if cached is not None:
+            headers, body = cached
+            return Response(body, status=200, headers=headers)
+
+        response = make_response(function(*args, **kwargs))
+        if response.status_code == 200 and not response.is_streamed:
+            headers = [[k, v] for k, v in response.headers.items() if k in ['Content-Encoding', 'Content-Type']]
+            result_cache.put(key, generation, headers, response.get_data())
+
+        return response
+
+    return decorated_function
+
+
 def check_apikey(function):
     """ Checks if the HTTP method exists in the app's config.
     If it does, it uses the value as the user role required to perform the function. """
@@ -0,0 +1,128 @@
+import os
+import re
+import tempfile
+import zlib
+
+from flask import current_app
+
+from project import db
+from project.api.helpers import gzip_json_list
+from project.models import Indicator, IndicatorStatus, IndicatorType, get_write_generation, indicator_count
+
+# Feed names are made of slugs, so they are always safe to use as file names.
+FEED_NAME = re.compile(r'^[a-z0-9_-]+\.(json|txt)$')
+
+# The file in the feed directory that holds the write generation the feeds were built at.
+GENERATION_FILE = 'generation'
+
+
+def feed_slug(value):
+    return re.sub('[^a-z0-9]+', '-', value.lower()).strip('-')
+
+
+def read_feed_generation(directory):
+    """ Returns the write generation the feeds in the directory were built at, or None if they were never built. """
+
+    try:
+        with open(os.path.join(directory, GENERATION_FILE)) as f:
+            return int(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def list_feeds(directory):
+    return sorted(name for name in os.listdir(directory) if FEED_NAME.match(name))
+
+
+def _open_temp(directory):
+    fd, path = tempfile.mkstemp(dir=directory, prefix='.')
+
+    # mkstemp only lets the owner read the file, but nginx runs as a different user.
+    os.fchmod(fd, 0o644)
+    return os.fdopen(fd, 'wb'), path
+
+
+def _write_feed(directory, name, criteria):
+    # Write the JSON and plain-text versions of the feed in one pass over the matching indicators.
+    json_file, json_path = _open_temp(directory)
+    text_file, text_path = _open_temp(directory)
+    try:
+        text_compressor = zlib.compressobj(9, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+
+        def batches():
+            statement = db.select([Indicator.id, IndicatorType.value, Indicator.value]).select_from(
+                db.join(Indicator, IndicatorType, Indicator.type_id == IndicatorType.id)).where(
+                db.and_(*criteria)).order_by(Indicator.id)
+            connection = db.session.connection().execution_options(stream_results=True)
+            result = connection.execute(statement)
+            while True:
+                rows = result.fetchmany(current_app.config['INDICATOR_STREAM_BATCH_SIZE'])
+                if not rows:
+                    break
+
+                # Values with line breaks cannot be written one per line, so they are only in the JSON feed.
+                text = ''.join(x[2] + '\n' for x in rows if '\n' not in x[2] and '\r' not in x[2])
+                text_file.write(text_compressor.compress(text.encode('utf-8')))
+                yield [{'id': x[0], 'type': x[1], 'value': x[2]} for x in rows]
+
+        for chunk in gzip_json_list(batches()):
+            json_file.write(chunk)
+        text_file.write(text_compressor.flush())
+
+        json_file.close()
+        text_file.close()
+        os.replace(json_path, os.path.join(directory, name + '.json'))
+        os.replace(text_path, os.path.join(directory, name + '.txt'))
+    finally:
+        json_file.close()
+        text_file.close()
+        for path in [json_path, text_path]:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def build_feeds(directory):
+    """ Writes the gzip compressed feed files of every status, type, and status and type pair to the directory.
+
+    The feeds are read in the same transaction as the write generation, so every file matches the generation that
+    is saved with them. Each file is replaced atomically, and the feeds of deleted statuses and types are removed.
+    Only one generator should write to the directory at a time. Returns the generation. """
+
+    # Remove the temporary files left behind if an earlier run was stopped.
+    for name in os.listdir(directory):
+        if name.startswith('.'):
+            os.remove(os.path.join(directory, name))
+
+    generation = get_write_generation()
+
+    statuses = {x.id: feed_slug(x.value) for x in IndicatorStatus.query}
+    types = {x.id: feed_slug(x.value) for x in IndicatorType.query}
+
+    feeds = {}
+    for status_id, slug in statuses.items():
+        feeds['status_{}'.format(slug)] = [Indicator.status_id == status_id]
+    for type_id, slug in types.items():
+        feeds['type_{}'.format(slug)] = [Indicator.type_id == type_id]
+
+    # Only the pairs that have indicators get their own feed, which the count tables already know.
+    pairs = db.session.query(indicator_count.c.status_id, indicator_count.c.type_id).filter(
+        indicator_count.c.count > 0).distinct()
+    for status_id, type_id in pairs:
+        if status_id in statuses and type_id in types:
+            feeds['status_{}__type_{}'.format(statuses[status_id], types[type_id])] = [
+                Indicator.status_id == status_id, Indicator.type_id == type_id]
+
+    for name, criteria in sorted(feeds.items()):
+        _write_feed(directory, name, criteria)
+
+    current = {name + extension for name in feeds for extension in ['.json', '.txt']}
+    for name in list_feeds(directory):
+        if name not in current:
+            os.remove(os.path.join(directory, name))
+
+    f, path = _open_temp(directory)
+    with f:
+        f.write(str(generation).encode('utf-8'))
+    os.replace(path, os.path.join(directory, GENERATION_FILE))
+
+    return generation
@@ -0,0 +1,664 @@
+import datetime
+import re
+
+from dateutil.parser import parse
+from flask import current_app
+from sqlalchemy import Float, and_, bindparam, func, or_
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ColumnElement
+
+from project import db
+from project.api.cache import StatementCache
+from project.api.helpers import parse_boolean
+from project.models import Campaign, Indicator, IndicatorConfidence, IndicatorImpact, IndicatorStatus, IndicatorType, \
+    IntelReference, IntelSource, Tag, UNFOLDED_TRIGRAM, User, fold_value, indicator_campaign_association, \
+    indicator_campaign_count, indicator_count, indicator_reference_association, indicator_tag_association, \
+    indicator_tag_count, indicator_trigram, value_trigrams
+
+# The cache is created the first time it is used since its size comes from the app config.
+statement_cache = None
+
+
+def get_statement_cache():
+    global statement_cache
+
+    if statement_cache is None:
+        statement_cache = StatementCache(current_app.config['INDICATOR_STATEMENT_CACHE_SIZE'])
+    return statement_cache
+
+
+class FullTextMatch(ColumnElement):
+    """ MATCH (column) AGAINST (value) on a column with a FULLTEXT index. Its value is the relevance score,
+    and it can be used directly as a WHERE filter to find the rows that match. """
+
+    type = Float()
+
+    def __init__(self, column, against, boolean=False):
+        self.column = column
+        self.against = against
+        self.boolean = boolean
+
+    @property
+    def _from_objects(self):
+        return self.column._from_objects
+
+
+@compiles(FullTextMatch)
+def compile_full_text_match(element, compiler, **kwargs):
+    return 'MATCH ({}) AGAINST ({} IN {} MODE)'.format(compiler.process(element.column, **kwargs),
+                                                       compiler.process(element.against, **kwargs),
+                                                       'BOOLEAN' if element.boolean else 'NATURAL LANGUAGE')
+
+
+def parse_full_text_mode(args):
+    """ Returns True for boolean mode, False for natural language mode, or None if the q_mode is invalid. """
+
+    q_mode = args.get('q_mode', 'natural')
+    if q_mode not in ['boolean', 'natural']:
+        return None
+    return q_mode == 'boolean'
+
+
+def _list_arg(value):
+    # Split a comma-separated list parameter and figure out its AND or OR mode.
+    list_mode = 'and'
+    if '[OR]' in value:
+        list_mode = 'or'
+        value = value.replace('[OR]', '')
+
+    values = value.split(',')
+
+    # The mode does not change the query when there is only one value.
+    if len(values) == 1:
+        list_mode = 'and'
+
+    return list_mode, values
+
+
+def search_trigrams(value):
+    # Returns the trigrams that every value matching the LIKE pattern '%value%' must contain. The LIKE
+    # wildcards (and the escape character) can match anything, so only the literal text between them is used.
+    # Non-ASCII text that is left after folding can match other text under the collation, so it is not narrowed.
+    trigrams = set()
+    for piece in re.split(r'[%_\\]', value):
+        if not fold_value(piece).isascii():
+            return []
+        trigrams |= value_trigrams(piece)
+    return sorted(trigrams)
+
+
+def parse_indicator_filters(args):
+    """ Splits the indicator list filters into their shape and their values.
+
+    The shape is a hashable tuple of which filters are used, how many values each list filter has and
+    which AND/OR mode it uses. Every request with the same shape uses the same SQL statement, and the
+    values are passed to it as bound parameters. """
+
+    shape = []
+    params = {}
+
+    if 'campaigns' in args:
+        list_mode, values = _list_arg(args.get('campaigns'))
+        shape.append(('campaigns', list_mode, len(values)))
+        for i, value in enumerate(values):
+            params['campaigns_{}'.format(i)] = value
+
+    if 'case_sensitive' in args:
+        shape.append(('case_sensitive', parse_boolean(args.get('case_sensitive'), default=None)))
+
+    if 'confidence' in args:
+        shape.append(('confidence',))
+        params['confidence'] = args.get('confidence')
+
+    if 'created_after' in args:
+        shape.append(('created_after',))
+        try:
+            params['created_after'] = parse(args.get('created_after'), ignoretz=True)
+        except (ValueError, OverflowError):
+            params['created_after'] = datetime.date.max
+
+    if 'created_before' in args:
+        shape.append(('created_before',))
+        try:
+            params['created_before'] = parse(args.get('created_before'), ignoretz=True)
+        except (ValueError, OverflowError):
+            params['created_before'] = datetime.date.min
+
+    if 'exact_value' in args:
+        shape.append(('exact_value',))
+        params['exact_value'] = args.get('exact_value')
+
+    if 'impact' in args:
+        shape.append(('impact',))
+        params['impact'] = args.get('impact')
+
+    if 'modified_after' in args:
+        shape.append(('modified_after',))
+        try:
+            params['modified_after'] = parse(args.get('modified_after'))
+        except (ValueError, OverflowError):
+            params['modified_after'] = datetime.date.max
+
+    if 'modified_before' in args:
+        shape.append(('modified_before',))
+        try:
+            params['modified_before'] = parse(args.get('modified_before'))
+        except (ValueError, OverflowError):
+            params['modified_before'] = datetime.date.min
+
+    for flag in ['no_campaigns', 'no_references', 'no_tags']:
+        if flag in args:
+            shape.append((flag,))
+
+    for name in ['not_campaigns', 'not_sources', 'not_tags', 'not_users']:
+        if name in args:
+            values = args.get(name).split(',')
+            shape.append((name, len(values)))
+            for i, value in enumerate(values):
+                params['{}_{}'.format(name, i)] = value
+
+    if 'q' in args:
+        shape.append(('q', parse_full_text_mode(args)))
+        params['q'] = args.get('q')
+
+    if 'reference' in args:
+        shape.append(('reference',))
+        params['reference'] = args.get('reference')
+
+    if 'sources' in args:
+        list_mode, values = _list_arg(args.get('sources'))
+        shape.append(('sources', list_mode, len(values)))
+        for i, value in enumerate(values):
+            params['sources_{}'.format(i)] = value
+
+    if 'status' in args:
+        shape.append(('status',))
+        params['status'] = args.get('status')
+
+    if 'substring' in args:
+        shape.append(('substring', parse_boolean(args.get('substring'), default=None)))
+
+    if 'tags' in args:
+        list_mode, values = _list_arg(args.get('tags'))
+        shape.append(('tags', list_mode, len(values)))
+        for i, value in enumerate(values):
+            params['tags_{}'.format(i)] = value
+
+    if 'type' in args:
+        shape.append(('type',))
+        params['type'] = args.get('type')
+
+    if 'types' in args:
+        values = args.get('types').split(',')
+        shape.append(('types', len(values)))
+        for i, value in enumerate(values):
+            params['types_{}'.format(i)] = value
+
+    if 'user' in args:
+        shape.append(('user',))
+        params['user'] = args.get('user')
+
+    if 'users' in args:
+        list_mode, values = _list_arg(args.get('users'))
+        shape.append(('users', list_mode, len(values)))
+        for i, value in enumerate(values):
+            params['users_{}'.format(i)] = value
+
+    if 'value' in args:
+        trigrams = search_trigrams(args.get('value'))
+        shape.append(('value', len(trigrams)))
+        params['value'] = '%{}%'.format(args.get('value'))
+        for i, trigram in enumerate(trigrams):
+            params['value_trigram_{}'.format(i)] = trigram
+
+    return tuple(shape), params
+
+
+def _list_filter(column, name, list_mode, count, filters, having):
+    # Add the filter for a comma-separated list parameter. AND mode needs every value to match one of the
+    # indicator's joined rows, so it is checked with HAVING after the rows are grouped by indicator.
+    params = [bindparam('{}_{}'.format(name, i)) for i in range(count)]
+
+    if count == 1:
+        filters.append(column == params[0])
+    elif list_mode == 'and':
+        having.append(and_(*[func.sum(column == p) > 0 for p in params]))
+    else:
+        filters.append(or_(*[column == p for p in params]))
+
+
+def build_indicator_filters(shape):
+    """ Builds the join, WHERE filters, HAVING filters and GROUP BY flag for the shape of a request. """
+
+    filters = []
+    groupby = False
+    having = []
+    already_joined = set()
+    already_outerjoined = set()
+
+    def join_references(join):
+        if 'indicator_reference_association' not in already_joined:
+            join = db.join(join, indicator_reference_association)
+            already_joined.add('indicator_reference_association')
+
+        if 'IntelReference' not in already_joined:
+            join = db.join(join, IntelReference, indicator_reference_association.c.intel_reference_id == IntelReference.id)
+            already_joined.add('IntelReference')
+
+        return join
+
+    def join_sources(join):
+        join = join_references(join)
+
+        if 'IntelSource' not in already_joined:
+            join = db.join(join, IntelSource, IntelReference.intel_source_id == IntelSource.id)
+            already_joined.add('IntelSource')
+
+        return join
+
+    def join_users(join):
+        join = join_references(join)
+
+        if 'User' not in already_joined:
+            join = db.join(join, User, IntelReference.user_id == User.id)
+            already_joined.add('User')
+
+        return join
+
+    # Start building the JOINS that we will need.
+    join = db.join(Indicator, IndicatorType, Indicator.type_id == IndicatorType.id)
+    already_joined.add('IndicatorType')
+
+    for name, *options in shape:
+
+        if name == 'campaigns':
+            if 'indicator_campaign_association' not in already_joined:
+                join = db.join(join, indicator_campaign_association)
+                already_joined.add('indicator_campaign_association')
+
+            if 'Campaign' not in already_joined:
+                join = db.join(join, Campaign, indicator_campaign_association.c.campaign_id == Campaign.id)
+                already_joined.add('Campaign')
+
+            groupby = True
+            _list_filter(Campaign.name, 'campaigns', options[0], options[1], filters, having)
+
+        elif name == 'case_sensitive':
+            filters.append(Indicator.case_sensitive.is_(options[0]))
+
+        elif name == 'confidence':
+            if 'IndicatorConfidence' not in already_joined:
+                join = db.join(join, IndicatorConfidence, Indicator.confidence_id == IndicatorConfidence.id)
+                already_joined.add('IndicatorConfidence')
+            filters.append(IndicatorConfidence.value == bindparam('confidence'))
+
+        elif name == 'created_after':
+            filters.append(bindparam('created_after') < Indicator.created_time)
+
+        elif name == 'created_before':
+            filters.append(Indicator.created_time < bindparam('created_before'))
+
+        elif name == 'exact_value':
+            filters.append(Indicator.value == bindparam('exact_value'))
+
+        # The IDs of the indicators that matched the bitmap index, which are passed as a list.
+        elif name == 'ids':
+            filters.append(Indicator.id.in_(bindparam('ids', expanding=True)))
+
+        elif name == 'impact':
+            if 'IndicatorImpact' not in already_joined:
+                join = db.join(join, IndicatorImpact, Indicator.impact_id == IndicatorImpact.id)
+                already_joined.add('IndicatorImpact')
+            filters.append(IndicatorImpact.value == bindparam('impact'))
+
+        elif name == 'modified_after':
+            filters.append(bindparam('modified_after') < Indicator.modified_time)
+
+        elif name == 'modified_before':
+            filters.append(Indicator.modified_time < bindparam('modified_before'))
+
+        # TODO: Try and remove ~
+        elif name == 'no_campaigns':
+            if 'indicator_campaign_association' not in already_outerjoined:
+                join = db.outerjoin(join, indicator_campaign_association)
+                already_outerjoined.add('indicator_campaign_association')
+            filters.append(~Indicator.campaigns.any())
+
+        # TODO: Try and remove ~
+        elif name == 'no_references':
+            if 'indicator_reference_association' not in already_outerjoined:
+                join = db.outerjoin(join, indicator_reference_association)
+                already_outerjoined.add('indicator_reference_association')
+            filters.append(~Indicator.references.any())
+
+        # TODO: Try and remove ~
+        elif name == 'no_tags':
+            if 'indicator_tag_association' not in already_outerjoined:
+                join = db.outerjoin(join, indicator_tag_association)
+                already_outerjoined.add('indicator_tag_association')
+            filters.append(~Indicator.tags.any())
+
+        elif name == 'not_campaigns':
+            if 'indicator_campaign_association' not in already_outerjoined:
+                join = db.outerjoin(join, indicator_campaign_association)
+                already_outerjoined.add('indicator_campaign_association')
+            groupby = True
+            for i in range(options[0]):
+                filters.append(~Indicator.campaigns.any(Campaign.name == bindparam('not_campaigns_{}'.format(i))))
+
+        elif name == 'not_sources':
+            join = join_sources(join)
+            groupby = True
+            for i in range(options[0]):
+                filters.append(IntelSource.value != bindparam('not_sources_{}'.format(i)))
+
+        elif name == 'not_tags':
+            if 'indicator_tag_association' not in already_outerjoined:
+                join = db.outerjoin(join, indicator_tag_association)
+                already_outerjoined.add('indicator_tag_association')
+            groupby = True
+            for i in range(options[0]):
+                filters.append(~Indicator.tags.any(Tag.value == bindparam('not_tags_{}'.format(i))))
+
+        elif name == 'not_users':
+            join = join_users(join)
+            groupby = True
+            for i in range(options[0]):
+                filters.append(User.username != bindparam('not_users_{}'.format(i)))
+
+        elif name == 'q':
+            filters.append(FullTextMatch(Indicator.value, bindparam('q'), boolean=options[0]))
+
+        elif name == 'reference':
+            if 'indicator_reference_association' not in already_joined:
+                join = db.join(join, indicator_reference_association)
+                already_joined.add('indicator_reference_association')
+            groupby = True
+            filters.append(Indicator.references.any(IntelReference.reference == bindparam('reference')))
+
+        elif name == 'sources':
+            join = join_sources(join)
+            groupby = True
+            _list_filter(IntelSource.value, 'sources', options[0], options[1], filters, having)
+
+        elif name == 'status':
+            if 'IndicatorStatus' not in already_joined:
+                join = db.join(join, IndicatorStatus, Indicator.status_id == IndicatorStatus.id)
+                already_joined.add('IndicatorStatus')
+            filters.append(IndicatorStatus.value == bindparam('status'))
+
+        elif name == 'substring':
+            filters.append(Indicator.substring.is_(options[0]))
+
+        elif name == 'tags':
+            if 'indicator_tag_association' not in already_joined:
+                join = db.join(join, indicator_tag_association)
+                already_joined.add('indicator_tag_association')
+
+            if 'Tag' not in already_joined:
+                join = db.join(join, Tag, indicator_tag_association.c.tag_id == Tag.id)
+                already_joined.add('Tag')
+
+            groupby = True
+            _list_filter(Tag.value, 'tags', options[0], options[1], filters, having)
+
+        elif name == 'type':
+            filters.append(IndicatorType.value == bindparam('type'))
+
+        # Only supports OR logic since indicators only have one type.
+        elif name == 'types':
+            _list_filter(IndicatorType.value, 'types', 'or', options[0], filters, having)
+
+        elif name == 'user':
+            join = join_users(join)
+            groupby = True
+            filters.append(User.username == bindparam('user'))
+
+        elif name == 'users':
+            join = join_users(join)
+            groupby = True
+            _list_filter(User.username, 'users', options[0], options[1], filters, having)
+
+        # Narrow the candidates to the indicators that have every trigram of the search value using the
+        # trigram index, and then check the candidates with LIKE. Values shorter than three characters
+        # have no trigrams and fall back to only using LIKE, and so do the indicators whose values could
+        # not be folded.
+        elif name == 'value':
+            if options[0]:
+                trigrams = [bindparam('value_trigram_{}'.format(i)) for i in range(options[0])]
+                candidates = db.select([indicator_trigram.c.indicator_id])
+                candidates = candidates.where(indicator_trigram.c.trigram.in_(trigrams))
+                candidates = candidates.group_by(indicator_trigram.c.indicator_id)
+                candidates = candidates.having(func.count() == options[0])
+                unfolded = db.select([indicator_trigram.c.indicator_id]).where(
+                    indicator_trigram.c.trigram == UNFOLDED_TRIGRAM)
+                filters.append(Indicator.id.in_(db.union(candidates, unfolded)))
+            filters.append(Indicator.value.like(bindparam('value')))
+
+    return join, filters, having, groupby
+
+
+def build_indicator_statement(shape, count=False, after_id=False, limit=False, relevance=False, id_only=False,
+                              lower_hash_only=False):
+    """ Builds the indicator list (or count) statement for the shape of a request.
+
+    The after_id and limit flags add the pagination clauses, which use the after_id and limit parameters.
+    The relevance flag sorts the results by their full-text search score before their ID. The id_only flag
+    only selects the indicator IDs, and the lower_hash_only flag their unsorted lowercase value hashes. The IDs
+    are unsorted unless they are paginated with the after_id and limit flags. """
+
+    join, filters, having, groupby = build_indicator_filters(shape)
+
+    if id_only or lower_hash_only:
+        query = db.select([Indicator.id if id_only else Indicator.value_lower_hash])
+        if groupby:
+            query = query.group_by(Indicator.id)
+        if having:
+            query = query.having(*having)
+        query = query.select_from(join)
+        for f in filters:
+            query = query.where(f)
+        if after_id:
+            query = query.where(Indicator.id > bindparam('after_id'))
+        if limit:
+            query = query.order_by(Indicator.id).limit(bindparam('limit'))
+        return query
+
+    # If count is enabled, just return the number of results rather than the results themselves.
+    if count:
+
+        # Check if we need to add GROUP BY
+        if groupby:
+            query = db.select([Indicator.id])
+            query = query.group_by(Indicator.id)
+        else:
+            query = db.select([func.count()])
+
+        # Check if we need to add HAVING
+        if having:
+            query = query.having(*having)
+
+        query = query.select_from(join)
+
+        # Add on all of the filters.
+        for f in filters:
+            query = query.where(f)
+
+        # If we used GROUP BY, it should run as a subquery.
+        if groupby:
+            query = db.select([func.count()]).select_from(query.alias('count'))
+
+        return query
+
+    # Build the base query to return id/type/value.
+    query = db.select([Indicator.id, IndicatorType.value, Indicator.value])
+
+    # Check if we need to add GROUP BY
+    if groupby:
+        query = query.group_by(Indicator.id)
+
+    # Check if we need to add HAVING
+    if having:
+        query = query.having(*having)
+
+    query = query.select_from(join)
+
+    # Add on all of the filters.
+    for f in filters:
+        query = query.where(f)
+
+    # Sort the results by the indicator ID, optionally after the full-text search relevance.
+    if relevance:
+        full_text_mode = next(options[0] for name, *options in shape if name == 'q')
+        query = query.order_by(FullTextMatch(Indicator.value, bindparam('q'), boolean=full_text_mode).desc())
+    query = query.order_by(Indicator.id)
+
+    # Seek past the previous page using the indicator ID instead of an OFFSET. Since this is a WHERE
+    # on the primary key, it works the same way with the GROUP BY/HAVING filters.
+    if after_id:
+        query = query.where(Indicator.id > bindparam('after_id'))
+
+    if limit:
+        query = query.limit(bindparam('limit'))
+
+    return query
+
+
+# The filters that can be answered from the indicator_count table.
+SUMMARY_COUNT_FILTERS = ('confidence', 'impact', 'status', 'type', 'types')
+
+
+def is_summary_count_shape(shape):
+    """ Returns True if the count tables keep the count for the shape of a request.
+
+    A single tag or campaign is counted from its own table, and any mix of the type, status, confidence and
+    impact filters is counted from the indicator_count table. """
+
+    if shape in [(('campaigns', 'and', 1),), (('tags', 'and', 1),)]:
+        return True
+    return all(name in SUMMARY_COUNT_FILTERS for name, *options in shape)
+
+
+def build_summary_count_statement(shape):
+    """ Builds the statement that counts the indicators for the shape of a request from the count tables. """
+
+    if shape in [(('campaigns', 'and', 1),), (('tags', 'and', 1),)]:
+        name = shape[0][0]
+        if name == 'campaigns':
+            join = db.join(indicator_campaign_count, Campaign, indicator_campaign_count.c.campaign_id == Campaign.id)
+            table, column = indicator_campaign_count, Campaign.name
+        else:
+            join = db.join(indicator_tag_count, Tag, indicator_tag_count.c.tag_id == Tag.id)
+            table, column = indicator_tag_count, Tag.value
+        query = db.select([func.coalesce(func.sum(table.c.count), 0)]).select_from(join)
+        return query.where(column == bindparam('{}_0'.format(name)))
+
+    filters = []
+    join = indicator_count
+    already_joined = set()
+
+    for name, *options in shape:
+
+        if name == 'confidence':
+            join = db.join(join, IndicatorConfidence, indicator_count.c.confidence_id == IndicatorConfidence.id)
+            filters.append(IndicatorConfidence.value == bindparam('confidence'))
+
+        elif name == 'impact':
+            join = db.join(join, IndicatorImpact, indicator_count.c.impact_id == IndicatorImpact.id)
+            filters.append(IndicatorImpact.value == bindparam('impact'))
+
+        elif name == 'status':
+            join = db.join(join, IndicatorStatus, indicator_count.c.status_id == IndicatorStatus.id)
+            filters.append(IndicatorStatus.value == bindparam('status'))
+
+        elif name in ['type', 'types']:
+            if 'IndicatorType' not in already_joined:
+                join = db.join(join, IndicatorType, indicator_count.c.type_id == IndicatorType.id)
+                already_joined.add('IndicatorType')
+            if name == 'type':
+                filters.append(IndicatorType.value == bindparam('type'))
+            else:
+                types = [bindparam('types_{}'.format(i)) for i in range(options[0])]
+                filters.append(or_(*[IndicatorType.value == t for t in types]))
+
+    query = db.select([func.coalesce(func.sum(indicator_count.c.count), 0)]).select_from(join)
+    for f in filters:
+        query = query.where(f)
+    return query
+
+
+def get_summary_count_statement(shape):
+    """ Returns the compiled count table statement for the shape of a request, or None if it cannot be used. """
+
+    if not is_summary_count_shape(shape):
+        return None
+
+    def build():
+        return build_summary_count_statement(shape).compile(dialect=db.engine.dialect)
+
+    return get_statement_cache().get(('summary', shape), build)
+
+
+"""
+The facets route saves the IDs of the matching indicators in a temporary table once, and then counts each facet
+with a grouped query joined to it. Temporary tables only exist on the connection that created them, so requests
+running at the same time do not see each other's rows.
+"""
+matched_indicator = db.Table('matched_indicator', db.MetaData(),
+                             db.Column('indicator_id', db.Integer, primary_key=True, autoincrement=False),
+                             prefixes=['TEMPORARY'])
+
+
+def drop_matched_indicator(connection):
+    # MySQL commits the current transaction on DROP TABLE unless it is told that the table is temporary.
+    if connection.dialect.name == 'mysql':
+        connection.execute('DROP TEMPORARY TABLE matched_indicator')
+    else:
+        matched_indicator.drop(connection)
+
+
+def build_facet_statements():
+    """ Builds the grouped count statement of each facet over the matched_indicator table. """
+
+    matched = db.join(matched_indicator, Indicator, matched_indicator.c.indicator_id == Indicator.id)
+    references = db.join(matched_indicator, indicator_reference_association,
+                         matched_indicator.c.indicator_id == indicator_reference_association.c.indicator_id)
+    references = db.join(references, IntelReference,
+                         indicator_reference_association.c.intel_reference_id == IntelReference.id)
+    campaigns = db.join(matched_indicator, indicator_campaign_association,
+                        matched_indicator.c.indicator_id == indicator_campaign_association.c.indicator_id)
+    tags = db.join(matched_indicator, indicator_tag_association,
+                   matched_indicator.c.indicator_id == indicator_tag_association.c.indicator_id)
+
+    facets = {
+        'campaigns': (Campaign.name, db.join(campaigns, Campaign,
+                                             indicator_campaign_association.c.campaign_id == Campaign.id)),
+        'sources': (IntelSource.value, db.join(references, IntelSource,
+                                               IntelReference.intel_source_id == IntelSource.id)),
+        'tags': (Tag.value, db.join(tags, Tag, indicator_tag_association.c.tag_id == Tag.id))
+    }
+
+    lookups = [('confidence', IndicatorConfidence, Indicator.confidence_id),
+               ('impact', IndicatorImpact, Indicator.impact_id),
+               ('status', IndicatorStatus, Indicator.status_id),
+               ('types', IndicatorType, Indicator.type_id)]
+    for name, model, column in lookups:
+        facets[name] = (model.value, db.join(matched, model, column == model.id))
+
+    # An indicator can have several references from the same source, so count each indicator once.
+    statements = {}
+    for name, (column, join) in facets.items():
+        count = func.count(func.distinct(matched_indicator.c.indicator_id))
+        statements[name] = db.select([column, count]).select_from(join).group_by(column)
+    return statements
+
+
+def get_indicator_statement(shape, **kwargs):
+    """ Returns the compiled statement for the shape of a request from the statement cache. """
+
+    key = (shape, tuple(sorted(kwargs.items())))
+
+    def build():
+        return build_indicator_statement(shape, **kwargs).compile(dialect=db.engine.dialect)
+
+    return get_statement_cache().get(key, build)
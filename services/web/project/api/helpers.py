@@ -1,3 +1,53 @@
+import json
+import zlib
+
+from datetime import datetime
+
+# The change feed cursors are the modified time and ID of the last change that was returned.
+CHANGES_CURSOR_TIME_FORMAT = '%Y%m%dT%H%M%S.%f'
+
+
+def chunk_list(items, size):
+    # Yield successive size-sized chunks of the list. Used to keep IN clauses to a sane length.
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def gzip_json_list(batches):
+    # Yield a gzip compressed JSON list one batch of items at a time. The output decompresses to the
+    # same text that json.dumps would give for the whole list, but only one batch is ever in memory.
+    compressor = zlib.compressobj(9, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+
+    yield compressor.compress(b'[')
+    first = True
+    for batch in batches:
+        if not batch:
+            continue
+
+        # Encode the batch as a list and strip off its brackets to get the comma-separated items.
+        text = json.dumps(batch)[1:-1]
+        if not first:
+            text = ', ' + text
+        first = False
+
+        chunk = compressor.compress(text.encode('utf-8'))
+        if chunk:
+            yield chunk
+
+    yield compressor.compress(b']') + compressor.flush()
+
+
+def format_changes_cursor(time, indicator_id):
+    return '{}_{}'.format(time.strftime(CHANGES_CURSOR_TIME_FORMAT), indicator_id)
+
+
+def parse_changes_cursor(cursor):
+    """ Returns the time and ID in the cursor. Raises ValueError if it is not a valid cursor. """
+
+    time, indicator_id = cursor.split('_')
+    return datetime.strptime(time, CHANGES_CURSOR_TIME_FORMAT), int(indicator_id)
+
+
 def get_apikey(request):
     # Get the API key if there is one.
     # The header should look like:
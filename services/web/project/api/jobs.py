@@ -0,0 +1,128 @@
+import gzip
+import json
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import and_
+
+from project import db
+from project.api.bulk import BulkIndicatorCreator
+from project.api.helpers import chunk_list
+from project.models import Job
+
+# The pool is created the first time a job is submitted since its size comes from the app config.
+executor = None
+
+
+def create_job(items, user=None):
+    """ Saves the indicator dictionaries as a new queued job and hands it to the background workers. """
+
+    job = Job(payload=gzip.compress(json.dumps(items).encode('utf-8')), status='queued', total=len(items), user=user)
+    db.session.add(job)
+    db.session.commit()
+
+    submit_job(job.id)
+    return job
+
+
+def submit_job(job_id):
+    """ Runs the job in a background thread, or inside the current request if BULK_JOB_WORKERS is 0. """
+
+    global executor
+
+    if not current_app.config['BULK_JOB_WORKERS']:
+        run_job(job_id)
+        return
+
+    if executor is None:
+        executor = ThreadPoolExecutor(max_workers=current_app.config['BULK_JOB_WORKERS'])
+
+    executor.submit(_run_job_in_thread, current_app._get_current_object(), job_id)
+
+
+def _run_job_in_thread(app, job_id):
+    with app.app_context():
+        try:
+            run_job(job_id)
+        finally:
+            db.session.remove()
+
+
+def requeue_stale_job(job):
+    """ Requeues a queued or running job that has not saved any progress in BULK_JOB_STALE_SECONDS.
+
+    The jobs only run in the threads of the web worker that accepted them, so a restart of that worker leaves them
+    unfinished. Returns True if the job was requeued, which runs it from where its progress was last saved. """
+
+    if job.status not in ['queued', 'running']:
+        return False
+
+    stale_time = datetime.utcnow() - timedelta(seconds=current_app.config['BULK_JOB_STALE_SECONDS'])
+    if job.modified_time >= stale_time:
+        return False
+
+    # Only one of the requests that see the stale job at the same time gets to requeue it.
+    table = Job.__table__
+    result = db.session.execute(table.update().where(and_(
+        table.c.id == job.id, table.c.status.in_(['queued', 'running']), table.c.modified_time < stale_time)).values(
+        status='queued', modified_time=datetime.utcnow()))
+    db.session.commit()
+    if not result.rowcount:
+        return False
+
+    current_app.logger.warning('BULK JOB: Requeued stale job {}'.format(job.id))
+    submit_job(job.id)
+    return True
+
+
+def run_job(job_id):
+    """ Creates the indicators saved in the job, committing the indicators and the job progress in chunks. """
+
+    # Claim the job so that it only runs once when a stale copy of it is still waiting in the pool.
+    table = Job.__table__
+    result = db.session.execute(table.update().where(and_(table.c.id == job_id, table.c.status == 'queued')).values(
+        status='running', modified_time=datetime.utcnow()))
+    db.session.commit()
+    if not result.rowcount:
+        return
+
+    job = Job.query.get(job_id)
+    errors = json.loads(job.errors) if job.errors else []
+    max_errors = current_app.config['BULK_JOB_MAX_ERRORS']
+
+    try:
+        items = json.loads(gzip.decompress(job.payload).decode('utf-8'))
+        creator = BulkIndicatorCreator(apikey=job.user.apikey if job.user else None)
+
+        # A requeued job picks up after the last chunk whose progress was saved. The chunk that was running when
+        # the worker stopped may have committed its indicators already, in which case they are now skipped.
+        index = job.created + job.skipped + job.failed
+        for chunk in chunk_list(items[index:], current_app.config['BULK_COMMIT_SIZE']):
+            results = creator.create_chunk(chunk)
+
+            for result, msg in results:
+                if result == 'created':
+                    job.created += 1
+                elif result == 'skipped':
+                    job.skipped += 1
+                else:
+                    job.failed += 1
+                    if len(errors) < max_errors:
+                        errors.append({'index': index, 'msg': msg})
+                index += 1
+
+            job.errors = json.dumps(errors)
+            db.session.commit()
+
+        job.status = 'finished'
+    except Exception as e:
+        current_app.logger.exception('BULK JOB: Job {} failed'.format(job_id))
+        db.session.rollback()
+        job = Job.query.get(job_id)
+        errors.append({'index': None, 'msg': str(e)})
+        job.errors = json.dumps(errors)
+        job.status = 'failed'
+
+    job.payload = None
+    db.session.commit()
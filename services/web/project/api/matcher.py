@@ -0,0 +1,150 @@
+import threading
+
+from collections import deque
+from flask import current_app
+
+from project import db
+from project.models import Indicator, IndicatorStatus, IndicatorType, get_write_generation
+
+# The matcher is built the first time it is used and then rebuilt whenever the write generation changes.
+indicator_matcher = None
+_lock = threading.Lock()
+
+
+def get_indicator_matcher():
+    """ Returns the substring indicator matcher after rebuilding it if anything was written since it was built. """
+
+    global indicator_matcher
+
+    generation = get_write_generation()
+    with _lock:
+        if indicator_matcher is None or indicator_matcher.generation != generation:
+            indicator_matcher = IndicatorMatcher.build(generation, current_app.config['INDICATOR_MATCH_STATUSES'])
+        return indicator_matcher
+
+
+class AhoCorasick:
+    """ An Aho-Corasick automaton that finds every occurrence of many patterns in a single pass over the text.
+
+    Each state of the trie has its transitions, the state of its longest proper suffix that is also in the trie
+    (the fail link), and the state of its longest proper suffix that ends a pattern (the output link). """
+
+    def __init__(self, patterns):
+        """ Builds the automaton from a dictionary of the patterns and the value to return for each of them. """
+
+        self.goto = [{}]
+        self.fail = [0]
+        self.output_link = [0]
+        self.values = [None]
+
+        for pattern, value in patterns.items():
+            state = 0
+            for character in pattern:
+                next_state = self.goto[state].get(character)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][character] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output_link.append(0)
+                    self.values.append(None)
+                state = next_state
+            self.values[state] = value
+
+        # Set the links breadth first so that the links of the shorter suffixes are always set first.
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for character, next_state in self.goto[state].items():
+                fail = self.fail[state]
+                while fail and character not in self.goto[fail]:
+                    fail = self.fail[fail]
+                fail = self.goto[fail].get(character, 0)
+                if fail == next_state:
+                    fail = 0
+
+                self.fail[next_state] = fail
+                self.output_link[next_state] = fail if self.values[fail] is not None else self.output_link[fail]
+                queue.append(next_state)
+
+    def __len__(self):
+        return len(self.goto)
+
+    def search(self, text):
+        """ Returns the set of states of the patterns found in the text. """
+
+        goto = self.goto
+        fail = self.fail
+        found = set()
+        state = 0
+        for character in text:
+            while state and character not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(character, 0)
+            if state:
+                found.add(state)
+
+        # Follow the output links of the states that were reached once at the end instead of at every character.
+        matches = set()
+        for state in found:
+            if self.values[state] is None:
+                state = self.output_link[state]
+            while state and state not in matches:
+                matches.add(state)
+                state = self.output_link[state]
+        return matches
+
+    def find(self, text):
+        """ Returns the values of the patterns found in the text. """
+
+        return [self.values[state] for state in self.search(text)]
+
+
+class IndicatorMatcher:
+    """ Finds the substring indicators that are contained in a text.
+
+    The case-sensitive indicators are matched against the text as is, and the others against the lowercase text
+    with their lowercase values. Indicators with the same value share a pattern. """
+
+    def __init__(self, generation, case_sensitive, case_insensitive, indicators):
+        self.generation = generation
+        self.case_sensitive = case_sensitive
+        self.case_insensitive = case_insensitive
+        self.indicators = indicators
+
+    @classmethod
+    def build(cls, generation, statuses):
+        query = db.session.query(Indicator.id, Indicator.case_sensitive, IndicatorType.value, Indicator.value).join(
+            Indicator.type).filter(Indicator.substring.is_(True))
+        if statuses is not None:
+            query = query.join(Indicator.status).filter(IndicatorStatus.value.in_(statuses))
+
+        indicators = {}
+        sensitive = {}
+        insensitive = {}
+        for indicator_id, case_sensitive, type_value, value in query:
+            if not value:
+                continue
+            indicators[indicator_id] = {'id': indicator_id, 'type': type_value, 'value': value}
+            if case_sensitive:
+                sensitive.setdefault(value, []).append(indicator_id)
+            else:
+                insensitive.setdefault(value.lower(), []).append(indicator_id)
+
+        return cls(generation, AhoCorasick(sensitive), AhoCorasick(insensitive), indicators)
+
+    def match(self, text):
+        """ Returns the indicator dictionaries of the indicators found in the text sorted by their ID. """
+
+        ids = set()
+        for indicator_ids in self.case_sensitive.find(text):
+            ids.update(indicator_ids)
+        if len(self.case_insensitive) > 1:
+            for indicator_ids in self.case_insensitive.find(text.lower()):
+                ids.update(indicator_ids)
+        return [self.indicators[i] for i in sorted(ids)]
+
+    def to_dict(self):
+        return {'generation': self.generation,
+                'indicators': len(self.indicators),
+                'states': len(self.case_sensitive) + len(self.case_insensitive)}
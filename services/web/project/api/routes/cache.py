@@ -0,0 +1,84 @@
+from flask import jsonify
+
+from project.api import bp, matcher
+from project.api.bitmap import get_bitmap_index
+from project.api.cache import get_result_cache
+from project.api.decorators import check_apikey
+from project.api.filters import get_statement_cache
+
+"""
+READ
+"""
+
+
+@bp.route('/cache', methods=['GET'])
+@check_apikey
+def read_cache():
+    """ Gets the hit and miss counters of the API caches in this web worker.
+
+    .. :quickref: Cache; Gets the hit and miss counters of the API caches in this web worker.
+
+    **Example request**:
+
+    .. sourcecode:: http
+
+      GET /cache HTTP/1.1
+      Host: 127.0.0.1
+      Accept: application/json
+
+    **Example response**:
+
+    .. sourcecode:: http
+
+      HTTP/1.1 200 OK
+      Content-Type: application/json
+
+      {
+        "bitmap_index": {
+          "bytes": 1843200,
+          "campaigns": 12,
+          "generation": 1520,
+          "indicators": 250000,
+          "synced_time": "Thu, 28 Feb 2019 17:10:44 GMT",
+          "tags": 85
+        },
+        "indicator_matcher": {
+          "generation": 1520,
+          "indicators": 340,
+          "states": 9870
+        },
+        "result_cache": {
+          "directory": null,
+          "disk_hits": 0,
+          "entries": 12,
+          "generation": 1520,
+          "hits": 310,
+          "max_size": 67108864,
+          "misses": 12,
+          "size": 5242880
+        },
+        "statement_cache": {
+          "hits": 5920,
+          "max_size": 256,
+          "misses": 14,
+          "size": 14
+        }
+      }
+
+    :reqheader Authorization: Optional Apikey value
+    :resheader Content-Type: application/json
+    :status 200: Cache counters found
+    :status 401: Invalid role to perform this action
+    """
+
+    # The bitmap index and the result cache are null unless they are enabled.
+    bitmap_index = get_bitmap_index()
+    result_cache = get_result_cache()
+
+    # The indicator matcher is null until the first match request builds it.
+    indicator_matcher = matcher.indicator_matcher
+
+    return jsonify({'bitmap_index': bitmap_index.to_dict() if bitmap_index else None,
+                    'indicator_matcher': indicator_matcher.to_dict() if indicator_matcher else None,
+                    'result_cache': result_cache.to_dict() if result_cache else None,
+                    'statement_cache': get_statement_cache().to_dict()})
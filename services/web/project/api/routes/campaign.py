@@ -3,7 +3,7 @@ from sqlalchemy import exc
 
 from project import db
 from project.api import bp
-from project.api.decorators import check_apikey, validate_json, validate_schema
+from project.api.decorators import check_apikey, etag_response, validate_json, validate_schema
 from project.api.errors import error_response
 from project.api.schemas import campaign_create, campaign_update
 from project.models import Campaign, CampaignAlias
@@ -98,6 +98,7 @@ READ
 
 @bp.route('/campaigns/<int:campaign_id>', methods=['GET'])
 @check_apikey
+@etag_response
 def read_campaign(campaign_id):
     """ Gets a single campaign given its ID.
     
@@ -142,6 +143,7 @@ def read_campaign(campaign_id):
 
 @bp.route('/campaigns', methods=['GET'])
 @check_apikey
+@etag_response
 def read_campaigns():
     """ Gets a list of all the campaigns.
     
@@ -3,7 +3,7 @@ from sqlalchemy import exc
 
 from project import db
 from project.api import bp
-from project.api.decorators import check_apikey, validate_json, validate_schema
+from project.api.decorators import check_apikey, etag_response, validate_json, validate_schema
 from project.api.errors import error_response
 from project.api.schemas import campaign_alias_create, campaign_alias_update
 from project.models import Campaign, CampaignAlias
@@ -92,6 +92,7 @@ READ
 
 @bp.route('/campaigns/alias/<int:campaign_alias_id>', methods=['GET'])
 @check_apikey
+@etag_response
 def read_campaign_alias(campaign_alias_id):
     """ Gets a single campaign alias given its ID.
     
@@ -134,6 +135,7 @@ def read_campaign_alias(campaign_alias_id):
 
 @bp.route('/campaigns/alias', methods=['GET'])
 @check_apikey
+@etag_response
 def read_campaign_aliases():
     """ Gets a list of all the campaign aliases.
     
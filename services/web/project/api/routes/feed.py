@@ -0,0 +1,112 @@
+import os
+
+from flask import current_app, jsonify, Response, send_file
+
+from project.api import bp
+from project.api.decorators import check_apikey
+from project.api.errors import error_response
+from project.api.feeds import FEED_NAME, list_feeds, read_feed_generation
+
+"""
+READ
+"""
+
+
+@bp.route('/feeds/<name>', methods=['GET'])
+@check_apikey
+def read_feed(name):
+    """ Gets a gzip compressed indicator feed file given its name.
+
+    .. :quickref: Feed; Gets a gzip compressed indicator feed file given its name.
+
+    *NOTE*: The .json feeds contain the same list as the route to get a list of indicators, and the .txt feeds
+    contain one indicator value per line. Values that contain line breaks are only included in the .json feeds.
+
+    **Example request**:
+
+    .. sourcecode:: http
+
+      GET /feeds/status_new__type_email-address.txt HTTP/1.1
+      Host: 127.0.0.1
+
+    **Example response**:
+
+    .. sourcecode:: http
+
+      HTTP/1.1 200 OK
+      Content-Encoding: gzip
+      Content-Type: text/plain
+
+      badguy@evil.com
+      phisher@evil.com
+
+    :reqheader Authorization: Optional Apikey value
+    :resheader Content-Type: application/json or text/plain
+    :status 200: Feed found
+    :status 401: Invalid role to perform this action
+    :status 404: Feed not found
+    """
+
+    directory = current_app.config['INDICATOR_FEED_DIR']
+    if not directory or not FEED_NAME.match(name) or not os.path.isfile(os.path.join(directory, name)):
+        return error_response(404, 'Feed not found')
+
+    mimetype = 'application/json' if name.endswith('.json') else 'text/plain'
+
+    # Let nginx send the file if it serves the feed directory.
+    prefix = current_app.config['INDICATOR_FEED_ACCEL_PREFIX']
+    if prefix:
+        response = Response(status=200, mimetype=mimetype)
+        response.headers['X-Accel-Redirect'] = prefix + name
+    else:
+        response = send_file(os.path.join(directory, name), mimetype=mimetype, conditional=True)
+
+    response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+@bp.route('/feeds', methods=['GET'])
+@check_apikey
+def read_feeds():
+    """ Gets the names of the indicator feed files.
+
+    .. :quickref: Feed; Gets the names of the indicator feed files.
+
+    **Example request**:
+
+    .. sourcecode:: http
+
+      GET /feeds HTTP/1.1
+      Host: 127.0.0.1
+      Accept: application/json
+
+    **Example response**:
+
+    .. sourcecode:: http
+
+      HTTP/1.1 200 OK
+      Content-Type: application/json
+
+      {
+        "feeds": [
+          "status_new.json",
+          "status_new.txt",
+          "status_new__type_email-address.json",
+          "status_new__type_email-address.txt",
+          "type_email-address.json",
+          "type_email-address.txt"
+        ],
+        "generation": 1520
+      }
+
+    :reqheader Authorization: Optional Apikey value
+    :resheader Content-Type: application/json
+    :status 200: Feeds found
+    :status 401: Invalid role to perform this action
+    """
+
+    directory = current_app.config['INDICATOR_FEED_DIR']
+    if not directory or not os.path.isdir(directory):
+        return jsonify({'feeds': [], 'generation': None})
+
+    return jsonify({'feeds': list_feeds(directory), 'generation': read_feed_generation(directory)})
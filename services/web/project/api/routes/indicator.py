@@ -1,20 +1,29 @@
-import datetime
 import gzip
+import ipaddress
 import json
 
-from dateutil.parser import parse
-from flask import current_app, jsonify, request, Response, url_for
-from sqlalchemy import and_, exc, func, or_
+from datetime import datetime, timedelta
+from flask import current_app, jsonify, request, Response, stream_with_context, url_for
+from jsonschema import validate
+from jsonschema.exceptions import ValidationError
+from sqlalchemy import and_, exc, or_
 
 from project import db
 from project.api import bp
-from project.api.decorators import check_apikey, validate_json, validate_schema
+from project.api.bitmap import get_bitmap_index, iter_bitmap_chunks
+from project.api.bloom import BloomFilter
+from project.api.bulk import BulkCreateError, BulkIndicatorCreator
+from project.api.decorators import cache_response, check_apikey, etag_response, validate_json, validate_schema
 from project.api.errors import error_response
-from project.api.helpers import get_apikey, parse_boolean
-from project.api.schemas import indicator_create, indicator_update, indicator_bulk_create
+from project.api.filters import build_facet_statements, drop_matched_indicator, get_indicator_statement, \
+    get_summary_count_statement, matched_indicator, parse_full_text_mode, parse_indicator_filters
+from project.api.helpers import chunk_list, format_changes_cursor, get_apikey, gzip_json_list, parse_boolean, \
+    parse_changes_cursor
+from project.api.jobs import create_job
+from project.api.schemas import indicator_create, indicator_update, indicator_bulk_create, indicator_bulk_create_item, \
+    indicator_lookup
 from project.models import Campaign, Indicator, IndicatorConfidence, IndicatorImpact, IndicatorStatus, IndicatorType, \
-    IntelReference, IntelSource, Tag, User, indicator_campaign_association, indicator_reference_association, \
-    indicator_tag_association
+    IntelReference, IntelSource, Tag, User, hash_value, hash_value_lower, indicator_tag_association, indicator_tombstone
 
 """
 CREATE
@@ -178,11 +187,11 @@ def create_indicator():
 
     # Verify this type+value does not already exist based off of case_sensitive.
     if case_sensitive:
-        existing = Indicator.query.filter(Indicator.type == indicator_type, func.binary(Indicator.value) == func.binary(data['value'])).first()
+        existing = Indicator.query.filter(Indicator.type == indicator_type, Indicator.value_hash == hash_value(data['value'])).first()
         if existing:
             return error_response(409, 'Case-sensitive indicator already exists')
     else:
-        existing = Indicator.query.filter(Indicator.type == indicator_type, func.lower(Indicator.value) == func.lower(data['value'])).first()
+        existing = Indicator.query.filter(Indicator.type == indicator_type, Indicator.value_lower_hash == hash_value_lower(data['value'])).first()
         if existing:
             return error_response(409, 'Case-insensitive indicator already exists')
 
@@ -290,8 +299,13 @@ def create_indicator():
 
             indicator.tags.append(tag)
 
-    db.session.add(indicator)
-    db.session.commit()
+    # The unique type+value index catches an identical indicator created by another request in the meantime.
+    try:
+        db.session.add(indicator)
+        db.session.commit()
+    except exc.IntegrityError:
+        db.session.rollback()
+        return error_response(409, 'Indicator already exists')
 
     response = jsonify(indicator.to_dict())
     response.status_code = 201
@@ -371,8 +385,39 @@ def create_indicators():
 
       HTTP/1.1 204 No Content
 
+    **Example asynchronous request**:
+
+    .. sourcecode:: http
+
+      POST /indicators/bulk?async=1 HTTP/1.1
+      Host: 127.0.0.1
+      Content-Type: application/json
+
+    **Example asynchronous response**:
+
+    .. sourcecode:: http
+
+      HTTP/1.1 202 Accepted
+      Content-Type: application/json
+      Location: /api/jobs/1
+
+      {
+        "created": 0,
+        "created_time": "Thu, 28 Feb 2019 17:10:44 GMT",
+        "errors": [],
+        "failed": 0,
+        "id": 1,
+        "modified_time": "Thu, 28 Feb 2019 17:10:44 GMT",
+        "processed": 0,
+        "skipped": 0,
+        "status": "queued",
+        "total": 2
+      }
+
     :reqheader Authorization: Optional Apikey value
     :resheader Content-Type: application/json
+    :query async: Flag to create the indicators in a background job. Poll the returned job for its progress.
+    :status 202: Job created
     :status 204: Indicators created
     :status 400: Confidence not given and no default to select
     :status 400: Impact not given and no default to select
@@ -390,274 +435,141 @@ def create_indicators():
     :status 404: Type not found
     :status 404: User not found by API key
     :status 404: Username not found
+    :status 409: Indicator already exists
     """
 
-    # Set up cache to limit the number of required database queries.
-    cache = {'usernames': {},
-             'apikeys': {},
-             'types': {},
-             'confidences': {},
-             'default_confidence': None,
-             'impacts': {},
-             'default_impact': None,
-             'statuses': {},
-             'default_status': None,
-             'campaigns': {},
-             'references': {},
-             'sources': {},
-             'tags': {}}
-
-    for data in request.get_json()['indicators']:
-
-        # Verify the user exists.
+    items = request.get_json()['indicators']
+
+    # Save the indicators as a job for the background workers if the request is asynchronous.
+    if parse_boolean(request.args.get('async')):
         user = None
-        if 'username' in data:
+        apikey = get_apikey(request)
+        if apikey:
+            user = User.query.filter_by(apikey=apikey).first()
 
-            # Check the cache for this username.
-            if data['username'] in cache['usernames']:
-                user = cache['usernames'][data['username']]
-            else:
-                user = User.query.filter_by(username=data['username']).first()
-                if not user:
-                    return error_response(404, 'User not found by username')
+        job = create_job(items, user=user)
 
-                # Add the user to the cache.
-                cache['usernames'][data['username']] = user
-        else:
-            apikey = get_apikey(request)
-            if apikey:
+        response = jsonify(job.to_dict())
+        response.status_code = 202
+        response.headers['Location'] = url_for('api.read_job', job_id=job.id)
+        return response
 
-                # Check the cache for this apikey.
-                if apikey in cache['apikeys']:
-                    user = cache['apikeys'][apikey]
-                else:
-                    user = User.query.filter_by(apikey=apikey).first()
-                    if not user:
-                        return error_response(404, 'User not found by API key')
+    creator = BulkIndicatorCreator(apikey=get_apikey(request))
+    creator.find_existing(items)
 
-                    # Add the user to the cache.
-                    cache['apikeys'][apikey] = user
-            else:
-                return error_response(401, 'You must supply either username or API key')
+    try:
+        for data in items:
+            creator.add(data)
+        creator.flush()
+        db.session.commit()
+    except BulkCreateError as e:
+        db.session.rollback()
+        return error_response(e.status_code, e.msg)
+    except exc.IntegrityError:
+        # The unique type+value index catches an identical indicator created by another request in the meantime.
+        db.session.rollback()
+        return error_response(409, 'Indicator already exists')
 
-        # Verify the user is active.
-        if not user.active:
-            return error_response(401, 'Cannot create an indicator with an inactive user')
+    return '', 204
 
-        # Check the cache for this indicator type.
-        if data['type'] in cache['types']:
-            indicator_type = cache['types'][data['type']]
-        else:
-            # Verify the indicator type.
-            indicator_type = IndicatorType.query.filter_by(value=data['type']).first()
-            if not indicator_type:
-                if current_app.config['INDICATOR_AUTO_CREATE_INDICATORTYPE']:
-                    indicator_type = IndicatorType(value=data['type'])
-                    db.session.add(indicator_type)
-                else:
-                    return error_response(404, 'Indicator type not found: {}'.format(data['type']))
 
-            # Add the indicator type to the cache.
-            cache['types'][data['type']] = indicator_type
+@bp.route('/indicators/bulk/ndjson', methods=['POST'])
+@check_apikey
+def create_indicators_ndjson():
+    """ Creates new indicators from a stream of newline-delimited JSON.
 
-        # Verify the case-sensitive value (defaults to False).
-        if 'case_sensitive' in data:
-            case_sensitive = data['case_sensitive']
-        else:
-            case_sensitive = False
+    .. :quickref: Indicator; Creates new indicators from a stream of newline-delimited JSON.
 
-        # Verify this type+value does not already exist based off of case_sensitive.
-        if case_sensitive:
-            existing = Indicator.query.filter(Indicator.type == indicator_type, func.binary(Indicator.value) == func.binary(data['value'])).first()
-            if existing:
-                continue
-        else:
-            existing = Indicator.query.filter(Indicator.type == indicator_type, func.lower(Indicator.value) == func.lower(data['value'])).first()
-            if existing:
-                continue
+    Each line of the request body is a single indicator that follows the same JSON schema as the items in the
+    Create Multiple route. The lines are parsed and validated one at a time and committed in chunks, so the size
+    of the upload does not affect the memory used by the server. The response streams one result per line.
 
-        # Verify the confidence (has default).
-        if 'confidence' not in data:
-            # Check the cache for the default indicator confidence.
-            if cache['default_confidence']:
-                confidence = cache['default_confidence']
-            else:
-                confidence = IndicatorConfidence.query.order_by(IndicatorConfidence.id).limit(1).first()
-                if not confidence:
-                    return error_response(400, 'No indicator confidence values exist to use as default')
+    **Example request**:
 
-                # Add the default confidence to the cache.
-                cache['default_confidence'] = confidence
-        else:
-            # Check the cache for this indicator confidence.
-            if data['confidence'] in cache['confidences']:
-                confidence = cache['confidences'][data['confidence']]
-            else:
-                confidence = IndicatorConfidence.query.filter_by(value=data['confidence']).first()
-                if not confidence:
-                    if current_app.config['INDICATOR_AUTO_CREATE_INDICATORCONFIDENCE']:
-                        confidence = IndicatorConfidence(value=data['confidence'])
-                        db.session.add(confidence)
-                    else:
-                        return error_response(404, 'Indicator confidence not found: {}'.format(data['confidence']))
-
-                # Add the indicator confidence to the cache.
-                cache['confidences'][data['confidence']] = confidence
-
-        # Verify the impact (has default).
-        if 'impact' not in data:
-            # Check the cache for the default indicator impact.
-            if cache['default_impact']:
-                impact = cache['default_impact']
-            else:
-                impact = IndicatorImpact.query.order_by(IndicatorImpact.id).limit(1).first()
-                if not impact:
-                    return error_response(400, 'No indicator impact values exist to use as default')
+    .. sourcecode:: http
 
-                # Add the default impact to the cache.
-                cache['default_impact'] = impact
-        else:
-            # Check the cache for this indicator impact.
-            if data['impact'] in cache['impacts']:
-                impact = cache['impacts'][data['impact']]
-            else:
-                impact = IndicatorImpact.query.filter_by(value=data['impact']).first()
-                if not impact:
-                    if current_app.config['INDICATOR_AUTO_CREATE_INDICATORIMPACT']:
-                        impact = IndicatorImpact(value=data['impact'])
-                        db.session.add(impact)
-                    else:
-                        return error_response(404, 'Indicator impact not found: {}'.format(data['impact']))
-
-                # Add the indicator impact to the cache.
-                cache['impacts'][data['impact']] = impact
-
-        # Verify the status (has default).
-        if 'status' not in data:
-            # Check the cache for the default indicator status.
-            if cache['default_status']:
-                status = cache['default_status']
-            else:
-                status = IndicatorStatus.query.order_by(IndicatorStatus.id).limit(1).first()
-                if not status:
-                    return error_response(400, 'No indicator status values exist to use as default')
+      POST /indicators/bulk/ndjson?chunk_size=500 HTTP/1.1
+      Host: 127.0.0.1
+      Content-Type: application/x-ndjson
 
-                # Add the default status to the cache.
-                cache['default_status'] = status
-        else:
-            # Check the cache for this indicator status.
-            if data['status'] in cache['statuses']:
-                status = cache['statuses'][data['status']]
-            else:
-                status = IndicatorStatus.query.filter_by(value=data['status']).first()
-                if not status:
-                    if current_app.config['INDICATOR_AUTO_CREATE_INDICATORSTATUS']:
-                        status = IndicatorStatus(value=data['status'])
-                        db.session.add(status)
-                    else:
-                        return error_response(404, 'Indicator status not found: {}'.format(data['status']))
-
-                # Add the indicator status to the cache.
-                cache['statuses'][data['status']] = status
-
-        # Verify the substring value (defaults to False).
-        if 'substring' in data:
-            substring = data['substring']
-        else:
-            substring = False
-
-        # Create the indicator object.
-        indicator = Indicator(case_sensitive=case_sensitive,
-                              confidence=confidence,
-                              impact=impact,
-                              status=status,
-                              substring=substring,
-                              type=indicator_type,
-                              user=user,
-                              value=data['value'])
-
-        # Verify any campaign that was specified.
-        if 'campaigns' in data:
-            for value in data['campaigns']:
-                # Check the cache for this campaign.
-                if value in cache['campaigns']:
-                    campaign = cache['campaigns'][value]
-                else:
-                    campaign = Campaign.query.filter_by(name=value).first()
-                    if not campaign:
-                        if current_app.config['INDICATOR_AUTO_CREATE_CAMPAIGN']:
-                            campaign = Campaign(name=value)
-                            db.session.add(campaign)
-                        else:
-                            return error_response(404, 'Campaign not found: {}'.format(value))
-
-                    # Add this campaign to the cache.
-                    cache['campaigns'][value] = campaign
-
-                indicator.campaigns.append(campaign)
-
-        # Verify any references that were specified.
-        if 'references' in data:
-            for item in data['references']:
-
-                # Check the cache for this source+reference pair.
-                if '{}{}'.format(item['source'], item['reference']) in cache['references']:
-                    reference = cache['references']['{}{}'.format(item['source'], item['reference'])]
-                else:
-                    reference = IntelReference.query.filter(and_(IntelReference.reference == item['reference'],
-                                                                 IntelReference.source.has(
-                                                                     IntelSource.value == item['source']))).first()
-                    if not reference:
-                        if current_app.config['INDICATOR_AUTO_CREATE_INTELREFERENCE']:
-
-                            # Check the cache for this source.
-                            if item['source'] in cache['sources']:
-                                source = cache['sources'][item['source']]
-                            else:
-                                source = IntelSource.query.filter_by(value=item['source']).first()
-                                if not source:
-                                    source = IntelSource(value=item['source'])
-                                    db.session.add(source)
-
-                                # Add this source to the cache.
-                                cache['sources'][item['source']] = source
-
-                            reference = IntelReference(reference=item['reference'], source=source, user=user)
-                            db.session.add(reference)
-                        else:
-                            return error_response(404, 'Intel reference not found: {}'.format(item['reference']))
-
-                    # Add this reference to the cache.
-                    cache['references']['{}{}'.format(item['source'], item['reference'])] = reference
-
-                indicator.references.append(reference)
-
-        # Verify any tags that were specified.
-        if 'tags' in data:
-            for value in data['tags']:
-
-                # Check the cache for this tag.
-                if value in cache['tags']:
-                    tag = cache['tags'][value]
-                else:
-                    tag = Tag.query.filter_by(value=value).first()
-                    if not tag:
-                        if current_app.config['INDICATOR_AUTO_CREATE_TAG']:
-                            tag = Tag(value=value)
-                            db.session.add(tag)
-                        else:
-                            return error_response(404, 'Tag not found: {}'.format(value))
+      {"type": "Email - Address", "value": "badguy@evil.com", "username": "your_SIP_username"}
+      {"type": "Email - Address", "value": "badguy@evil.com", "username": "your_SIP_username"}
+      {"type": "Email - Address", "username": "your_SIP_username"}
 
-                    # Add this tag to the cache.
-                    cache['tags'][value] = tag
+    **Example response**:
 
-                indicator.tags.append(tag)
+    .. sourcecode:: http
 
-        db.session.add(indicator)
+      HTTP/1.1 200 OK
+      Content-Type: application/x-ndjson
 
-    db.session.commit()
+      {"line": 1, "result": "created"}
+      {"line": 2, "result": "skipped"}
+      {"line": 3, "result": "error", "msg": "Line does not match schema: 'value' is a required property"}
 
-    return '', 204
+    :reqheader Authorization: Optional Apikey value
+    :resheader Content-Type: application/x-ndjson
+    :query chunk_size: Number of lines to commit at a time
+    :status 200: Lines processed. Check the result of each line.
+    :status 401: Invalid role to perform this action
+    """
+
+    chunk_size = current_app.config['BULK_COMMIT_SIZE']
+    if 'chunk_size' in request.args:
+        try:
+            chunk_size = max(int(request.args.get('chunk_size')), 1)
+        except ValueError:
+            return error_response(400, 'chunk_size must be an integer')
+
+    apikey = get_apikey(request)
+
+    def result_line(line_number, result, msg=None):
+        data = {'line': line_number, 'result': result}
+        if msg:
+            data['msg'] = msg
+        return json.dumps(data) + '\n'
+
+    def create_chunk(creator, chunk):
+        try:
+            results = creator.create_chunk([data for line_number, data in chunk])
+        except exc.SQLAlchemyError:
+            # Report the failed chunk and keep going instead of cutting off the response.
+            current_app.logger.exception('BULK NDJSON: Could not create lines {}-{}'.format(chunk[0][0], chunk[-1][0]))
+            db.session.rollback()
+            creator.reset()
+            results = [('error', 'Database error while creating the indicators')] * len(chunk)
+        return ''.join(result_line(line_number, *r) for (line_number, data), r in zip(chunk, results))
+
+    def generate():
+        creator = BulkIndicatorCreator(apikey=apikey)
+        chunk = []
+        line_number = 0
+
+        for line in request.stream:
+            line_number += 1
+            line = line.strip()
+            if not line:
+                continue
+
+            try:
+                data = json.loads(line.decode('utf-8'))
+                validate(data, indicator_bulk_create_item)
+            except (UnicodeDecodeError, ValueError):
+                yield result_line(line_number, 'error', 'Line must be valid JSON')
+                continue
+            except ValidationError as e:
+                yield result_line(line_number, 'error', 'Line does not match schema: {}'.format(e.message))
+                continue
+
+            chunk.append((line_number, data))
+            if len(chunk) >= chunk_size:
+                yield create_chunk(creator, chunk)
+                chunk = []
+
+        if chunk:
+            yield create_chunk(creator, chunk)
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
 
 
 """
@@ -667,6 +579,7 @@ READ
 
 @bp.route('/indicators/<int:indicator_id>', methods=['GET'])
 @check_apikey
+@etag_response
 def read_indicator(indicator_id):
     """ Gets a single indicator given its ID.
 
@@ -753,6 +666,8 @@ def read_indicator(indicator_id):
 
 @bp.route('/indicators', methods=['GET'])
 @check_apikey
+@etag_response
+@cache_response
 def read_indicators():
     """ Gets a gzip compressed list of indicators based on various filter criteria.
 
@@ -802,8 +717,46 @@ def read_indicators():
         }
       ]
 
+    **Example paginated request**:
+
+    .. sourcecode:: http
+
+      GET /indicators?status=NEW&limit=1000 HTTP/1.1
+      Host: 127.0.0.1
+      Accept: application/json
+
+    **Example paginated response**:
+
+    .. sourcecode:: http
+
+      HTTP/1.1 200 OK
+      Content-Encoding: gzip
+      Content-Type: application/json
+
+      {
+        "_links": {
+          "next": "/api/indicators?status=NEW&limit=1000&after_id=1000",
+          "self": "/api/indicators?status=NEW&limit=1000"
+        },
+        "_meta": {
+          "after_id": null,
+          "limit": 1000,
+          "next_after_id": 1000
+        },
+        "items": [
+          {
+            "id": 1,
+            "type": "Email - Address",
+            "value": "badguy@evil.com"
+          },
+          ...
+        ]
+      }
+
     :reqheader Authorization: Optional Apikey value
     :resheader Content-Type: application/json
+    :query after_id: Only return indicators with an ID greater than this. Used with the limit parameter.
+    :query campaigns: Comma-separated list of campaigns. Supports [OR].
     :query case_sensitive: True/False
     :query confidence: Confidence value
     :query count: Flag to return the number of results rather than the results themselves
@@ -811,17 +764,23 @@ def read_indicators():
     :query created_before: Parsable date or datetime in GMT. Ex: YYYY-MM-DD or YYYY-MM-DD HH:MM:SS
     :query exact_value: Exact indicator value to find. Does not use a wildcard search.
     :query impact: Impact value
+    :query limit: Return at most this many indicators along with a link to the next page
     :query modified_after: Parsable date or datetime in GMT. Ex: YYYY-MM-DD or YYYY-MM-DD HH:MM:SS
     :query modified_before: Parsable date or datetime in GMT. Ex: YYYY-MM-DD or YYYY-MM-DD HH:MM:SS
     :query no_campaigns: Flag to search for indicators without any campaigns
     :query no_references: Flag to search for indicators without any references
     :query no_tags: Flag to search for indicators without any tags
+    :query not_campaigns: Comma-separated list of campaigns to EXCLUDE
     :query not_sources: Comma-separated list of intel sources to EXCLUDE
     :query not_tags: Comma-separated list of tags to EXCLUDE
     :query not_users: Comma-separated list of usernames to EXCLUDE from the references
+    :query q: Full-text search of the indicator values
+    :query q_mode: boolean or natural (default) full-text search mode
     :query reference: Intel reference value
+    :query sort: id (default) or relevance to sort the full-text search results by their score
     :query sources: Comma-separated list of intel sources. Supports [OR].
     :query status: Status value
+    :query stream: True/False to send the list as it is read from the database. Not used with the limit parameter.
     :query substring: True/False
     :query tags: Comma-separated list of tags. Supports [OR].
     :query type: Type value
@@ -830,389 +789,700 @@ def read_indicators():
     :query users: Comma-separated list of usernames of the associated references. Supports [OR].
     :query value: String found in value (uses wildcard search)
     :status 200: Indicators found
+    :status 400: limit and after_id must be positive integers
+    :status 400: Invalid full-text search or sort parameters
     :status 401: Invalid role to perform this action
     """
 
-    filters = []
-    groupby = False
-    having = []
-    already_joined = set()
-    already_outerjoined = set()
-
-    # Start building the JOINS that we will need.
-    join = db.join(Indicator, IndicatorType, Indicator.type_id == IndicatorType.id)
-    already_joined.add('IndicatorType')
-
-    # Case-sensitive filter
-    if 'case_sensitive' in request.args:
-        arg = parse_boolean(request.args.get('case_sensitive'), default=None)
-        filters.append(Indicator.case_sensitive.is_(arg))
-
-    # Confidence filter
-    if 'confidence' in request.args:
-        if 'IndicatorConfidence' not in already_joined:
-            join = db.join(join, IndicatorConfidence, Indicator.confidence_id == IndicatorConfidence.id)
-            already_joined.add('IndicatorConfidence')
-        filters.append(IndicatorConfidence.value == request.args.get('confidence'))
-
-    # Created after filter
-    if 'created_after' in request.args:
-        try:
-            created_after = parse(request.args.get('created_after'), ignoretz=True)
-        except (ValueError, OverflowError):
-            created_after = datetime.date.max
-        filters.append(created_after < Indicator.created_time)
-
-    # Created before filter
-    if 'created_before' in request.args:
-        try:
-            created_before = parse(request.args.get('created_before'), ignoretz=True)
-        except (ValueError, OverflowError):
-            created_before = datetime.date.min
-        filters.append(Indicator.created_time < created_before)
-
-    # Exact value filter
-    if 'exact_value' in request.args:
-        filters.append(Indicator.value == request.args.get('exact_value'))
-
-    # Impact filter
-    if 'impact' in request.args:
-        if 'IndicatorImpact' not in already_joined:
-            join = db.join(join, IndicatorImpact, Indicator.impact_id == IndicatorImpact.id)
-            already_joined.add('IndicatorImpact')
-        filters.append(IndicatorImpact.value == request.args.get('impact'))
-
-    # Modified after filter
-    if 'modified_after' in request.args:
-        try:
-            modified_after = parse(request.args.get('modified_after'))
-        except (ValueError, OverflowError):
-            modified_after = datetime.date.max
-        filters.append(modified_after < Indicator.modified_time)
-
-    # Modified before filter
-    if 'modified_before' in request.args:
-        try:
-            modified_before = parse(request.args.get('modified_before'))
-        except (ValueError, OverflowError):
-            modified_before = datetime.date.min
-        filters.append(Indicator.modified_time < modified_before)
-
-    # NO campaigns filter
-    # TODO: Try and remove ~
-    if 'no_campaigns' in request.args:
-        if 'indicator_campaign_association' not in already_outerjoined:
-            join = db.outerjoin(join, indicator_campaign_association)
-            already_outerjoined.add('indicator_campaign_association')
-
-        filters.append(~Indicator.campaigns.any())
-
-    # NO Reference filter (IntelReference)
-    # TODO: Try and remove ~
-    if 'no_references' in request.args:
-        if 'indicator_reference_association' not in already_outerjoined:
-            join = db.outerjoin(join, indicator_reference_association)
-            already_outerjoined.add('indicator_reference_association')
-
-        filters.append(~Indicator.references.any())
-
-    # NO tags filter
-    # TODO: Try and remove ~
-    if 'no_tags' in request.args:
-        if 'indicator_tag_association' not in already_outerjoined:
-            join = db.outerjoin(join, indicator_tag_association)
-            already_outerjoined.add('indicator_tag_association')
-
-        filters.append(~Indicator.tags.any())
-
-    # NOT Source filter (IntelReference)
-    if 'not_sources' in request.args:
-        if 'indicator_reference_association' not in already_joined:
-            join = db.join(join, indicator_reference_association)
-            already_joined.add('indicator_reference_association')
-
-        if 'IntelReference' not in already_joined:
-            join = db.join(join, IntelReference, indicator_reference_association.c.intel_reference_id == IntelReference.id)
-            already_joined.add('IntelReference')
-
-        if 'IntelSource' not in already_joined:
-            join = db.join(join, IntelSource, IntelReference.intel_source_id == IntelSource.id)
-            already_joined.add('IntelSource')
-
-        groupby = True
-        not_sources = request.args.get('not_sources').split(',')
-        for ns in not_sources:
-            filters.append(IntelSource.value != ns)
-
-    # NOT Tags filter
-    if 'not_tags' in request.args:
-        if 'indicator_tag_association' not in already_outerjoined:
-            join = db.outerjoin(join, indicator_tag_association)
-            already_outerjoined.add('indicator_tag_association')
-
-        groupby = True
-        not_tags = request.args.get('not_tags').split(',')
-        for nt in not_tags:
-            filters.append(~Indicator.tags.any(value=nt))
-
-    # NOT Username filter
-    if 'not_users' in request.args:
-        if 'indicator_reference_association' not in already_joined:
-            join = db.join(join, indicator_reference_association)
-            already_joined.add('indicator_reference_association')
-
-        if 'IntelReference' not in already_joined:
-            join = db.join(join, IntelReference, indicator_reference_association.c.intel_reference_id == IntelReference.id)
-            already_joined.add('IntelReference')
-
-        if 'User' not in already_joined:
-            join = db.join(join, User, IntelReference.user_id == User.id)
-            already_joined.add('User')
-
-        groupby = True
-        not_users = request.args.get('not_users').split(',')
-        for nu in not_users:
-            filters.append(User.username != nu)
-
-    # Reference filter (IntelReference)
-    if 'reference' in request.args:
-        if 'indicator_reference_association' not in already_joined:
-            join = db.join(join, indicator_reference_association)
-            already_joined.add('indicator_reference_association')
-
-        groupby = True
-        reference = request.args.get('reference')
-        filters.append(Indicator.references.any(IntelReference.reference == reference))
-
-    # Source filter (IntelReference)
-    if 'sources' in request.args:
-        if 'indicator_reference_association' not in already_joined:
-            join = db.join(join, indicator_reference_association)
-            already_joined.add('indicator_reference_association')
-
-        if 'IntelReference' not in already_joined:
-            join = db.join(join, IntelReference, indicator_reference_association.c.intel_reference_id == IntelReference.id)
-            already_joined.add('IntelReference')
-
-        if 'IntelSource' not in already_joined:
-            join = db.join(join, IntelSource, IntelReference.intel_source_id == IntelSource.id)
-            already_joined.add('IntelSource')
-
-        groupby = True
-
-        # Figure out AND or OR mode.
-        list_mode = 'and'
-        request_value = request.args.get('sources')
-        if '[OR]' in request_value:
-            list_mode = 'or'
-            request_value = request_value.replace('[OR]', '')
-
-        sources = request_value.split(',')
-
-        if len(sources) == 1:
-            filters.append(IntelSource.value == sources[0])
-        elif len(sources) > 1:
-
-            if list_mode == 'and':
-                source_filters = []
-                for s in sources:
-                    source_filters.append(func.sum(IntelSource.value == s) > 0)
-                having.append(and_(*source_filters))
-
-            elif list_mode == 'or':
-                source_filters = []
-                for s in sources:
-                    source_filters.append(IntelSource.value == s)
-                filters.append(or_(*source_filters))
-
-    # Status filter
-    if 'status' in request.args:
-        if 'IndicatorStatus' not in already_joined:
-            join = db.join(join, IndicatorStatus, Indicator.status_id == IndicatorStatus.id)
-            already_joined.add('IndicatorStatus')
-
-        filters.append(IndicatorStatus.value == request.args.get('status'))
-
-    # Substring filter
-    if 'substring' in request.args:
-        arg = parse_boolean(request.args.get('substring'), default=None)
-        filters.append(Indicator.substring.is_(arg))
-
-    # Tags filter
-    if 'tags' in request.args:
-        if 'indicator_tag_association' not in already_joined:
-            join = db.join(join, indicator_tag_association)
-            already_joined.add('indicator_tag_association')
-
-        if 'Tag' not in already_joined:
-            join = db.join(join, Tag, indicator_tag_association.c.tag_id == Tag.id)
-            already_joined.add('Tag')
-
-        groupby = True
-
-        # Figure out AND or OR mode.
-        list_mode = 'and'
-        request_value = request.args.get('tags')
-        if '[OR]' in request_value:
-            list_mode = 'or'
-            request_value = request_value.replace('[OR]', '')
-
-        search_tags = request_value.split(',')
-
-        if len(search_tags) == 1:
-            filters.append(Tag.value == search_tags[0])
-        elif len(search_tags) > 1:
-
-            if list_mode == 'and':
-                tag_filters = []
-                for t in search_tags:
-                    tag_filters.append(func.sum(Tag.value == t) > 0)
-                having.append(and_(*tag_filters))
-
-            elif list_mode == 'or':
-                tag_filters = []
-                for t in search_tags:
-                    tag_filters.append(Tag.value == t)
-                filters.append(or_(*tag_filters))
-
-    # Type filter
-    if 'type' in request.args:
-        filters.append(IndicatorType.value == request.args.get('type'))
-
-    # Types filter
-    if 'types' in request.args:
-        types = request.args.get('types').split(',')
-
-        if len(types) == 1:
-            filters.append(IndicatorType.value == types[0])
-        elif len(types) > 1:
-            type_filters = []
-            for t in types:
-                type_filters.append(IndicatorType.value == t)
-            filters.append(or_(*type_filters))
-
-    # User filter
-    if 'user' in request.args:
-        if 'indicator_reference_association' not in already_joined:
-            join = db.join(join, indicator_reference_association)
-            already_joined.add('indicator_reference_association')
-
-        if 'IntelReference' not in already_joined:
-            join = db.join(join, IntelReference, indicator_reference_association.c.intel_reference_id == IntelReference.id)
-            already_joined.add('IntelReference')
-
-        if 'User' not in already_joined:
-            join = db.join(join, User, IntelReference.user_id == User.id)
-            already_joined.add('User')
-
-        groupby = True
-        filters.append(User.username == request.args.get('user'))
-
-    # Users filter
-    if 'users' in request.args:
-        if 'indicator_reference_association' not in already_joined:
-            join = db.join(join, indicator_reference_association)
-            already_joined.add('indicator_reference_association')
-
-        if 'IntelReference' not in already_joined:
-            join = db.join(join, IntelReference, indicator_reference_association.c.intel_reference_id == IntelReference.id)
-            already_joined.add('IntelReference')
-
-        if 'User' not in already_joined:
-            join = db.join(join, User, IntelReference.user_id == User.id)
-            already_joined.add('User')
-
-        groupby = True
-
-        # Figure out AND or OR mode.
-        list_mode = 'and'
-        request_value = request.args.get('users')
-        if '[OR]' in request_value:
-            list_mode = 'or'
-            request_value = request_value.replace('[OR]', '')
-
-        search_users = request_value.split(',')
-
-        if len(search_users) == 1:
-            filters.append(User.username == search_users[0])
-        elif len(search_users) > 1:
-
-            if list_mode == 'and':
-                user_filters = []
-                for u in search_users:
-                    user_filters.append(func.sum(User.username == u) > 0)
-                having.append(and_(*user_filters))
-
-            elif list_mode == 'or':
-                user_filters = []
-                for u in search_users:
-                    user_filters.append(User.username == u)
-                filters.append(or_(*user_filters))
-
-    # Value filter
-    if 'value' in request.args:
-        filters.append(Indicator.value.like('%{}%'.format(request.args.get('value'))))
+    # Verify the pagination parameters.
+    limit = None
+    after_id = None
+    try:
+        if 'limit' in request.args:
+            limit = int(request.args.get('limit'))
+        if 'after_id' in request.args:
+            after_id = int(request.args.get('after_id'))
+    except ValueError:
+        return error_response(400, 'limit and after_id must be positive integers')
+    if (limit is not None and limit < 1) or (after_id is not None and after_id < 0):
+        return error_response(400, 'limit and after_id must be positive integers')
+
+    # Verify the full-text search parameters.
+    if parse_full_text_mode(request.args) is None:
+        return error_response(400, 'q_mode must be boolean or natural')
+    sort = request.args.get('sort', 'id')
+    if sort not in ['id', 'relevance']:
+        return error_response(400, 'sort must be id or relevance')
+    if sort == 'relevance' and 'q' not in request.args:
+        return error_response(400, 'Sorting by relevance requires the q parameter')
+    if sort == 'relevance' and limit is not None:
+        return error_response(400, 'Sorting by relevance cannot be used with the limit parameter')
+
+    # Look up the compiled statement for this combination of filters and bind the request values to it.
+    shape, params = parse_indicator_filters(request.args)
+
+    # Answer the count from the count tables if they keep it for this combination of filters.
+    if 'count' in request.args:
+        statement = get_summary_count_statement(shape)
+        if statement is not None:
+            results = db.session.connection().execute(statement, params).fetchone()
+            return jsonify({'count': int(results[0])})
+
+    # Evaluate the tag and campaign filters with the bitmap index if it is enabled. The relevance sort
+    # needs the full-text search to order the rows, so it always uses the SQL filters.
+    bitmap = None
+    bitmap_index = get_bitmap_index()
+    if bitmap_index is not None and sort == 'id':
+        bitmap, shape = bitmap_index.evaluate(shape, params)
+    chunk_size = current_app.config['INDICATOR_BITMAP_CHUNK_SIZE']
 
     # If count is enabled, just return the number of results rather than the results themselves.
     if 'count' in request.args:
+        if bitmap is None:
+            statement = get_indicator_statement(shape, count=True)
+            results = db.session.connection().execute(statement, params).fetchone()
+            return jsonify({'count': results[0]})
+
+        # Count the bitmap itself unless there are other filters to check.
+        if not shape:
+            return jsonify({'count': len(bitmap)})
+
+        statement = get_indicator_statement(shape + (('ids',),), count=True)
+        count = 0
+        for ids in iter_bitmap_chunks(bitmap, chunk_size):
+            count += db.session.connection().execute(statement, dict(params, ids=ids)).fetchone()[0]
+        return jsonify({'count': count})
+
+    batch_size = current_app.config['INDICATOR_STREAM_BATCH_SIZE']
+
+    if bitmap is None:
+
+        # Ask for one extra row to know if there is another page.
+        statement = get_indicator_statement(shape, after_id=after_id is not None, limit=limit is not None,
+                                            relevance=sort == 'relevance')
+        if after_id is not None:
+            params['after_id'] = after_id
+        if limit is not None:
+            params['limit'] = limit + 1
+
+        def fetch_batches(connection):
+            results = connection.execute(statement, params)
+            while True:
+                rows = results.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+
+    else:
+
+        # Fetch the indicators in the bitmap by their IDs in ascending chunks, checking any other filters
+        # along the way, until there is one more row than the limit.
+        if after_id is not None:
+            bitmap = bitmap.after(after_id)
+        statement = get_indicator_statement(shape + (('ids',),))
+
+        def fetch_batches(connection):
+            wanted = limit + 1 if limit is not None else None
+            for ids in iter_bitmap_chunks(bitmap, chunk_size):
+                rows = connection.execute(statement, dict(params, ids=ids)).fetchall()
+                if rows:
+                    yield rows
+                if wanted is not None:
+                    wanted -= len(rows)
+                    if wanted <= 0:
+                        break
+
+    # Stream the full list in batches from a server-side cursor if requested.
+    if limit is None and parse_boolean(request.args.get('stream')):
+
+        def generate_batches():
+            connection = db.session.connection().execution_options(stream_results=True)
+            for rows in fetch_batches(connection):
+                yield [{'id': x[0], 'type': x[1], 'value': x[2]} for x in rows]
+
+        response = Response(stream_with_context(gzip_json_list(generate_batches())), status=200,
+                            mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+
+        # Tell nginx to pass the chunks along instead of buffering the whole response.
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+
+    # Perform the query and build a list of the results.
+    data = [{'id': x[0], 'type': x[1], 'value': x[2]} for rows in fetch_batches(db.session.connection()) for x in rows]
+
+    if limit is not None:
+        has_next = len(data) > limit
+        data = data[:limit]
+        next_after_id = data[-1]['id'] if has_next else None
+
+        args = request.args.to_dict()
+        args.pop('after_id', None)
+        args.pop('limit', None)
+        data = {
+            'items': data,
+            '_meta': {
+                'after_id': after_id,
+                'limit': limit,
+                'next_after_id': next_after_id
+            },
+            '_links': {
+                'self': url_for('api.read_indicators', limit=limit, after_id=after_id, **args),
+                'next': url_for('api.read_indicators', limit=limit, after_id=next_after_id, **args) if has_next else None
+            }
+        }
+
+    # Compress and return the JSON results.
+    data = json.dumps(data).encode('utf-8')
+    response = Response(status=200, mimetype='application/json')
+    response.data = gzip.compress(data)
+    response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Content-Length'] = len(response.data)
+    return response
+
+
+@bp.route('/indicators/facets', methods=['GET'])
+@check_apikey
+@etag_response
+@cache_response
+def read_indicator_facets():
+    """ Gets the number of matching indicators for each value of the indicator facets.
+
+    .. :quickref: Indicator; Gets the number of matching indicators for each value of the indicator facets.
+
+    *NOTE*: This route accepts the same filter parameters as the route to get a list of indicators. The IDs of the
+    matching indicators are found once, and then every facet is counted from them. Indicators with more than one
+    tag, campaign, or intel source are counted under each of them.
+
+    **Example request**:
+
+    .. sourcecode:: http
+
+      GET /indicators/facets?tags=phish HTTP/1.1
+      Host: 127.0.0.1
+      Accept: application/json
+
+    **Example response**:
+
+    .. sourcecode:: http
 
-        # Check if we need to add GROUP BY
-        if groupby:
-            query = db.select([Indicator.id])
-            query = query.group_by(Indicator.id)
+      HTTP/1.1 200 OK
+      Content-Type: application/json
+
+      {
+        "count": 3,
+        "facets": {
+          "campaigns": {"LOLcats": 2},
+          "confidence": {"LOW": 3},
+          "impact": {"HIGH": 1, "LOW": 2},
+          "sources": {"OSINT": 3},
+          "status": {"Analyzed": 1, "New": 2},
+          "tags": {"from_address": 2, "phish": 3},
+          "types": {"Email - Address": 2, "URI - Domain Name": 1}
+        }
+      }
+
+    :reqheader Authorization: Optional Apikey value
+    :resheader Content-Type: application/json
+    :status 200: Facets found
+    :status 400: q_mode must be boolean or natural
+    :status 401: Invalid role to perform this action
+    """
+
+    if parse_full_text_mode(request.args) is None:
+        return error_response(400, 'q_mode must be boolean or natural')
+
+    shape, params = parse_indicator_filters(request.args)
+
+    # Evaluate the tag and campaign filters with the bitmap index if it is enabled.
+    bitmap = None
+    bitmap_index = get_bitmap_index()
+    if bitmap_index is not None:
+        bitmap, shape = bitmap_index.evaluate(shape, params)
+
+    # Save the matching IDs in a temporary table so the filters only run once for all of the facets. The IDs are
+    # read with plain SELECT statements and inserted separately, since INSERT ... SELECT would take shared locks on
+    # every row it reads under REPEATABLE READ and block the writers for as long as it runs.
+    #
+    # The IDs are read one page at a time with the same seek on the indicator ID as the list route, so only a page
+    # of them is in memory at once. A streamed cursor would do the same in one statement, but MySQL cannot run the
+    # inserts on the connection (which owns the temporary table) until the cursor has been read to the end.
+    chunk_size = current_app.config['INDICATOR_BITMAP_CHUNK_SIZE']
+
+    def matched_chunks():
+        if bitmap is None:
+            statement = get_indicator_statement(shape, id_only=True, after_id=True, limit=True)
+            after_id = 0
+            while True:
+                ids = [row[0] for row in connection.execute(statement, dict(params, after_id=after_id,
+                                                                           limit=chunk_size))]
+                if not ids:
+                    break
+                yield ids
+                after_id = ids[-1]
+        elif shape:
+            statement = get_indicator_statement(shape + (('ids',),), id_only=True)
+            for ids in iter_bitmap_chunks(bitmap, chunk_size):
+                yield [row[0] for row in connection.execute(statement, dict(params, ids=ids))]
         else:
-            query = db.select([func.count()])
+            yield from iter_bitmap_chunks(bitmap, chunk_size)
 
-        # Check if we need to add HAVING
-        if having:
-            query = query.having(*having)
+    connection = db.session.connection()
+    matched_indicator.create(connection)
+    try:
+        for ids in matched_chunks():
+            if ids:
+                connection.execute(matched_indicator.insert(), [{'indicator_id': i} for i in ids])
 
-        query = query.select_from(join)
+        count = connection.execute(db.select([db.func.count()]).select_from(matched_indicator)).scalar()
 
-        # Add on all of the filters.
-        for f in filters:
-            query = query.where(f)
+        facets = {}
+        for name, statement in build_facet_statements().items():
+            facets[name] = {x[0]: x[1] for x in connection.execute(statement)}
+    finally:
+        drop_matched_indicator(connection)
 
-        # If we used GROUP BY, it should run as a subquery.
-        if groupby:
-            query = db.select([func.count()]).select_from(query.alias('count'))
+    return jsonify({'count': count, 'facets': facets})
 
-        results = db.session.execute(query).fetchone()
-        return jsonify({'count': results[0]})
 
-    # Build the base query to return id/type/value.
-    query = db.select([Indicator.id, IndicatorType.value, Indicator.value])
+@bp.route('/indicators/changes', methods=['GET'])
+@check_apikey
+def read_indicator_changes():
+    """ Gets the indicators that were created, updated or deleted since the given cursor.
 
-    # Check if we need to add GROUP BY
-    if groupby:
-        query = query.group_by(Indicator.id)
+    .. :quickref: Indicator; Gets the indicators that were created, updated or deleted since the given cursor.
 
-    # Check if we need to add HAVING
-    if having:
-        query = query.having(*having)
+    *NOTE*: The changes are returned in the order of their modified time and indicator ID. Save the
+    **next_since** cursor from each response and pass it as the **since** parameter of the next request to only
+    get the changes made after it. Follow the **next** link right away while it is not null. Without the **since**
+    parameter, every indicator is returned as created.
 
-    query = query.select_from(join)
+    Changes made in the last INDICATOR_CHANGES_DELAY_SECONDS are left for the next request so that the
+    transactions writing them have committed before the cursor passes them.
 
-    # Add on all of the filters.
-    for f in filters:
-        query = query.where(f)
+    **Example request**:
 
-    # Sort the results by the indicator ID.
-    query = query.order_by(Indicator.id)
+    .. sourcecode:: http
 
-    # Perform the query.
-    results = db.session.execute(query).fetchall()
+      GET /indicators/changes?since=20190301T175845.000000_1 HTTP/1.1
+      Host: 127.0.0.1
+      Accept: application/json
 
-    # Build a list of the results.
-    data = [{'id': x[0], 'type': x[1], 'value': x[2]} for x in results]
+    **Example response**:
 
-    # Compress and return the JSON results.
-    data = json.dumps(data).encode('utf-8')
-    response = Response(status=200, mimetype='application/json')
-    response.data = gzip.compress(data)
-    response.headers['Content-Encoding'] = 'gzip'
-    response.headers['Content-Length'] = len(response.data)
-    return response
+    .. sourcecode:: http
+
+      HTTP/1.1 200 OK
+      Content-Type: application/json
+
+      {
+        "_links": {
+          "next": null,
+          "self": "/api/indicators/changes?since=20190301T175845.000000_1&limit=1000"
+        },
+        "_meta": {
+          "limit": 1000,
+          "next_since": "20190301T180051.000000_3",
+          "since": "20190301T175845.000000_1"
+        },
+        "items": [
+          {
+            "change": "deleted",
+            "id": 2,
+            "indicator": null,
+            "modified_time": "Fri, 01 Mar 2019 18:00:12 GMT"
+          },
+          {
+            "change": "created",
+            "id": 3,
+            "indicator": {
+              "all_children": [],
+              "all_equal": [],
+              "campaigns": [],
+              "case_sensitive": false,
+              "children": [],
+              "confidence": "LOW",
+              "created_time": "Fri, 01 Mar 2019 18:00:51 GMT",
+              "equal": [],
+              "id": 3,
+              "impact": "LOW",
+              "modified_time": "Fri, 01 Mar 2019 18:00:51 GMT",
+              "parent": null,
+              "references": [],
+              "status": "NEW",
+              "substring": false,
+              "tags": ["phish"],
+              "type": "Email - Address",
+              "user": "your_SIP_username",
+              "value": "badguy@evil.com"
+            },
+            "modified_time": "Fri, 01 Mar 2019 18:00:51 GMT"
+          }
+        ]
+      }
+
+    :reqheader Authorization: Optional Apikey value
+    :resheader Content-Type: application/json
+    :query limit: Return at most this many changes. Defaults to and cannot be more than INDICATOR_CHANGES_LIMIT.
+    :query since: The next_since cursor from a previous response
+    :status 200: Changes found
+    :status 400: limit must be a positive integer
+    :status 400: since must be a cursor from a previous response
+    :status 401: Invalid role to perform this action
+    """
+
+    max_limit = current_app.config['INDICATOR_CHANGES_LIMIT']
+    try:
+        limit = int(request.args.get('limit', max_limit))
+    except ValueError:
+        return error_response(400, 'limit must be a positive integer')
+    if limit < 1:
+        return error_response(400, 'limit must be a positive integer')
+    limit = min(limit, max_limit)
+
+    since = request.args.get('since')
+    try:
+        since_time, since_id = parse_changes_cursor(since) if since else (None, None)
+    except ValueError:
+        return error_response(400, 'since must be a cursor from a previous response')
+
+    until = datetime.utcnow() - timedelta(seconds=current_app.config['INDICATOR_CHANGES_DELAY_SECONDS'])
+
+    def changed(time_column, id_column):
+        # Both queries seek along their (time, ID) index from the cursor.
+        criterion = time_column <= until
+        if since:
+            criterion = and_(criterion, or_(time_column > since_time,
+                                            and_(time_column == since_time, id_column > since_id)))
+        return criterion
+
+    updated = db.session.query(Indicator.modified_time, Indicator.id, Indicator.created_time).filter(
+        changed(Indicator.modified_time, Indicator.id)).order_by(Indicator.modified_time, Indicator.id).limit(limit + 1)
+    deleted = db.session.query(indicator_tombstone.c.deleted_time, indicator_tombstone.c.indicator_id).filter(
+        changed(indicator_tombstone.c.deleted_time, indicator_tombstone.c.indicator_id)).order_by(
+        indicator_tombstone.c.deleted_time, indicator_tombstone.c.indicator_id).limit(limit + 1)
+
+    changes = sorted(list(updated) + [(x[0], x[1], None) for x in deleted], key=lambda x: x[:2])
+    has_next = len(changes) > limit
+    changes = changes[:limit]
+
+    indicators = {x['id']: x for x in Indicator.to_dict_list([x[1] for x in changes if x[2] is not None])}
+
+    items = []
+    for time, indicator_id, created_time in changes:
+        if created_time is None:
+            change = 'deleted'
+        elif not since or created_time > since_time:
+            change = 'created'
+        else:
+            change = 'updated'
+        # A database that reuses IDs can have a tombstone and a new indicator with the same ID.
+        indicator = indicators.get(indicator_id) if created_time is not None else None
+        items.append({'change': change, 'id': indicator_id, 'indicator': indicator, 'modified_time': time})
+
+    next_since = format_changes_cursor(*changes[-1][:2]) if changes else since
+    return jsonify({
+        'items': items,
+        '_meta': {
+            'limit': limit,
+            'next_since': next_since,
+            'since': since
+        },
+        '_links': {
+            'self': url_for('api.read_indicator_changes', since=since, limit=limit),
+            'next': url_for('api.read_indicator_changes', since=next_since, limit=limit) if has_next else None
+        }
+    })
+
+
+@bp.route('/indicators/bloom', methods=['GET'])
+@check_apikey
+@etag_response
+@cache_response
+def read_indicator_bloom():
+    """ Gets a Bloom filter of the lowercase values of the matching indicators.
+
+    .. :quickref: Indicator; Gets a Bloom filter of the lowercase values of the matching indicators.
+
+    *NOTE*: This route accepts the same filter parameters as the route to get a list of indicators. The filter is
+    sized for the number of matching indicators so that a value that was not added is reported as a probable match
+    at about the given false positive rate. A value that was added is always reported as a probable match. See
+    lib/bloom_client.py for a client that reads the filter.
+
+    **Example request**:
+
+    .. sourcecode:: http
+
+      GET /indicators/bloom?status=Analyzed&types=Email - Address,URI - Domain Name HTTP/1.1
+      Host: 127.0.0.1
+      Accept: application/octet-stream
+
+    **Example response**:
+
+    .. sourcecode:: http
+
+      HTTP/1.1 200 OK
+      Content-Type: application/octet-stream
+      ETag: "0c4fd8a7b1a53b4f6e3a9f2f3d1c7c0ad1e5b7a2"
+
+      SIPB...
+
+    :reqheader Authorization: Optional Apikey value
+    :resheader Content-Type: application/octet-stream
+    :query false_positive_rate: Defaults to INDICATOR_BLOOM_FALSE_POSITIVE_RATE
+    :query status: Status value
+    :query type: Type value
+    :query types: Comma-separated list of types. Only supports OR logic since indicators only have one type.
+    :status 200: Bloom filter built
+    :status 400: Invalid false positive rate
+    :status 400: q_mode must be boolean or natural
+    :status 401: Invalid role to perform this action
+    """
+
+    min_rate = current_app.config['INDICATOR_BLOOM_MIN_FALSE_POSITIVE_RATE']
+    try:
+        rate = float(request.args.get('false_positive_rate',
+                                      current_app.config['INDICATOR_BLOOM_FALSE_POSITIVE_RATE']))
+    except ValueError:
+        rate = None
+    if rate is None or not min_rate <= rate < 1:
+        return error_response(400, 'false_positive_rate must be at least {} and less than 1'.format(min_rate))
+
+    if parse_full_text_mode(request.args) is None:
+        return error_response(400, 'q_mode must be boolean or natural')
+
+    shape, params = parse_indicator_filters(request.args)
+
+    # Size the filter from the count tables if they keep the count for this combination of filters.
+    statement = get_summary_count_statement(shape)
+    if statement is None:
+        statement = get_indicator_statement(shape, count=True)
+    count = int(db.session.connection().execute(statement, params).scalar() or 0)
+
+    bloom = BloomFilter.for_count(count, rate)
+    batch_size = current_app.config['INDICATOR_STREAM_BATCH_SIZE']
+    connection = db.session.connection().execution_options(stream_results=True)
+    results = connection.execute(get_indicator_statement(shape, lower_hash_only=True), params)
+    while True:
+        rows = results.fetchmany(batch_size)
+        if not rows:
+            break
+        for row in rows:
+            bloom.add(row[0])
+
+    return Response(bloom.to_bytes(), status=200, mimetype='application/octet-stream')
+
+
+@bp.route('/indicators/ip/<addr>', methods=['GET'])
+@check_apikey
+@etag_response
+def read_indicators_by_ip(addr):
+    """ Gets the indicators that are an IPv4 address or the CIDR blocks that contain it.
+
+    .. :quickref: Indicator; Gets the indicators that are an IPv4 address or the CIDR blocks that contain it.
+
+    *NOTE*: The **exact** list has the indicators of the address itself, and the **ranges** list has the indicators
+    of the CIDR blocks that contain it, from the smallest block to the largest.
+
+    **Example request**:
+
+    .. sourcecode:: http
+
+      GET /indicators/ip/10.1.2.3 HTTP/1.1
+      Host: 127.0.0.1
+      Accept: application/json
+
+    **Example response**:
+
+    .. sourcecode:: http
+
+      HTTP/1.1 200 OK
+      Content-Type: application/json
+
+      {
+        "exact": [
+          {
+            "id": 3,
+            "type": "Address - ipv4-addr",
+            "value": "10.1.2.3"
+          }
+        ],
+        "ranges": [
+          {
+            "id": 2,
+            "type": "Address - ipv4-addr",
+            "value": "10.1.2.0/24"
+          },
+          {
+            "id": 1,
+            "type": "Address - ipv4-addr",
+            "value": "10.0.0.0/8"
+          }
+        ]
+      }
+
+    :reqheader Authorization: Optional Apikey value
+    :resheader Content-Type: application/json
+    :status 200: Lookup finished
+    :status 400: Invalid IPv4 address
+    :status 401: Invalid role to perform this action
+    """
+
+    try:
+        address = int(ipaddress.IPv4Address(addr))
+    except ValueError:
+        return error_response(400, 'Invalid IPv4 address')
+
+    # A CIDR block that contains the address has to start at the address with some number of its low bits cleared.
+    starts = sorted({address >> bits << bits for bits in range(33)})
+    query = db.session.query(Indicator.id, IndicatorType.value, Indicator.value, Indicator.ip_start, Indicator.ip_end)
+    query = query.join(Indicator.type).filter(Indicator.ip_start.in_(starts), Indicator.ip_end >= address)
+
+    exact = []
+    ranges = []
+    for indicator_id, type_value, value, ip_start, ip_end in query:
+        item = {'id': indicator_id, 'type': type_value, 'value': value}
+        if ip_start == ip_end:
+            exact.append((indicator_id, item))
+        else:
+            ranges.append((ip_end - ip_start, indicator_id, item))
+
+    return jsonify({'exact': [x[-1] for x in sorted(exact)], 'ranges': [x[-1] for x in sorted(ranges)]})
+
+
+@bp.route('/indicators/lookup', methods=['POST'])
+@check_apikey
+@validate_json
+def lookup_indicators():
+    """ Finds the indicators that have any of the given values.
+
+    .. :quickref: Indicator; Finds the indicators that have any of the given values.
+
+    *NOTE*: Each value can be a string to find indicators of any type with that value, or an object with the
+    **type** and **value** to only find indicators of that type. Case-sensitive indicators only match values with
+    the exact same case, and the others match regardless of case. The **matched** list of each indicator holds the
+    given values that it matched. Values that do not match any indicators are left out.
+
+    **Example request**:
+
+    .. sourcecode:: http
+
+      POST /indicators/lookup HTTP/1.1
+      Host: 127.0.0.1
+      Content-Type: application/json
+
+      {
+        "values": [
+          "BadGuy@evil.com",
+          {"type": "URI - Domain Name", "value": "evil.com"},
+          "goodguy@example.com"
+        ]
+      }
+
+    **Example response**:
+
+    .. sourcecode:: http
+
+      HTTP/1.1 200 OK
+      Content-Type: application/json
+
+      [
+        {
+          "case_sensitive": false,
+          "id": 1,
+          "matched": ["BadGuy@evil.com"],
+          "status": "Analyzed",
+          "tags": ["phish"],
+          "type": "Email - Address",
+          "value": "badguy@evil.com"
+        },
+        {
+          "case_sensitive": false,
+          "id": 2,
+          "matched": ["evil.com"],
+          "status": "New",
+          "tags": [],
+          "type": "URI - Domain Name",
+          "value": "evil.com"
+        }
+      ]
+
+    :reqheader Authorization: Optional Apikey value
+    :resheader Content-Type: application/json
+    :status 200: Lookup finished
+    :status 400: JSON does not match the schema
+    :status 400: Too many values
+    :status 401: Invalid role to perform this action
+    """
+
+    # Check the number of values before the schema, since validating the oneOf of every value takes a while on its own.
+    values = request.json.get('values') if isinstance(request.json, dict) else None
+    max_values = current_app.config['INDICATOR_LOOKUP_MAX_VALUES']
+    if isinstance(values, list) and len(values) > max_values:
+        return error_response(400, 'Cannot look up more than {} values at once'.format(max_values))
+
+    try:
+        validate(request.json, indicator_lookup)
+    except ValidationError as e:
+        return error_response(400, 'Request JSON does not match schema: {}'.format(e.message))
+
+    types = {x.value: x.id for x in IndicatorType.query}
+
+    # Group the lowercase digests by the type ID (None for any type), and keep the exact digest of every value
+    # for the case-sensitive indicators. A value with an unknown type cannot match anything.
+    grouped_digests = {}
+    for item in values:
+        if isinstance(item, str):
+            type_id, value = None, item
+        else:
+            type_id, value = None, item['value']
+            if 'type' in item:
+                type_id = types.get(item['type'])
+                if type_id is None:
+                    continue
+        exact_digests = grouped_digests.setdefault(type_id, {}).setdefault(hash_value_lower(value), {})
+        exact_digests[hash_value(value)] = value
+
+    # Every query uses the index on the type and lowercase digest. Values of any type give it the list of every type.
+    matches = {}
+    chunk_size = current_app.config['BULK_QUERY_CHUNK_SIZE']
+    for type_id, digests in grouped_digests.items():
+        type_filter = Indicator.type_id.in_(list(types.values())) if type_id is None else Indicator.type_id == type_id
+        for digests_chunk in chunk_list(list(digests), chunk_size):
+            query = db.session.query(Indicator.id, Indicator.case_sensitive, Indicator.value, Indicator.value_hash,
+                                     Indicator.value_lower_hash, IndicatorStatus.value, IndicatorType.value)
+            query = query.join(Indicator.status).join(Indicator.type).filter(
+                type_filter, Indicator.value_lower_hash.in_(digests_chunk))
+            for indicator_id, case_sensitive, value, value_hash, value_lower_hash, status, type_value in query:
+                exact_digests = digests[value_lower_hash]
+                if case_sensitive:
+                    matched = [exact_digests[value_hash]] if value_hash in exact_digests else []
+                else:
+                    matched = list(exact_digests.values())
+                if not matched:
+                    continue
+
+                if indicator_id not in matches:
+                    matches[indicator_id] = {'case_sensitive': bool(case_sensitive), 'id': indicator_id,
+                                             'matched': set(), 'status': status, 'tags': [], 'type': type_value,
+                                             'value': value}
+                matches[indicator_id]['matched'].update(matched)
+
+    for ids_chunk in chunk_list(sorted(matches), chunk_size):
+        query = db.session.query(indicator_tag_association.c.indicator_id, Tag.value).join(
+            Tag, Tag.id == indicator_tag_association.c.tag_id).filter(
+            indicator_tag_association.c.indicator_id.in_(ids_chunk))
+        for indicator_id, tag in query:
+            matches[indicator_id]['tags'].append(tag)
+
+    results = []
+    for indicator_id in sorted(matches):
+        match = matches[indicator_id]
+        match['matched'] = sorted(match['matched'])
+        match['tags'].sort()
+        results.append(match)
+
+    return jsonify(results)
 
 
 """
@@ -1445,6 +1715,7 @@ def delete_indicator(indicator_id):
         return error_response(404, 'Indicator ID not found')
 
     try:
+        indicator.remove_relationships()
         db.session.delete(indicator)
         db.session.commit()
     except exc.IntegrityError:
@@ -3,7 +3,7 @@ from sqlalchemy import exc
 
 from project import db
 from project.api import bp
-from project.api.decorators import check_apikey, validate_json, validate_schema
+from project.api.decorators import check_apikey, etag_response, validate_json, validate_schema
 from project.api.errors import error_response
 from project.api.schemas import value_create, value_update
 from project.models import IndicatorImpact
@@ -80,6 +80,7 @@ READ
 
 @bp.route('/indicators/impact/<int:indicator_impact_id>', methods=['GET'])
 @check_apikey
+@etag_response
 def read_indicator_impact(indicator_impact_id):
     """ Gets a single indicator impact given its ID.
     
@@ -121,6 +122,7 @@ def read_indicator_impact(indicator_impact_id):
 
 @bp.route('/indicators/impact', methods=['GET'])
 @check_apikey
+@etag_response
 def read_indicator_impacts():
     """ Gets a list of all the indicator impacts.
     
@@ -36,6 +36,7 @@ def create_indicator_relationship(parent_id, child_id):
     :status 204: Relationship created
     :status 400: Cannot add an indicator to its own children
     :status 400: Child indicator already has a parent
+    :status 400: Child indicator is an ancestor of the parent indicator
     :status 400: JSON does not match the schema
     :status 401: Invalid role to perform this action
     :status 404: Indicator ID not found
@@ -55,6 +56,10 @@ def create_indicator_relationship(parent_id, child_id):
     if parent_id == child_id:
         return error_response(400, 'Cannot add an indicator to its own children')
 
+    # Verify the relationship would not create a loop in the hierarchy.
+    if child_indicator.is_parent(parent_indicator):
+        return error_response(400, 'Child indicator is an ancestor of the parent indicator')
+
     # Try to create the relationship or error if it could not be created.
     result = parent_indicator.add_child(child_indicator)
     if result:
@@ -1,13 +1,14 @@
 from flask import current_app, jsonify, request, url_for
-from sqlalchemy import and_, exc
+from sqlalchemy import and_, bindparam, exc
 
 from project import db
 from project.api import bp
-from project.api.decorators import check_apikey, validate_json, validate_schema
+from project.api.decorators import check_apikey, etag_response, validate_json, validate_schema
 from project.api.errors import error_response
+from project.api.filters import FullTextMatch, parse_full_text_mode
 from project.api.helpers import get_apikey
 from project.api.schemas import intel_reference_create, intel_reference_update
-from project.models import IntelReference, IntelSource, User
+from project.models import Indicator, IntelReference, IntelSource, User
 
 
 """
@@ -119,6 +120,7 @@ READ
 
 @bp.route('/intel/reference/<int:intel_reference_id>', methods=['GET'])
 @check_apikey
+@etag_response
 def read_intel_reference(intel_reference_id):
     """ Gets a single intel reference given its ID.
 
@@ -162,6 +164,7 @@ def read_intel_reference(intel_reference_id):
 
 @bp.route('/intel/reference', methods=['GET'])
 @check_apikey
+@etag_response
 def read_intel_references():
     """ Gets a paginated list of all the intel references.
 
@@ -218,17 +221,41 @@ def read_intel_references():
 
     :reqheader Authorization: Optional Apikey value
     :resheader Content-Type: application/json
+    :query q: Full-text search of the references
+    :query q_mode: boolean or natural (default) full-text search mode
+    :query sort: id (default) or relevance to sort the full-text search results by their score
     :status 200: Intel references found
+    :status 400: Invalid full-text search or sort parameters
     :status 401: Invalid role to perform this action
     """
 
     filters = set()
-    data = IntelReference.to_collection_dict(IntelReference.query.filter(*filters), 'api.read_intel_references', **request.args)
+    query = IntelReference.query
+
+    # Full-text search filter
+    full_text_mode = parse_full_text_mode(request.args)
+    if full_text_mode is None:
+        return error_response(400, 'q_mode must be boolean or natural')
+    sort = request.args.get('sort', 'id')
+    if sort not in ['id', 'relevance']:
+        return error_response(400, 'sort must be id or relevance')
+    if sort == 'relevance' and 'q' not in request.args:
+        return error_response(400, 'Sorting by relevance requires the q parameter')
+
+    if 'q' in request.args:
+        match = FullTextMatch(IntelReference.reference, bindparam('q', request.args.get('q')), boolean=full_text_mode)
+        filters.add(match)
+        if sort == 'relevance':
+            query = query.order_by(match.desc())
+    query = query.order_by(IntelReference.id)
+
+    data = IntelReference.to_collection_dict(query.filter(*filters), 'api.read_intel_references', **request.args)
     return jsonify(data)
 
 
 @bp.route('/intel/reference/<int:intel_reference_id>/indicators', methods=['GET'])
 @check_apikey
+@etag_response
 def read_intel_reference_indicators(intel_reference_id):
     """ Gets a paginated list of the indicators associated with the intel reference.
 
@@ -329,7 +356,7 @@ def read_intel_reference_indicators(intel_reference_id):
     args = dict(request.args.copy())
     args['intel_reference_id'] = intel_reference.id
 
-    data = IntelReference.to_collection_dict(intel_reference.indicators, 'api.read_intel_reference_indicators', **args)
+    data = Indicator.to_collection_dict(intel_reference.indicators, 'api.read_intel_reference_indicators', **args)
     return jsonify(data)
 
 
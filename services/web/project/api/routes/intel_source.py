@@ -3,7 +3,7 @@ from sqlalchemy import exc
 
 from project import db
 from project.api import bp
-from project.api.decorators import check_apikey, validate_json, validate_schema
+from project.api.decorators import check_apikey, etag_response, validate_json, validate_schema
 from project.api.errors import error_response
 from project.api.schemas import value_create, value_update
 from project.models import IntelSource
@@ -80,6 +80,7 @@ READ
 
 @bp.route('/intel/source/<int:intel_source_id>', methods=['GET'])
 @check_apikey
+@etag_response
 def read_intel_source(intel_source_id):
     """ Gets a single intel source given its ID.
     
@@ -121,6 +122,7 @@ def read_intel_source(intel_source_id):
 
 @bp.route('/intel/source', methods=['GET'])
 @check_apikey
+@etag_response
 def read_intel_sources():
     """ Gets a list of all the intel sources.
     
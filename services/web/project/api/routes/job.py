@@ -0,0 +1,71 @@
+from flask import jsonify
+
+from project.api import bp
+from project.api.decorators import check_apikey
+from project.api.errors import error_response
+from project.api.jobs import requeue_stale_job
+from project.models import Job
+
+"""
+READ
+"""
+
+
+@bp.route('/jobs/<int:job_id>', methods=['GET'])
+@check_apikey
+def read_job(job_id):
+    """ Gets the status of an asynchronous bulk job given its ID.
+
+    .. :quickref: Job; Gets the status of an asynchronous bulk job given its ID.
+
+    A queued or running job that has not saved any progress in BULK_JOB_STALE_SECONDS is requeued first, since
+    the web worker that ran it was most likely restarted.
+
+    **Example request**:
+
+    .. sourcecode:: http
+
+      GET /jobs/1 HTTP/1.1
+      Host: 127.0.0.1
+      Accept: application/json
+
+    **Example response**:
+
+    .. sourcecode:: http
+
+      HTTP/1.1 200 OK
+      Content-Type: application/json
+
+      {
+        "created": 1500,
+        "created_time": "Thu, 28 Feb 2019 17:10:44 GMT",
+        "errors": [
+          {
+            "index": 12,
+            "msg": "Tag not found: phish"
+          }
+        ],
+        "failed": 1,
+        "id": 1,
+        "modified_time": "Thu, 28 Feb 2019 17:11:02 GMT",
+        "processed": 2000,
+        "skipped": 499,
+        "status": "running",
+        "total": 50000
+      }
+
+    :reqheader Authorization: Optional Apikey value
+    :resheader Content-Type: application/json
+    :status 200: Job found
+    :status 401: Invalid role to perform this action
+    :status 404: Job ID not found
+    """
+
+    job = Job.query.get(job_id)
+    if not job:
+        return error_response(404, 'Job ID not found')
+
+    if requeue_stale_job(job):
+        job = Job.query.get(job_id)
+
+    return jsonify(job.to_dict())
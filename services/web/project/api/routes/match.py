@@ -0,0 +1,69 @@
+from flask import current_app, jsonify, request
+
+from project.api import bp
+from project.api.decorators import check_apikey
+from project.api.errors import error_response
+from project.api.matcher import get_indicator_matcher
+
+"""
+CREATE
+"""
+
+
+@bp.route('/match', methods=['POST'])
+@check_apikey
+def create_match():
+    """ Finds the substring indicators that are contained in the request body.
+
+    .. :quickref: Match; Finds the substring indicators that are contained in the request body.
+
+    *NOTE*: Only the indicators with substring set to True and one of the statuses in INDICATOR_MATCH_STATUSES are
+    matched. Case-sensitive indicators must match exactly, and the others match regardless of case. The body is
+    decoded with the charset in the Content-Type header (UTF-8 by default), so any kind of data can be sent.
+
+    **Example request**:
+
+    .. sourcecode:: http
+
+      POST /match HTTP/1.1
+      Host: 127.0.0.1
+      Content-Type: text/plain
+
+      Subject: Your account has been SUSPENDED
+      ...
+
+    **Example response**:
+
+    .. sourcecode:: http
+
+      HTTP/1.1 200 OK
+      Content-Type: application/json
+
+      [
+        {
+          "id": 12,
+          "type": "Email - Subject",
+          "value": "account has been suspended"
+        }
+      ]
+
+    :reqheader Authorization: Optional Apikey value
+    :resheader Content-Type: application/json
+    :status 200: Matching indicators found
+    :status 400: Unknown charset
+    :status 401: Invalid role to perform this action
+    :status 413: Request body is too large
+    """
+
+    # Read one byte more than the limit to tell if the body is too large without reading all of it.
+    max_length = current_app.config['INDICATOR_MATCH_MAX_LENGTH']
+    data = request.stream.read(max_length + 1)
+    if len(data) > max_length:
+        return error_response(413, 'Request body is too large')
+
+    try:
+        text = data.decode(request.mimetype_params.get('charset', 'utf-8'), errors='replace')
+    except LookupError:
+        return error_response(400, 'Unknown charset')
+
+    return jsonify(get_indicator_matcher().match(text))
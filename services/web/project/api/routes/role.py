@@ -3,7 +3,7 @@ from sqlalchemy import exc
 
 from project import db
 from project.api import bp
-from project.api.decorators import check_apikey, validate_json, validate_schema, verify_admin
+from project.api.decorators import check_apikey, etag_response, validate_json, validate_schema, verify_admin
 from project.api.errors import error_response
 from project.api.schemas import role_create, role_update
 from project.models import Role
@@ -86,6 +86,7 @@ READ
 
 @bp.route('/roles/<int:role_id>', methods=['GET'])
 @check_apikey
+@etag_response
 def read_role(role_id):
     """ Gets a single role given its ID.
 
@@ -128,6 +129,7 @@ def read_role(role_id):
 
 @bp.route('/roles', methods=['GET'])
 @check_apikey
+@etag_response
 def read_roles():
     """ Gets a list of all the roles.
 
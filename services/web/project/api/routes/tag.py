@@ -3,7 +3,7 @@ from sqlalchemy import exc
 
 from project import db
 from project.api import bp
-from project.api.decorators import check_apikey, validate_json, validate_schema
+from project.api.decorators import check_apikey, etag_response, validate_json, validate_schema
 from project.api.errors import error_response
 from project.api.schemas import value_create, value_update
 from project.models import Tag
@@ -79,6 +79,7 @@ READ
 
 @bp.route('/tags/<int:tag_id>', methods=['GET'])
 @check_apikey
+@etag_response
 def read_tag(tag_id):
     """ Gets a single tag given its ID.
     
@@ -120,6 +121,7 @@ def read_tag(tag_id):
 
 @bp.route('/tags', methods=['GET'])
 @check_apikey
+@etag_response
 def read_tags():
     """ Gets a list of all the tags.
     
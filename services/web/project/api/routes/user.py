@@ -5,7 +5,7 @@ from sqlalchemy import exc
 
 from project import db
 from project.api import bp
-from project.api.decorators import check_apikey, validate_json, validate_schema, verify_admin
+from project.api.decorators import check_apikey, etag_response, validate_json, validate_schema, verify_admin
 from project.api.errors import error_response
 from project.api.schemas import user_create, user_update
 from project.models import Role, User
@@ -136,6 +136,7 @@ READ
 
 @bp.route('/users/<int:user_id>', methods=['GET'])
 @check_apikey
+@etag_response
 def read_user(user_id):
     """ Gets a single user given its ID.
 
@@ -182,6 +183,7 @@ def read_user(user_id):
 
 @bp.route('/users', methods=['GET'])
 @check_apikey
+@etag_response
 def read_users():
     """ Gets a list of all the users.
 
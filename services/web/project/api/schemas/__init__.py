@@ -22,6 +22,9 @@ with open(os.path.join(this_dir, 'indicator_update.json')) as j:
     indicator_update = json.load(j)
 with open(os.path.join(this_dir, 'indicator_bulk_create.json')) as j:
     indicator_bulk_create = json.load(j)
+indicator_bulk_create_item = indicator_bulk_create['properties']['indicators']['items']
+with open(os.path.join(this_dir, 'indicator_lookup.json')) as j:
+    indicator_lookup = json.load(j)
 
 # IntelReference
 with open(os.path.join(this_dir, 'intel_reference_create.json')) as j:
@@ -85,6 +85,129 @@ class BaseConfig:
 
     INTELREFERENCE_AUTO_CREATE_INTELSOURCE = False
 
+    """
+    BULK BEHAVIOR
+    
+    The bulk API routes look up existing database objects using IN queries and write new indicators
+    using multi-row INSERT statements. These control how many values are placed in a single IN clause
+    and how many rows are placed in a single INSERT before the statement is split into another one.
+    """
+
+    BULK_INSERT_CHUNK_SIZE = 1000
+    BULK_QUERY_CHUNK_SIZE = 1000
+
+    # The NDJSON and asynchronous bulk routes commit after this many indicators.
+    # The NDJSON route can override it with the chunk_size parameter.
+    BULK_COMMIT_SIZE = 1000
+
+    # Number of background threads in each web worker that run asynchronous bulk jobs.
+    # Setting this to 0 runs the jobs inside the request instead.
+    BULK_JOB_WORKERS = 2
+
+    # Maximum number of per-indicator error messages saved for each asynchronous bulk job.
+    BULK_JOB_MAX_ERRORS = 1000
+
+    # Number of seconds without progress before a queued or running job is requeued when its status is read, such
+    # as after the web worker that ran it was restarted. This has to be longer than a commit of BULK_COMMIT_SIZE.
+    BULK_JOB_STALE_SECONDS = 600
+
+    # Maximum number of values in a single request to the indicator lookup route, which looks them up
+    # in chunks of BULK_QUERY_CHUNK_SIZE.
+    INDICATOR_LOOKUP_MAX_VALUES = 100000
+
+    """
+    READ BEHAVIOR
+    
+    With the stream parameter, the indicator list route reads its results from a server-side cursor
+    and sends them as they are compressed instead of building the whole response in memory first.
+
+    The indicator list route compiles one SQL statement for each combination of filters it sees and
+    reuses it for later requests that only differ by the filter values.
+
+    The optional bitmap index keeps the tag and campaign memberships of every indicator in memory in each
+    worker. The tag and campaign filters are then evaluated in Python, and only the matching indicators are
+    read from the database. The index is built the first time it is used and then refreshed from the
+    modified times of the indicators and the tombstones of the deleted ones whenever the write generation changes.
+
+    The indicator list and facets routes cache their responses in each worker until the next write to the
+    database. The cache can also save the responses in a directory so the other workers on the host can use them.
+
+    The indicator change feed returns the changes in the order of their modified times, but a transaction can
+    commit after a later one has already been read. The newest changes are held back for a few seconds so that
+    the cursors of the clients do not pass them before they are visible.
+    """
+
+    # Number of rows fetched from the cursor and compressed at a time.
+    INDICATOR_STREAM_BATCH_SIZE = 10000
+
+    # Number of compiled indicator list statements kept for the different combinations of filters.
+    INDICATOR_STATEMENT_CACHE_SIZE = 256
+
+    # Set to True to evaluate the tag and campaign filters with the bitmap index.
+    INDICATOR_BITMAP_INDEX = False
+
+    # Maximum number of seconds between refreshes of the bitmap index.
+    INDICATOR_BITMAP_REFRESH_SECONDS = 60
+
+    # Number of indicator IDs from the bitmap index to read from the database at a time.
+    INDICATOR_BITMAP_CHUNK_SIZE = 1000
+
+    # Maximum number of bytes of compressed responses cached by each worker. Set to 0 to disable the cache.
+    INDICATOR_RESULT_CACHE_SIZE = 64 * 1024 * 1024
+
+    # Directory where the cached responses are shared between the workers, or None to only cache them in memory.
+    INDICATOR_RESULT_CACHE_DIR = None
+
+    # Maximum (and default) number of changes returned by the change feed at a time.
+    INDICATOR_CHANGES_LIMIT = 1000
+
+    # Number of seconds that a change has to be old before the change feed returns it.
+    INDICATOR_CHANGES_DELAY_SECONDS = 5
+
+    """
+    FEED BEHAVIOR
+
+    The feed generator (manage.py build-feeds) writes gzip compressed indicator feeds for every status, every type,
+    and every status and type pair to a directory whenever the write generation changes. The feed route then hands
+    the file to nginx with an X-Accel-Redirect header so the web workers never read or compress the feeds.
+    """
+
+    # Directory where the feed files are written, or None to disable the feeds.
+    INDICATOR_FEED_DIR = os.environ.get('INDICATOR_FEED_DIR')
+
+    # Internal nginx location that serves INDICATOR_FEED_DIR, or None to send the files from the web workers.
+    INDICATOR_FEED_ACCEL_PREFIX = os.environ.get('INDICATOR_FEED_ACCEL_PREFIX')
+
+    # Number of seconds between checks of the write generation by the feed generator.
+    INDICATOR_FEED_INTERVAL_SECONDS = 10
+
+    """
+    MATCH BEHAVIOR
+
+    The match route finds the substring indicators that are contained in the request body with an Aho-Corasick
+    automaton of their values. Each worker builds the automaton the first time it is used and then rebuilds it
+    whenever the write generation changes.
+    """
+
+    # Statuses of the substring indicators that are matched, or None to match the indicators with any status.
+    INDICATOR_MATCH_STATUSES = ['Analyzed']
+
+    # Maximum number of bytes in the body of a match request.
+    INDICATOR_MATCH_MAX_LENGTH = 10 * 1024 * 1024
+
+    """
+    BLOOM FILTER BEHAVIOR
+
+    The Bloom filter route lets clients check many values against the indicators locally and only ask the API
+    about the probable matches. The filters are cached per write generation like the other read routes.
+    """
+
+    # False positive rate of the Bloom filters when the request does not give one.
+    INDICATOR_BLOOM_FALSE_POSITIVE_RATE = 0.001
+
+    # Lowest false positive rate a request can ask for, which limits the size of the filters.
+    INDICATOR_BLOOM_MIN_FALSE_POSITIVE_RATE = 0.000001
+
 
 class DevelopmentConfig(BaseConfig):
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
@@ -97,6 +220,16 @@ class TestingConfig(BaseConfig):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
 
+    # Run the asynchronous bulk jobs inside the request so the tests can check their results.
+    BULK_JOB_WORKERS = 0
+
+    # Every test rolls back its writes, which also rolls back the write generation, so the cached
+    # responses of one test could be returned to the next one.
+    INDICATOR_RESULT_CACHE_SIZE = 0
+
+    # Return the changes the tests just made.
+    INDICATOR_CHANGES_DELAY_SECONDS = 0
+
 
 class ProductionConfig(BaseConfig):
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
@@ -1,10 +1,20 @@
+import hashlib
+import ipaddress
+import itertools
+import json
 import logging
+import unicodedata
 import uuid
 
+from collections import Counter
 from project import db
 from datetime import datetime
 from flask import url_for
 from flask_security import UserMixin, RoleMixin
+from sqlalchemy import event
+from sqlalchemy.engine import Connection
+from sqlalchemy.dialects import mysql
+from sqlalchemy.orm import Session, attributes, validates
 logger = logging.getLogger(__name__)
 
 
@@ -12,14 +22,64 @@ def generate_apikey():
     return str(uuid.uuid4())
 
 
+def hash_value(value):
+    """ Returns the SHA256 digest used to look up an exact indicator value. """
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()
+
+
+def hash_value_lower(value):
+    """ Returns the SHA256 digest used to look up a case-insensitive indicator value. """
+    return hash_value(value.lower())
+
+
+def ip_range(value):
+    """ Returns the first and last address of an IPv4 address or CIDR block value as integers, or (None, None). """
+    try:
+        network = ipaddress.IPv4Network(value.strip(), strict=False)
+    except ValueError:
+        return None, None
+    return int(network.network_address), int(network.broadcast_address)
+
+
+# Saved in place of the trigrams of a value that still has non-ASCII characters after it is folded. The collation
+# of the database can treat those characters as equal to others (such as ß and ss), so substring searches always
+# check these indicators with LIKE. A single 0xFF byte is never part of the UTF-8 bytes of a real trigram.
+UNFOLDED_TRIGRAM = b'\xff'
+
+
+def fold_value(value):
+    """ Returns the value in lowercase without accents, which is how the database collation compares it. """
+    value = unicodedata.normalize('NFKD', value.lower())
+    return ''.join(c for c in value if not unicodedata.combining(c))
+
+
+def value_trigrams(value):
+    """ Returns the three character substrings of the folded value as UTF-8 bytes. """
+    value = fold_value(value)
+    return {value[i:i + 3].encode('utf-8') for i in range(len(value) - 2)}
+
+
+def trigram_rows(indicator_id, value):
+    """ Returns the indicator_trigram rows to insert for an indicator value. """
+    if not fold_value(value).isascii():
+        return [{'indicator_id': indicator_id, 'trigram': UNFOLDED_TRIGRAM}]
+    return [{'indicator_id': indicator_id, 'trigram': t} for t in value_trigrams(value)]
+
+
 """
 PAGINATED API QUERY MIXIN
 """
 
 
 class PaginatedAPIMixin:
-    @staticmethod
-    def to_collection_dict(query, endpoint, **kwargs):
+    @classmethod
+    def to_dict_items(cls, items):
+        """ Returns the dictionaries for a page of query results. """
+
+        return [item.to_dict() for item in items]
+
+    @classmethod
+    def to_collection_dict(cls, query, endpoint, **kwargs):
         """ Returns a paginated dictionary of a query. """
 
         # Create a copy of the request arguments so that we can modify them.
@@ -52,7 +112,7 @@ class PaginatedAPIMixin:
 
         # Generate the response dictionary.
         data = {
-            'items': [item.to_dict() for item in resources.items],
+            'items': cls.to_dict_items(resources.items),
             '_meta': {
                 'page': page,
                 'per_page': per_page,
@@ -72,10 +132,47 @@ class PaginatedAPIMixin:
 ASSOCIATION TABLES
 """
 
-
+"""
+The primary keys of the indicator mapping tables start with indicator_id, so the campaign, reference and tag
+mapping tables also have the reverse index for the filters that start from a campaign, reference or tag.
+"""
 indicator_campaign_association = db.Table('indicator_campaign_mapping',
                                           db.Column('indicator_id', db.Integer, db.ForeignKey('indicator.id'), primary_key=True),
-                                          db.Column('campaign_id', db.Integer, db.ForeignKey('campaign.id'), primary_key=True))
+                                          db.Column('campaign_id', db.Integer, db.ForeignKey('campaign.id'), primary_key=True),
+                                          db.Index('ix_indicator_campaign_mapping_campaign_id_indicator_id', 'campaign_id',
+                                                   'indicator_id'))
+
+"""
+The closure table stores every ancestor/descendant pair in the parent/child hierarchy along with how many
+levels apart they are, so questions about the whole tree are answered with a single indexed query. The rows
+are maintained by Indicator.add_child and Indicator.remove_child.
+"""
+indicator_closure = db.Table('indicator_closure',
+                             db.Column('ancestor_id', db.Integer, db.ForeignKey('indicator.id'), primary_key=True),
+                             db.Column('descendant_id', db.Integer, db.ForeignKey('indicator.id'), primary_key=True),
+                             db.Column('depth', db.Integer, nullable=False),
+                             db.Index('ix_indicator_closure_descendant_id_depth', 'descendant_id', 'depth'))
+
+"""
+The count tables keep the number of indicators for every combination of type, status, confidence and impact, and
+for every tag and campaign, so that count requests on those filters do not need to scan the indicators. The rows
+are updated in the same transaction as the indicators by the session event below and by the bulk indicator routes.
+They have no foreign keys so that they never block deleting an unused type, tag, etc.
+"""
+indicator_count = db.Table('indicator_count',
+                           db.Column('type_id', db.Integer, primary_key=True),
+                           db.Column('status_id', db.Integer, primary_key=True),
+                           db.Column('confidence_id', db.Integer, primary_key=True),
+                           db.Column('impact_id', db.Integer, primary_key=True),
+                           db.Column('count', db.Integer, nullable=False))
+
+indicator_campaign_count = db.Table('indicator_campaign_count',
+                                    db.Column('campaign_id', db.Integer, primary_key=True),
+                                    db.Column('count', db.Integer, nullable=False))
+
+indicator_tag_count = db.Table('indicator_tag_count',
+                               db.Column('tag_id', db.Integer, primary_key=True),
+                               db.Column('count', db.Integer, nullable=False))
 
 indicator_equal_association = db.Table('indicator_equal_mapping',
                                        db.Column('left_id', db.Integer, db.ForeignKey('indicator.id'), primary_key=True),
@@ -83,15 +180,51 @@ indicator_equal_association = db.Table('indicator_equal_mapping',
 
 indicator_reference_association = db.Table('indicator_reference_mapping',
                                            db.Column('indicator_id', db.Integer, db.ForeignKey('indicator.id'), primary_key=True),
-                                           db.Column('intel_reference_id', db.Integer, db.ForeignKey('intel_reference.id'), primary_key=True))
+                                           db.Column('intel_reference_id', db.Integer, db.ForeignKey('intel_reference.id'), primary_key=True),
+                                           db.Index('ix_indicator_reference_mapping_intel_reference_id_indicator_id',
+                                                    'intel_reference_id', 'indicator_id'))
 
 indicator_relationship_association = db.Table('indicator_relationship_mapping',
                                               db.Column('parent_id', db.Integer, db.ForeignKey('indicator.id'), primary_key=True),
                                               db.Column('child_id', db.Integer, db.ForeignKey('indicator.id'),primary_key=True))
 
+"""
+The trigram table maps every three character substring of an indicator value to the indicator so that substring
+searches can find their candidates with an index instead of scanning every value. The values are folded to lowercase
+without accents first, like the collation that the LIKE check uses. The trigrams are stored as bytes so that the
+database compares them exactly. The rows are maintained by the Indicator mapper events
+below and by the bulk indicator routes.
+"""
+indicator_trigram = db.Table('indicator_trigram',
+                             db.Column('trigram', db.VARBINARY(12), primary_key=True),
+                             db.Column('indicator_id', db.Integer, db.ForeignKey('indicator.id'), primary_key=True),
+                             db.Index('ix_indicator_trigram_indicator_id', 'indicator_id'))
+
+"""
+A tombstone is left behind for every deleted indicator so that the change feed can tell mirrors to remove it. The
+rows are added by the Indicator mapper event below.
+"""
+indicator_tombstone = db.Table('indicator_tombstone',
+                               db.Column('indicator_id', db.Integer, primary_key=True, autoincrement=False),
+                               db.Column('deleted_time', db.DateTime, nullable=False),
+                               db.Index('ix_indicator_tombstone_deleted_time_indicator_id', 'deleted_time',
+                                        'indicator_id'))
+
 indicator_tag_association = db.Table('indicator_tag_mapping',
                                      db.Column('indicator_id', db.Integer, db.ForeignKey('indicator.id'), primary_key=True),
-                                     db.Column('tag_id', db.Integer, db.ForeignKey('tag.id'), primary_key=True))
+                                     db.Column('tag_id', db.Integer, db.ForeignKey('tag.id'), primary_key=True),
+                                     db.Index('ix_indicator_tag_mapping_tag_id_indicator_id', 'tag_id', 'indicator_id'))
+
+"""
+The write generation is a single row counter that goes up after every transaction that changes the database, so
+a cached API response can be reused for as long as the generation it was read at is still the current one. It is
+updated in its own short statement after the commit instead of in the transaction of the changes, so the row lock
+does not make the writers wait for each other. The sessions are marked by the session event below and by the bulk
+indicator routes.
+"""
+write_generation = db.Table('write_generation',
+                            db.Column('id', db.Integer, primary_key=True, autoincrement=False),
+                            db.Column('generation', db.BigInteger, nullable=False))
 
 roles_users_association = db.Table('role_user_mapping',
                                    db.Column('user_id', db.Integer(), db.ForeignKey('user.id'), primary_key=True),
@@ -182,29 +315,56 @@ class CampaignAlias(db.Model):
 class Indicator(PaginatedAPIMixin, db.Model):
     __tablename__ = 'indicator'
 
+    """
+    The value column is a UnicodeText that can only be indexed for full-text search, so duplicate checks
+    are done against the indexed SHA256 digests of the value instead. The exact digest is unique per type
+    so that the database rejects duplicate indicators even if two requests try to create the same one at
+    the same time.
+    """
+    __table_args__ = (
+        db.UniqueConstraint('type_id', 'value_hash', name='uq_indicator_type_id_value_hash'),
+        db.Index('ix_indicator_type_id_value_lower_hash', 'type_id', 'value_lower_hash'),
+        db.Index('ix_indicator_value_fulltext', 'value', mysql_prefix='FULLTEXT'),
+        db.Index('ix_indicator_modified_time_id', 'modified_time', 'id'),
+        db.Index('ix_indicator_ip_start_ip_end', 'ip_start', 'ip_end'),
+    )
+
+    """
+    Values that are IPv4 addresses or CIDR blocks also save their first and last address as integers. CIDR blocks
+    are aligned to their size, so the blocks that contain an address can only start at one of the 33 prefixes of
+    the address, and they are found with one index lookup per prefix instead of a scan.
+    """
+
     id = db.Column(db.Integer, primary_key=True, nullable=False)
     campaigns = db.relationship('Campaign', secondary=indicator_campaign_association)
     case_sensitive = db.Column(db.Boolean, default=False, nullable=False)
     confidence = db.relationship('IndicatorConfidence')
-    confidence_id = db.Column(db.Integer, db.ForeignKey('indicator_confidence.id'), nullable=False)
-    created_time = db.Column(db.DateTime, default=datetime.utcnow)
+    confidence_id = db.Column(db.Integer, db.ForeignKey('indicator_confidence.id'), index=True, nullable=False)
+    created_time = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     impact = db.relationship('IndicatorImpact')
-    impact_id = db.Column(db.Integer, db.ForeignKey('indicator_impact.id'), nullable=False)
+    impact_id = db.Column(db.Integer, db.ForeignKey('indicator_impact.id'), index=True, nullable=False)
+    ip_end = db.Column(db.BigInteger)
+    ip_start = db.Column(db.BigInteger)
     modified_time = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     references = db.relationship('IntelReference', secondary=indicator_reference_association)
 
     children = db.relationship('Indicator', secondary=indicator_relationship_association,
                                primaryjoin=(indicator_relationship_association.c.parent_id == id),
                                secondaryjoin=(indicator_relationship_association.c.child_id == id),
-                               backref=db.backref('parent', lazy='joined'), lazy='joined')
+                               backref='parent')
 
     equal = db.relationship('Indicator', secondary=indicator_equal_association,
                             primaryjoin=(indicator_equal_association.c.left_id == id),
-                            secondaryjoin=(indicator_equal_association.c.right_id == id),
-                            lazy='joined')
+                            secondaryjoin=(indicator_equal_association.c.right_id == id))
+
+    """
+    Indicators that are directly or indirectly equal share an equal_group_id, which is always the lowest
+    indicator ID in the group. Indicators that are not equal to anything have no group.
+    """
+    equal_group_id = db.Column(db.Integer, index=True)
 
     status = db.relationship('IndicatorStatus')
-    status_id = db.Column(db.Integer, db.ForeignKey('indicator_status.id'), nullable=False)
+    status_id = db.Column(db.Integer, db.ForeignKey('indicator_status.id'), index=True, nullable=False)
     substring = db.Column(db.Boolean, default=False, nullable=False)
     tags = db.relationship('Tag', secondary=indicator_tag_association)
     type = db.relationship('IndicatorType')
@@ -212,48 +372,162 @@ class Indicator(PaginatedAPIMixin, db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     user = db.relationship('User')
     value = db.Column(db.UnicodeText, nullable=False)
+    value_hash = db.Column(db.String(64), nullable=False)
+    value_lower_hash = db.Column(db.String(64), nullable=False)
 
     def __str__(self):
         return str('{} : {}'.format(self.type, self.value))
 
+    @validates('value')
+    def validate_value(self, key, value):
+        """ Keeps the value digests in sync whenever the value is set. """
+        self.value_hash = hash_value(value)
+        self.value_lower_hash = hash_value_lower(value)
+        self.ip_start, self.ip_end = ip_range(value)
+        return value
+
     def to_dict(self, bulk=False):
-        data = {
-            'id': self.id,
-            'type': self.type.value,
-            'value': self.value
-        }
+        if bulk:
+            return {'id': self.id, 'type': self.type.value, 'value': self.value}
 
-        if not bulk:
-            children = self.get_children(grandchildren=False)
-            all_children = self.get_children(grandchildren=True)
-
-            equal = self.get_equal(recursive=False)
-            all_equal = self.get_equal(recursive=True)
-
-            data['all_children'] = sorted([i.id for i in all_children])
-            data['all_equal'] = sorted([i.id for i in all_equal])
-            data['campaigns'] = [c.to_dict() for c in self.campaigns]
-            data['case_sensitive'] = bool(self.case_sensitive)
-            data['children'] = sorted([i.id for i in children])
-            data['confidence'] = self.confidence.value
-            data['created_time'] = self.created_time
-            data['equal'] = sorted([i.id for i in equal])
-            data['impact'] = self.impact.value
-            data['modified_time'] = self.modified_time
-            data['parent'] = self.get_parent().id if self.get_parent() else None
-            data['references'] = [r.to_dict() for r in self.references]
-            data['status'] = self.status.value
-            data['substring'] = bool(self.substring)
-            data['tags'] = sorted([t.value for t in self.tags])
-            data['user'] = self.user.username
+        return Indicator.to_dict_list([self.id])[0]
 
-        return data
+    @classmethod
+    def to_dict_items(cls, items):
+        return cls.to_dict_list([item.id for item in items])
+
+    @staticmethod
+    def to_dict_list(indicator_ids):
+        """ Builds the full dictionaries for many indicators using a fixed number of queries. """
+
+        if not indicator_ids:
+            return []
+
+        data = {}
+        query = db.session.query(Indicator.id, Indicator.case_sensitive, Indicator.created_time,
+                                 Indicator.equal_group_id, Indicator.modified_time, Indicator.substring,
+                                 Indicator.value, IndicatorConfidence.value, IndicatorImpact.value,
+                                 IndicatorStatus.value, IndicatorType.value, User.username)
+        query = query.join(Indicator.confidence).join(Indicator.impact).join(Indicator.status).join(Indicator.type)
+        query = query.join(Indicator.user).filter(Indicator.id.in_(indicator_ids))
+
+        equal_groups = {}
+        for row in query:
+            data[row[0]] = {'all_children': [],
+                            'all_equal': [],
+                            'campaigns': [],
+                            'case_sensitive': bool(row[1]),
+                            'children': [],
+                            'confidence': row[7],
+                            'created_time': row[2],
+                            'equal': [],
+                            'id': row[0],
+                            'impact': row[8],
+                            'modified_time': row[4],
+                            'parent': None,
+                            'references': [],
+                            'status': row[9],
+                            'substring': bool(row[5]),
+                            'tags': [],
+                            'type': row[10],
+                            'user': row[11],
+                            'value': row[6]}
+            if row[3] is not None:
+                equal_groups.setdefault(row[3], []).append(row[0])
+
+        # Tags
+        query = db.session.query(indicator_tag_association.c.indicator_id, Tag.value).join(
+            Tag, Tag.id == indicator_tag_association.c.tag_id).filter(
+            indicator_tag_association.c.indicator_id.in_(indicator_ids))
+        for indicator_id, value in query:
+            data[indicator_id]['tags'].append(value)
+
+        # Campaigns and their aliases
+        campaigns = {}
+        query = db.session.query(indicator_campaign_association.c.indicator_id, Campaign.id, Campaign.created_time,
+                                 Campaign.modified_time, Campaign.name).join(
+            Campaign, Campaign.id == indicator_campaign_association.c.campaign_id).filter(
+            indicator_campaign_association.c.indicator_id.in_(indicator_ids)).order_by(Campaign.id)
+        for indicator_id, campaign_id, created_time, modified_time, name in query:
+            if campaign_id not in campaigns:
+                campaigns[campaign_id] = {'id': campaign_id, 'aliases': [], 'created_time': created_time,
+                                          'modified_time': modified_time, 'name': name}
+            data[indicator_id]['campaigns'].append(campaigns[campaign_id])
+
+        if campaigns:
+            query = db.session.query(CampaignAlias.campaign_id, CampaignAlias.alias).filter(
+                CampaignAlias.campaign_id.in_(list(campaigns)))
+            for campaign_id, alias in query:
+                campaigns[campaign_id]['aliases'].append(alias)
+            for campaign in campaigns.values():
+                campaign['aliases'].sort()
+
+        # References
+        query = db.session.query(indicator_reference_association.c.indicator_id, IntelReference.id,
+                                 IntelReference.reference, IntelSource.value, User.username)
+        query = query.join(IntelReference, IntelReference.id == indicator_reference_association.c.intel_reference_id)
+        query = query.join(IntelReference.source).join(IntelReference.user).filter(
+            indicator_reference_association.c.indicator_id.in_(indicator_ids)).order_by(IntelReference.id)
+        for indicator_id, reference_id, reference, source, username in query:
+            data[indicator_id]['references'].append({'id': reference_id, 'reference': reference, 'source': source,
+                                                     'user': username})
+
+        # Children
+        query = db.session.query(indicator_closure.c.ancestor_id, indicator_closure.c.descendant_id,
+                                 indicator_closure.c.depth).filter(indicator_closure.c.ancestor_id.in_(indicator_ids))
+        for ancestor_id, descendant_id, depth in query:
+            data[ancestor_id]['all_children'].append(descendant_id)
+            if depth == 1:
+                data[ancestor_id]['children'].append(descendant_id)
+
+        # Parent
+        query = db.session.query(indicator_relationship_association.c.child_id,
+                                 indicator_relationship_association.c.parent_id).filter(
+            indicator_relationship_association.c.child_id.in_(indicator_ids))
+        for child_id, parent_id in query:
+            data[child_id]['parent'] = parent_id
+
+        # Equal
+        query = db.session.query(indicator_equal_association.c.left_id, indicator_equal_association.c.right_id).filter(
+            indicator_equal_association.c.left_id.in_(indicator_ids))
+        for left_id, right_id in query:
+            data[left_id]['equal'].append(right_id)
+
+        if equal_groups:
+            query = db.session.query(Indicator.id, Indicator.equal_group_id).filter(
+                Indicator.equal_group_id.in_(list(equal_groups)))
+            for other_id, group_id in query:
+                for indicator_id in equal_groups[group_id]:
+                    if other_id != indicator_id:
+                        data[indicator_id]['all_equal'].append(other_id)
+
+        for d in data.values():
+            d['all_children'].sort()
+            d['all_equal'].sort()
+            d['children'].sort()
+            d['equal'].sort()
+            d['tags'].sort()
+
+        return [data[i] for i in indicator_ids if i in data]
 
     def add_child(self, other):
-        if not self == other and not other.parent:
-            self.children.append(other)
-            return True
-        return False
+        # The child cannot already have a parent or be above this indicator in the hierarchy.
+        if self == other or other.parent or other.is_parent(self):
+            return False
+
+        # Every ancestor of this indicator (and itself) becomes an ancestor of the child's whole subtree.
+        ancestors = self._get_ancestor_depths()
+        ancestors[self.id] = 0
+        descendants = other._get_descendant_depths()
+        descendants[other.id] = 0
+
+        rows = [{'ancestor_id': a, 'descendant_id': d, 'depth': a_depth + d_depth + 1}
+                for a, a_depth in ancestors.items() for d, d_depth in descendants.items()]
+        db.session.execute(indicator_closure.insert(), rows)
+        Indicator._touch(list(ancestors) + list(descendants))
+
+        self.children.append(other)
+        return True
 
     def remove_child(self, other):
         result = False
@@ -267,13 +541,45 @@ class Indicator(PaginatedAPIMixin, db.Model):
             result = True
         except ValueError:
             pass
+
+        # Cut every path that went from this indicator (or its ancestors) down into the child's subtree.
+        if result:
+            ancestors = list(self._get_ancestor_depths()) + [self.id]
+            descendants = list(other._get_descendant_depths()) + [other.id]
+            db.session.execute(indicator_closure.delete().where(
+                db.and_(indicator_closure.c.ancestor_id.in_(ancestors),
+                        indicator_closure.c.descendant_id.in_(descendants))))
+            Indicator._touch(ancestors + descendants)
+
         return result
 
+    @staticmethod
+    def _touch(indicator_ids):
+        """ Updates the modified time of indicators whose hierarchy or equal group changed without a row of their own
+        changing, so the change feed and the bitmap index pick them up. """
+
+        Indicator.query.filter(Indicator.id.in_(indicator_ids)).update(
+            {'modified_time': datetime.utcnow()}, synchronize_session='fetch')
+
+    def remove_relationships(self):
+        """ Detaches the indicator from its parent, children and equal indicators before it is deleted. """
+        parent = self.get_parent()
+        if parent:
+            parent.remove_child(self)
+        for child in list(self.children):
+            self.remove_child(child)
+        for other in list(self.equal):
+            self.remove_equal(other)
+
     def is_parent(self, other, grandchildren=True):
-        return other in self.get_children(grandchildren=grandchildren)
+        query = db.session.query(indicator_closure).filter(indicator_closure.c.ancestor_id == self.id,
+                                                           indicator_closure.c.descendant_id == other.id)
+        if not grandchildren:
+            query = query.filter(indicator_closure.c.depth == 1)
+        return db.session.query(query.exists()).scalar()
 
     def is_child(self, other, grandchildren=True):
-        return self in other.get_children(grandchildren=grandchildren)
+        return other.is_parent(self, grandchildren=grandchildren)
 
     def get_parent(self):
         try:
@@ -281,32 +587,48 @@ class Indicator(PaginatedAPIMixin, db.Model):
         except IndexError:
             return None
 
-    def get_children(self, grandchildren=True, _orig=None, _results=None):
+    def get_children(self, grandchildren=True):
         if not grandchildren:
             return self.children
 
-        if _orig is None:
-            _orig = self
-            _results = []
+        return Indicator.query.join(indicator_closure, indicator_closure.c.descendant_id == Indicator.id).filter(
+            indicator_closure.c.ancestor_id == self.id).all()
+
+    def get_children_ids(self, grandchildren=True):
+        query = db.session.query(indicator_closure.c.descendant_id).filter(indicator_closure.c.ancestor_id == self.id)
+        if not grandchildren:
+            query = query.filter(indicator_closure.c.depth == 1)
+        return [row[0] for row in query]
 
-        for ind in self.children:
-            if ind not in _results:
-                _results.append(ind)
-                _results = ind.get_children(_orig=_orig, _results=_results)
+    def _get_ancestor_depths(self):
+        query = db.session.query(indicator_closure.c.ancestor_id, indicator_closure.c.depth).filter(
+            indicator_closure.c.descendant_id == self.id)
+        return dict(query)
 
-        return _results
+    def _get_descendant_depths(self):
+        query = db.session.query(indicator_closure.c.descendant_id, indicator_closure.c.depth).filter(
+            indicator_closure.c.ancestor_id == self.id)
+        return dict(query)
 
     def is_equal(self, other, recursive=True):
         if not recursive:
             if other in self.equal or self in other.equal:
                 return True
             return False
-        return other in self.get_equal(recursive=True)
+        return self.equal_group_id is not None and self.equal_group_id == other.equal_group_id
 
     def make_equal(self, other):
         if not self == other and not self.is_equal(other, recursive=True):
             self.equal.append(other)
             other.equal.append(self)
+
+            # Merge the two groups into whichever has the lowest indicator ID. Every member of both groups has
+            # new equal indicators, so all of them are modified.
+            old_groups = [g for g in (self.equal_group_id, other.equal_group_id) if g is not None]
+            new_group = min([self.id, other.id] + old_groups)
+            Indicator.query.filter(db.or_(Indicator.id.in_([self.id, other.id]),
+                                          Indicator.equal_group_id.in_(old_groups))).update(
+                {'equal_group_id': new_group, 'modified_time': datetime.utcnow()}, synchronize_session='fetch')
             return True
         return False
 
@@ -322,34 +644,232 @@ class Indicator(PaginatedAPIMixin, db.Model):
             result = True
         except ValueError:
             pass
+
+        if result and self.equal_group_id is not None:
+            db.session.flush()
+            Indicator._split_equal_group(self.equal_group_id)
+
         return result
 
-    def get_equal(self, recursive=True, _orig=None, _already_checked=None, _results=None):
-        if _already_checked is None:
-            _already_checked = []
+    @staticmethod
+    def _split_equal_group(group_id):
+        """ Relabels each connected piece of the group after a link inside of it was removed. """
+
+        members = [row[0] for row in db.session.query(Indicator.id).filter(Indicator.equal_group_id == group_id)]
+        links = db.session.query(indicator_equal_association.c.left_id, indicator_equal_association.c.right_id).filter(
+            indicator_equal_association.c.left_id.in_(members))
+
+        neighbors = {m: [] for m in members}
+        for left_id, right_id in links:
+            neighbors[left_id].append(right_id)
+
+        unvisited = set(members)
+        while unvisited:
+            start = unvisited.pop()
+            piece = [start]
+            stack = [start]
+            while stack:
+                for neighbor in neighbors.get(stack.pop(), []):
+                    if neighbor in unvisited:
+                        unvisited.remove(neighbor)
+                        piece.append(neighbor)
+                        stack.append(neighbor)
+
+            new_group = min(piece) if len(piece) > 1 else None
+            if new_group != group_id:
+                Indicator.query.filter(Indicator.id.in_(piece)).update(
+                    {'equal_group_id': new_group}, synchronize_session='fetch')
+
+        # The members that kept the group lost equal indicators too.
+        Indicator._touch(members)
+
+    def get_equal(self, recursive=True):
         if not recursive:
             return self.equal
 
-        if _orig is None:
-            _orig = self
-            _already_checked = []
-            _results = []
+        if self.equal_group_id is None:
+            return []
+        return Indicator.query.filter(Indicator.equal_group_id == self.equal_group_id, Indicator.id != self.id).all()
 
-        for ind in self.equal:
-            if ind == _orig:
-                continue
-            if ind not in _results:
-                _results.append(ind)
-            if ind not in _already_checked:
-                _already_checked.append(ind)
-                _results = ind.get_equal(_orig=_orig, _already_checked=_already_checked, _results=_results)
+    def get_equal_ids(self, recursive=True):
+        if not recursive:
+            return [i.id for i in self.equal]
 
-        try:
-            _results.remove(_orig)
-        except ValueError:
-            pass
+        if self.equal_group_id is None:
+            return []
+        query = db.session.query(Indicator.id).filter(Indicator.equal_group_id == self.equal_group_id,
+                                                      Indicator.id != self.id)
+        return [row[0] for row in query]
+
+
+@event.listens_for(Indicator, 'after_insert')
+def insert_indicator_trigrams(mapper, connection, target):
+    rows = trigram_rows(target.id, target.value)
+    if rows:
+        connection.execute(indicator_trigram.insert(), rows)
+
+
+@event.listens_for(Indicator, 'after_update')
+def update_indicator_trigrams(mapper, connection, target):
+    if db.inspect(target).attrs.value.history.has_changes():
+        connection.execute(indicator_trigram.delete().where(indicator_trigram.c.indicator_id == target.id))
+        insert_indicator_trigrams(mapper, connection, target)
+
+
+@event.listens_for(Indicator, 'before_delete')
+def delete_indicator_trigrams(mapper, connection, target):
+    connection.execute(indicator_trigram.delete().where(indicator_trigram.c.indicator_id == target.id))
+
+
+@event.listens_for(Indicator, 'after_delete')
+def insert_indicator_tombstone(mapper, connection, target):
+    # Replace the tombstone of an earlier indicator in case the database reused its ID.
+    connection.execute(indicator_tombstone.delete().where(indicator_tombstone.c.indicator_id == target.id))
+    connection.execute(indicator_tombstone.insert().values(indicator_id=target.id, deleted_time=datetime.utcnow()))
+
+
+# Changing the tags or campaigns only writes to the mapping tables, so update the modified time of the
+# indicator as well. The bitmap index and the change feed find the changed indicators by their modified time.
+@event.listens_for(Indicator.campaigns, 'append')
+@event.listens_for(Indicator.campaigns, 'remove')
+@event.listens_for(Indicator.tags, 'append')
+@event.listens_for(Indicator.tags, 'remove')
+def touch_indicator_modified_time(target, value, initiator):
+    target.modified_time = datetime.utcnow()
+
+
+# The relationships are listed on both indicators, so both of them are modified.
+@event.listens_for(Indicator.children, 'append')
+@event.listens_for(Indicator.children, 'remove')
+@event.listens_for(Indicator.equal, 'append')
+@event.listens_for(Indicator.equal, 'remove')
+def touch_related_indicator_modified_time(target, value, initiator):
+    target.modified_time = value.modified_time = datetime.utcnow()
+
+
+def _add_counts(connection, table, key_columns, deltas):
+    for key, delta in deltas.items():
+        if not delta:
+            continue
+
+        values = dict(zip(key_columns, key))
+        if connection.dialect.name == 'mysql':
+            statement = mysql.insert(table).values(count=delta, **values)
+            connection.execute(statement.on_duplicate_key_update(count=table.c.count + delta))
+        else:
+            where = db.and_(*[table.c[column] == value for column, value in values.items()])
+            result = connection.execute(table.update().where(where).values(count=table.c.count + delta))
+            if not result.rowcount:
+                connection.execute(table.insert().values(count=delta, **values))
+
+
+def add_indicator_counts(connection, counts, tag_counts, campaign_counts):
+    """ Adds the Counter deltas to the indicator count tables.
+
+    The counts are keyed by (type_id, status_id, confidence_id, impact_id) and the tag and campaign counts by their ID.
+    """
+
+    _add_counts(connection, indicator_count, ['type_id', 'status_id', 'confidence_id', 'impact_id'], counts)
+    _add_counts(connection, indicator_tag_count, ['tag_id'], {(k,): v for k, v in tag_counts.items()})
+    _add_counts(connection, indicator_campaign_count, ['campaign_id'], {(k,): v for k, v in campaign_counts.items()})
+
+
+def _count_key(target, committed):
+    # Read the dimension IDs as they were before the flush (committed) or as they are now.
+    key = []
+    for name in ['type_id', 'status_id', 'confidence_id', 'impact_id']:
+        history = attributes.get_history(target, name)
+        if committed:
+            key.append((list(history.deleted) + list(history.unchanged))[0])
+        else:
+            key.append((list(history.added) + list(history.unchanged))[0])
+    return tuple(key)
+
+
+def _count_ids(target, name, committed):
+    history = attributes.get_history(target, name)
+    items = list(history.unchanged) + list(history.deleted if committed else history.added)
+    return [item.id for item in items]
+
+
+def get_write_generation():
+    """ Returns the current write generation. """
+    return db.session.query(write_generation.c.generation).filter(write_generation.c.id == 1).scalar() or 0
+
+
+def bump_write_generation(connection):
+    """ Increments the write generation with the connection. """
 
-        return _results
+    result = connection.execute(write_generation.update().where(write_generation.c.id == 1).values(
+        generation=write_generation.c.generation + 1))
+    if not result.rowcount:
+        connection.execute(write_generation.insert().values(id=1, generation=1))
+
+
+def mark_write(session):
+    """ Marks the session to increment the write generation once its transaction commits. """
+
+    session.info['write_generation_changed'] = True
+
+
+@event.listens_for(Session, 'after_flush')
+def mark_write_after_flush(session, flush_context):
+    # The progress of a bulk job does not change any API results, and its indicators mark the session themselves.
+    changed = itertools.chain(session.new, session.dirty, session.deleted)
+    if any(not isinstance(target, Job) for target in changed):
+        mark_write(session)
+
+
+@event.listens_for(Session, 'after_commit')
+def bump_write_generation_after_commit(session):
+    # The generation goes up after the changes are visible, so a response read before the commit is never cached
+    # under the new generation. The session is bound to an engine, except in the tests where it shares the
+    # connection of the test transaction.
+    if not session.info.pop('write_generation_changed', False):
+        return
+
+    bind = session.get_bind()
+    if isinstance(bind, Connection):
+        bump_write_generation(bind)
+    else:
+        with bind.connect() as connection:
+            bump_write_generation(connection)
+
+
+@event.listens_for(Session, 'after_rollback')
+def forget_write_after_rollback(session):
+    session.info.pop('write_generation_changed', None)
+
+
+@event.listens_for(Session, 'after_flush')
+def update_indicator_counts(session, flush_context):
+    # The attribute history still shows the changes of the flush here, and every new row has its ID.
+    counts = Counter()
+    tag_counts = Counter()
+    campaign_counts = Counter()
+
+    def count(target, committed, delta):
+        counts[_count_key(target, committed)] += delta
+        for tag_id in _count_ids(target, 'tags', committed):
+            tag_counts[tag_id] += delta
+        for campaign_id in _count_ids(target, 'campaigns', committed):
+            campaign_counts[campaign_id] += delta
+
+    for target in session.new:
+        if isinstance(target, Indicator):
+            count(target, False, 1)
+
+    for target in session.dirty:
+        if isinstance(target, Indicator) and session.is_modified(target):
+            count(target, True, -1)
+            count(target, False, 1)
+
+    for target in session.deleted:
+        if isinstance(target, Indicator):
+            count(target, True, -1)
+
+    if counts or tag_counts or campaign_counts:
+        add_indicator_counts(session.connection(), counts, tag_counts, campaign_counts)
 
 
 class IndicatorConfidence(db.Model):
@@ -408,15 +928,54 @@ class IndicatorType(db.Model):
                 'value': self.value}
 
 
+class Job(db.Model):
+    __tablename__ = 'job'
+
+    """
+    Asynchronous bulk indicator jobs are stored in the database so that any web worker can report their
+    status. The payload is the gzip compressed JSON list of indicators and is cleared once the job ends.
+    The modified time is updated with the progress after every chunk, so it shows when a job stopped.
+    """
+
+    id = db.Column(db.Integer, primary_key=True, nullable=False)
+    created = db.Column(db.Integer, default=0, nullable=False)
+    created_time = db.Column(db.DateTime, default=datetime.utcnow)
+    errors = db.Column(db.UnicodeText().with_variant(mysql.MEDIUMTEXT, 'mysql'))
+    failed = db.Column(db.Integer, default=0, nullable=False)
+    modified_time = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    payload = db.Column(db.LargeBinary().with_variant(mysql.LONGBLOB, 'mysql'))
+    skipped = db.Column(db.Integer, default=0, nullable=False)
+    status = db.Column(db.String(32), default='queued', nullable=False)
+    total = db.Column(db.Integer, default=0, nullable=False)
+    user = db.relationship('User')
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+
+    def __str__(self):
+        return str('{} : {}'.format(self.id, self.status))
+
+    def to_dict(self):
+        return {'id': self.id,
+                'created': self.created,
+                'created_time': self.created_time,
+                'errors': json.loads(self.errors) if self.errors else [],
+                'failed': self.failed,
+                'modified_time': self.modified_time,
+                'processed': self.created + self.skipped + self.failed,
+                'skipped': self.skipped,
+                'status': self.status,
+                'total': self.total}
+
+
 class IntelReference(PaginatedAPIMixin, db.Model):
     __tablename__ = 'intel_reference'
     __table_args__ = (
         db.UniqueConstraint('intel_source_id', 'reference'),
+        db.Index('ix_intel_reference_reference_fulltext', 'reference', mysql_prefix='FULLTEXT'),
     )
 
     id = db.Column(db.Integer, primary_key=True, nullable=False)
     user = db.relationship('User')
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True, nullable=False)
     reference = db.Column(db.String(512), index=True, nullable=False)
     source = db.relationship('IntelSource')
     intel_source_id = db.Column(db.Integer, db.ForeignKey('intel_source.id'), nullable=False)
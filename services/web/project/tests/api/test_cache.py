@@ -0,0 +1,79 @@
+import gzip
+
+from project.tests.conftest import TEST_ANALYST_APIKEY, TEST_INACTIVE_APIKEY, TEST_INVALID_APIKEY
+from project.tests.helpers import *
+
+
+"""
+READ TESTS
+"""
+
+
+def test_read_missing_api_key(app, client):
+    """ Ensure an API key is given if the config requires it """
+
+    app.config['GET'] = 'analyst'
+
+    request = client.get('/api/cache')
+    response = json.loads(request.data.decode())
+    assert request.status_code == 401
+    assert response['msg'] == 'Bad or missing API key'
+
+
+def test_read_invalid_api_key(app, client):
+    """ Ensure an API key not found in the database does not work """
+
+    app.config['GET'] = 'analyst'
+
+    headers = {'Authorization': 'Apikey ' + TEST_INVALID_APIKEY}
+    request = client.get('/api/cache', headers=headers)
+    response = json.loads(request.data.decode())
+    assert request.status_code == 401
+    assert response['msg'] == 'API user does not exist'
+
+
+def test_read_inactive_api_key(app, client):
+    """ Ensure an inactive API key does not work """
+
+    app.config['GET'] = 'analyst'
+
+    headers = {'Authorization': 'Apikey ' + TEST_INACTIVE_APIKEY}
+    request = client.get('/api/cache', headers=headers)
+    response = json.loads(request.data.decode())
+    assert request.status_code == 401
+    assert response['msg'] == 'API user is not active'
+
+
+def test_read_invalid_role(app, client):
+    """ Ensure the given API key has the proper role access """
+
+    app.config['GET'] = 'user_does_not_have_this_role'
+
+    headers = {'Authorization': 'Apikey ' + TEST_ANALYST_APIKEY}
+    request = client.get('/api/cache', headers=headers)
+    response = json.loads(request.data.decode())
+    assert request.status_code == 401
+    assert response['msg'] == 'Insufficient privileges'
+
+
+def test_read_statement_cache(client):
+    """ Ensure requests with the same filters but different values reuse the compiled statement """
+
+    request, response = create_indicator(client, 'asdf', 'asdf', 'analyst', tags=['phish', 'from_address'])
+    assert request.status_code == 201
+
+    request = client.get('/api/cache')
+    before = json.loads(request.data.decode())['statement_cache']
+
+    request = client.get('/api/indicators?tags=phish,from_address&value=asdf&limit=10&after_id=0')
+    response = json.loads(gzip.decompress(request.data).decode('utf-8'))
+    assert len(response['items']) == 1
+
+    request = client.get('/api/indicators?tags=phish,does_not_exist&value=asdf&limit=5&after_id=0')
+    response = json.loads(gzip.decompress(request.data).decode('utf-8'))
+    assert len(response['items']) == 0
+
+    request = client.get('/api/cache')
+    after = json.loads(request.data.decode())['statement_cache']
+    assert after['misses'] <= before['misses'] + 1
+    assert after['hits'] >= before['hits'] + 1
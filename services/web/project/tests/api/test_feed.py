@@ -0,0 +1,117 @@
+import gzip
+
+from project.api.feeds import build_feeds
+from project.tests.conftest import TEST_ANALYST_APIKEY, TEST_INACTIVE_APIKEY, TEST_INVALID_APIKEY
+from project.tests.helpers import *
+
+
+"""
+READ TESTS
+"""
+
+
+def test_read_nonexistent_name(app, client, tmpdir):
+    """ Ensure a nonexistent feed name does not work """
+
+    app.config['INDICATOR_FEED_DIR'] = str(tmpdir)
+    try:
+        for name in ['asdf.json', '.asdf.json', 'generation']:
+            request = client.get('/api/feeds/{}'.format(name))
+            response = json.loads(request.data.decode())
+            assert request.status_code == 404
+            assert response['msg'] == 'Feed not found'
+    finally:
+        app.config['INDICATOR_FEED_DIR'] = None
+
+
+def test_read_missing_api_key(app, client):
+    """ Ensure an API key is given if the config requires it """
+
+    app.config['GET'] = 'analyst'
+
+    request = client.get('/api/feeds/status_new.json')
+    response = json.loads(request.data.decode())
+    assert request.status_code == 401
+    assert response['msg'] == 'Bad or missing API key'
+
+
+def test_read_invalid_api_key(app, client):
+    """ Ensure an API key not found in the database does not work """
+
+    app.config['GET'] = 'analyst'
+
+    headers = {'Authorization': 'Apikey ' + TEST_INVALID_APIKEY}
+    request = client.get('/api/feeds/status_new.json', headers=headers)
+    response = json.loads(request.data.decode())
+    assert request.status_code == 401
+    assert response['msg'] == 'API user does not exist'
+
+
+def test_read_inactive_api_key(app, client):
+    """ Ensure an inactive API key does not work """
+
+    app.config['GET'] = 'analyst'
+
+    headers = {'Authorization': 'Apikey ' + TEST_INACTIVE_APIKEY}
+    request = client.get('/api/feeds/status_new.json', headers=headers)
+    response = json.loads(request.data.decode())
+    assert request.status_code == 401
+    assert response['msg'] == 'API user is not active'
+
+
+def test_read_invalid_role(app, client):
+    """ Ensure the given API key has the proper role access """
+
+    app.config['GET'] = 'user_does_not_have_this_role'
+
+    headers = {'Authorization': 'Apikey ' + TEST_ANALYST_APIKEY}
+    request = client.get('/api/feeds/status_new.json', headers=headers)
+    response = json.loads(request.data.decode())
+    assert request.status_code == 401
+    assert response['msg'] == 'Insufficient privileges'
+
+
+def test_read(app, client, tmpdir):
+    """ Ensure the feeds are built for every status, type and pair and can be read """
+
+    request, response = create_indicator(client, 'Email - Address', 'badguy@evil.com', 'analyst')
+    assert request.status_code == 201
+    request, response = create_indicator(client, 'Email - Address', 'phisher@evil.com', 'analyst', status='Deployed')
+    assert request.status_code == 201
+    request, response = create_indicator(client, 'Email - Content', 'two\nlines', 'analyst')
+    assert request.status_code == 201
+
+    app.config['INDICATOR_FEED_DIR'] = str(tmpdir)
+    try:
+        tmpdir.join('status_old.json').write('')
+        generation = build_feeds(str(tmpdir))
+
+        request = client.get('/api/feeds')
+        response = json.loads(request.data.decode())
+        assert request.status_code == 200
+        assert response['generation'] == generation
+        assert 'status_old.json' not in response['feeds']
+        assert 'status_deployed__type_email-address.txt' in response['feeds']
+        assert 'status_deployed__type_email-content.txt' not in response['feeds']
+
+        def read(name):
+            request = client.get('/api/feeds/{}'.format(name))
+            assert request.status_code == 200
+            assert request.headers['Content-Encoding'] == 'gzip'
+            return gzip.decompress(request.data).decode('utf-8')
+
+        assert read('status_new.txt') == 'badguy@evil.com\n'
+        assert [x['value'] for x in json.loads(read('status_new.json'))] == ['badguy@evil.com', 'two\nlines']
+        assert read('status_deployed__type_email-address.txt') == 'phisher@evil.com\n'
+        assert len(json.loads(read('type_email-address.json'))) == 2
+
+        # nginx sends the file when it serves the feed directory.
+        app.config['INDICATOR_FEED_ACCEL_PREFIX'] = '/feeds-internal/'
+        request = client.get('/api/feeds/status_new.txt')
+        assert request.status_code == 200
+        assert request.headers['X-Accel-Redirect'] == '/feeds-internal/status_new.txt'
+        assert request.headers['Content-Type'].startswith('text/plain')
+        assert not request.data
+    finally:
+        app.config['INDICATOR_FEED_DIR'] = None
+        app.config['INDICATOR_FEED_ACCEL_PREFIX'] = None
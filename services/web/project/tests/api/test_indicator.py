@@ -1,11 +1,24 @@
 import datetime
 import gzip
+import importlib
 import time
 import urllib.parse
 
+from sqlalchemy import exc
+from sqlalchemy.dialects import mysql
+
+from lib.bloom_client import BloomFilter
+from project import db
+from project.api import bitmap
+from project.api.bulk import BulkIndicatorCreator
+from project.api.filters import build_indicator_statement, parse_indicator_filters, search_trigrams
+from project.models import IntelReference, IntelSource, UNFOLDED_TRIGRAM, trigram_rows
 from project.tests.conftest import TEST_ANALYST_APIKEY, TEST_INACTIVE_APIKEY, TEST_INVALID_APIKEY
 from project.tests.helpers import *
 
+# The cache route module shadows the cache module as an attribute of project.api.
+cache = importlib.import_module('project.api.cache')
+
 
 """
 CREATE TESTS
@@ -616,6 +629,20 @@ def test_create_duplicate(client):
     assert response['msg'] == 'Case-insensitive indicator already exists'
 
 
+def test_create_duplicate_case_sensitive(client):
+    """ Ensure a duplicate case-sensitive record cannot be created """
+
+    request, response = create_indicator(client, 'asdf', 'asdf', 'analyst', case_sensitive=True)
+    assert request.status_code == 201
+
+    request, response = create_indicator(client, 'asdf', 'asdf', 'analyst', case_sensitive=True)
+    assert request.status_code == 409
+    assert response['msg'] == 'Case-sensitive indicator already exists'
+
+    request, response = create_indicator(client, 'asdf', 'ASDF', 'analyst', case_sensitive=True)
+    assert request.status_code == 201
+
+
 def test_create_nonexistent_username(client):
     """ Ensure an indicator cannot be created with a nonexistent username """
 
@@ -1096,6 +1123,160 @@ def test_create_bulk(client):
     assert len(response) == 2
 
 
+def test_create_bulk_duplicates(client):
+    """ Ensure duplicate indicators in the database and within the request are skipped """
+
+    request, response = create_indicator(client, 'asdf', 'asdf', 'analyst')
+    assert request.status_code == 201
+
+    data = {'indicators': [
+        {'type': 'asdf', 'value': 'ASDF', 'username': 'analyst'},
+        {'type': 'asdf', 'value': 'asdf2', 'username': 'analyst'},
+        {'type': 'asdf', 'value': 'ASDF2', 'username': 'analyst'},
+        {'type': 'asdf', 'value': 'ASDF2', 'username': 'analyst', 'case_sensitive': True},
+        {'type': 'asdf', 'value': 'asdf3', 'username': 'analyst', 'case_sensitive': True},
+        {'type': 'asdf', 'value': 'asdf3', 'username': 'analyst', 'case_sensitive': True}
+    ]}
+
+    request = client.post('/api/indicators/bulk', json=data)
+    assert request.status_code == 204
+
+    request = client.get('/api/indicators')
+    response = gzip.decompress(request.data)
+    response = json.loads(response.decode('utf-8'))
+    assert request.status_code == 200
+    assert sorted([i['value'] for i in response]) == ['ASDF2', 'asdf', 'asdf2', 'asdf3']
+
+
+def test_create_bulk_race(client, monkeypatch):
+    """ Ensure only the indicators created by another request in the meantime are reported as duplicates """
+
+    request, response = create_indicator(client, 'asdf', 'asdf', 'analyst')
+    assert request.status_code == 201
+
+    # Miss the existing indicator on the first lookup and fail the first write as if another request committed
+    # it in between. The test session cannot really be rolled back, so nothing is written before the failure.
+    find_existing = BulkIndicatorCreator.find_existing
+    flush = BulkIndicatorCreator.flush
+    calls = []
+
+    def racing_find_existing(self, items):
+        calls.append(len(items))
+        if len(calls) > 1:
+            find_existing(self, items)
+
+    def racing_flush(self):
+        if len(calls) == 1:
+            raise exc.IntegrityError('INSERT', {}, Exception('Duplicate entry'))
+        return flush(self)
+
+    monkeypatch.setattr(BulkIndicatorCreator, 'find_existing', racing_find_existing)
+    monkeypatch.setattr(BulkIndicatorCreator, 'flush', racing_flush)
+    monkeypatch.setattr(db.session, 'rollback', lambda: None)
+
+    creator = BulkIndicatorCreator()
+    results = creator.create_chunk([{'type': 'asdf', 'value': 'asdf2', 'username': 'analyst'},
+                                    {'type': 'asdf', 'value': 'ASDF', 'username': 'analyst'},
+                                    {'type': 'asdf', 'value': 'asdf3', 'username': 'analyst'}])
+    assert len(calls) == 2
+    assert results == [('created', None), ('error', 'Indicator already exists'), ('created', None)]
+
+    request = client.get('/api/indicators')
+    response = json.loads(gzip.decompress(request.data).decode('utf-8'))
+    assert sorted([i['value'] for i in response]) == ['asdf', 'asdf2', 'asdf3']
+
+
+def test_create_bulk_ndjson(client):
+    """ Ensure newline-delimited JSON is processed line by line """
+
+    request, response = create_indicator(client, 'asdf', 'asdf', 'analyst')
+    assert request.status_code == 201
+
+    lines = [json.dumps({'type': 'asdf', 'value': 'asdf2', 'username': 'analyst'}),
+             json.dumps({'type': 'asdf', 'value': 'ASDF', 'username': 'analyst'}),
+             '',
+             'this is not json',
+             json.dumps({'type': 'asdf', 'username': 'analyst'}),
+             json.dumps({'type': 'asdf', 'value': 'asdf3', 'username': 'this_user_does_not_exist'}),
+             json.dumps({'type': 'asdf', 'value': 'asdf2', 'username': 'analyst'}),
+             json.dumps({'type': 'asdf', 'value': 'asdf4', 'username': 'analyst'})]
+
+    request = client.post('/api/indicators/bulk/ndjson?chunk_size=2', data='\n'.join(lines),
+                          content_type='application/x-ndjson')
+    assert request.status_code == 200
+    assert request.mimetype == 'application/x-ndjson'
+    results = [json.loads(line) for line in request.data.decode().splitlines()]
+    results = {r['line']: r for r in results}
+    assert sorted(results) == [1, 2, 4, 5, 6, 7, 8]
+    assert results[1]['result'] == 'created'
+    assert results[2]['result'] == 'skipped'
+    assert results[4]['msg'] == 'Line must be valid JSON'
+    assert "'value' is a required property" in results[5]['msg']
+    assert results[6]['msg'] == 'User not found by username'
+    assert results[7]['result'] == 'skipped'
+    assert results[8]['result'] == 'created'
+
+    request = client.get('/api/indicators')
+    response = gzip.decompress(request.data)
+    response = json.loads(response.decode('utf-8'))
+    assert request.status_code == 200
+    assert sorted([i['value'] for i in response]) == ['asdf', 'asdf2', 'asdf4']
+
+
+def test_create_bulk_ndjson_rejected_supporting_objects(app, client):
+    """ Ensure an indicator that is rejected does not leave its automatically created objects behind """
+
+    create_indicator_type(client, 'asdf')
+    create_indicator_confidence(client, 'LOW')
+    create_indicator_impact(client, 'LOW')
+    create_indicator_status(client, 'New')
+    reference = {'source': 'OSINT', 'reference': 'http://blahblah.com'}
+    lines = [json.dumps({'type': 'asdf', 'value': 'asdf1', 'username': 'analyst', 'references': [reference],
+                         'tags': ['does_not_exist']}),
+             json.dumps({'type': 'asdf', 'value': 'asdf2', 'username': 'analyst'})]
+
+    app.config['INDICATOR_AUTO_CREATE_TAG'] = False
+    try:
+        request = client.post('/api/indicators/bulk/ndjson', data='\n'.join(lines),
+                              content_type='application/x-ndjson')
+    finally:
+        app.config['INDICATOR_AUTO_CREATE_TAG'] = True
+    results = [json.loads(line) for line in request.data.decode().splitlines()]
+    assert [r['result'] for r in results] == ['error', 'created']
+    assert results[0]['msg'] == 'Tag not found: does_not_exist'
+
+    assert IntelReference.query.count() == 0
+    assert IntelSource.query.count() == 0
+
+
+def test_create_bulk_ndjson_database_error(client, monkeypatch):
+    """ Ensure a chunk that fails with a database error is reported without stopping the response """
+
+    create_chunk = BulkIndicatorCreator.create_chunk
+
+    def failing_create_chunk(self, items):
+        if any(x['value'] == 'fail' for x in items):
+            raise exc.OperationalError('INSERT', {}, Exception('Lost connection'))
+        return create_chunk(self, items)
+
+    monkeypatch.setattr(BulkIndicatorCreator, 'create_chunk', failing_create_chunk)
+    monkeypatch.setattr(db.session, 'rollback', lambda: None)
+
+    create_indicator_type(client, 'asdf')
+    create_indicator_confidence(client, 'LOW')
+    create_indicator_impact(client, 'LOW')
+    create_indicator_status(client, 'New')
+    lines = [json.dumps({'type': 'asdf', 'value': value, 'username': 'analyst'})
+             for value in ['asdf1', 'fail', 'asdf3', 'asdf4']]
+
+    request = client.post('/api/indicators/bulk/ndjson?chunk_size=2', data='\n'.join(lines),
+                          content_type='application/x-ndjson')
+    assert request.status_code == 200
+    results = [json.loads(line) for line in request.data.decode().splitlines()]
+    assert [r['result'] for r in results] == ['error', 'error', 'created', 'created']
+    assert results[0]['msg'] == 'Database error while creating the indicators'
+
+
 """
 READ TESTS
 """
@@ -1176,6 +1357,699 @@ def test_read_all_values(client):
     assert len(response) == 3
 
 
+def test_read_all_values_query_count(client):
+    """ Ensure the number of queries does not grow with the number of indicators """
+
+    request, response = create_indicator(client, 'asdf', 'asdf', 'analyst', tags=['phish'])
+    assert request.status_code == 201
+
+    with count_queries() as one_indicator:
+        request = client.get('/api/indicators?tags=phish')
+    assert request.status_code == 200
+
+    for i in range(2, 6):
+        request, response = create_indicator(client, 'asdf', 'asdf{}'.format(i), 'analyst', tags=['phish'])
+        assert request.status_code == 201
+
+    with count_queries() as five_indicators:
+        request = client.get('/api/indicators?tags=phish')
+    response = gzip.decompress(request.data)
+    response = json.loads(response.decode('utf-8'))
+    assert request.status_code == 200
+    assert len(response) == 5
+    assert five_indicators.count == one_indicator.count
+
+
+def test_read_paginated(client):
+    """ Ensure indicators can be paged through with a cursor, including with the GROUP BY filters """
+
+    for i in range(1, 6):
+        request, response = create_indicator(client, 'asdf', 'asdf{}'.format(i), 'analyst', tags=['phish', 'tag{}'.format(i % 2)])
+        assert request.status_code == 201
+    request, response = create_indicator(client, 'asdf', 'asdf6', 'analyst')
+    assert request.status_code == 201
+
+    request = client.get('/api/indicators?limit=0')
+    response = json.loads(request.data.decode())
+    assert request.status_code == 400
+    assert response['msg'] == 'limit and after_id must be positive integers'
+
+    request = client.get('/api/indicators?limit=asdf')
+    assert request.status_code == 400
+
+    values = []
+    url = '/api/indicators?tags=phish,tag1&limit=2'
+    while url:
+        request = client.get(url)
+        response = gzip.decompress(request.data)
+        response = json.loads(response.decode('utf-8'))
+        assert request.status_code == 200
+        assert len(response['items']) <= 2
+        values += [i['value'] for i in response['items']]
+        url = response['_links']['next']
+    assert values == ['asdf1', 'asdf3', 'asdf5']
+
+    request = client.get('/api/indicators?tags=phish&limit=2&after_id={}'.format(values[0]))
+    assert request.status_code == 400
+
+    request = client.get('/api/indicators?limit=10')
+    response = gzip.decompress(request.data)
+    response = json.loads(response.decode('utf-8'))
+    assert len(response['items']) == 6
+    assert response['_meta']['next_after_id'] is None
+    assert response['_links']['next'] is None
+
+
+def test_read_streamed(app, client):
+    """ Ensure the streamed list matches the regular list """
+
+    app.config['INDICATOR_STREAM_BATCH_SIZE'] = 2
+    try:
+        for i in range(1, 6):
+            request, response = create_indicator(client, 'asdf', 'asdf{}'.format(i), 'analyst', tags=['phish'])
+            assert request.status_code == 201
+
+        request = client.get('/api/indicators?tags=phish')
+        assert request.status_code == 200
+        expected = gzip.decompress(request.data)
+
+        request = client.get('/api/indicators?tags=phish&stream=true')
+        assert request.status_code == 200
+        assert request.headers['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(request.data) == expected
+
+        request = client.get('/api/indicators?tags=asdf&stream=true')
+        response = gzip.decompress(request.data)
+        response = json.loads(response.decode('utf-8'))
+        assert response == []
+    finally:
+        app.config['INDICATOR_STREAM_BATCH_SIZE'] = 10000
+
+
+def test_read_value_substring(client):
+    """ Ensure substring searches find indicators through the trigram index """
+
+    request, response = create_indicator(client, 'URI - Domain Name', 'evil-domain.com', 'analyst')
+    assert request.status_code == 201
+    evil_id = response['id']
+
+    request, response = create_indicator(client, 'URI - Domain Name', 'good-domain.com', 'analyst')
+    assert request.status_code == 201
+
+    data = {'indicators': [{'type': 'URI - Domain Name', 'value': 'EVIL-DOMAIN.net', 'username': 'analyst'}]}
+    request = client.post('/api/indicators/bulk', json=data)
+    assert request.status_code == 204
+
+    def search(value):
+        request = client.get('/api/indicators?value={}'.format(value))
+        response = gzip.decompress(request.data)
+        response = json.loads(response.decode('utf-8'))
+        assert request.status_code == 200
+        return sorted(i['value'] for i in response)
+
+    assert search('evil-domain') == ['EVIL-DOMAIN.net', 'evil-domain.com']
+    assert search('-domain.c') == ['evil-domain.com', 'good-domain.com']
+    assert search('ev_l') == ['EVIL-DOMAIN.net', 'evil-domain.com']
+    assert search('ev') == ['EVIL-DOMAIN.net', 'evil-domain.com']
+    assert search('evil-domain.org') == []
+
+    request = client.delete('/api/indicators/{}'.format(evil_id))
+    assert request.status_code == 204
+    assert search('evil-domain') == ['EVIL-DOMAIN.net']
+
+
+def test_read_value_substring_accents(client):
+    """ Ensure the trigram index does not drop the accented values that the collation matches with LIKE """
+
+    # MySQL compares the values without accents, so the trigrams of both sides are folded the same way.
+    assert set(search_trigrams('cafe')) <= {x['trigram'] for x in trigram_rows(1, 'Le Café')}
+    assert set(search_trigrams('CAFÉ')) == set(search_trigrams('cafe'))
+
+    # Characters that do not fold to ASCII can still be equal to other text under the collation.
+    assert trigram_rows(1, 'straße') == [{'indicator_id': 1, 'trigram': UNFOLDED_TRIGRAM}]
+    assert search_trigrams('straße') == []
+
+    for value in ['Le Café', 'straße.de', 'strasse.de']:
+        request, response = create_indicator(client, 'URI - Domain Name', value, 'analyst')
+        assert request.status_code == 201
+
+    def search(value):
+        request = client.get('/api/indicators?value={}'.format(value))
+        response = json.loads(gzip.decompress(request.data).decode('utf-8'))
+        return sorted(i['value'] for i in response)
+
+    assert search('Café') == ['Le Café']
+    assert search('e.de') == ['strasse.de', 'straße.de']
+    assert search('straße') == ['straße.de']
+
+
+def test_read_full_text(client):
+    """ Ensure the full-text search parameters are validated and build a MATCH query """
+
+    request = client.get('/api/indicators?q=phish&q_mode=asdf')
+    response = json.loads(request.data.decode())
+    assert request.status_code == 400
+    assert response['msg'] == 'q_mode must be boolean or natural'
+
+    request = client.get('/api/indicators?q=phish&sort=asdf')
+    response = json.loads(request.data.decode())
+    assert request.status_code == 400
+    assert response['msg'] == 'sort must be id or relevance'
+
+    request = client.get('/api/indicators?sort=relevance')
+    response = json.loads(request.data.decode())
+    assert request.status_code == 400
+    assert response['msg'] == 'Sorting by relevance requires the q parameter'
+
+    request = client.get('/api/indicators?q=phish&sort=relevance&limit=10')
+    response = json.loads(request.data.decode())
+    assert request.status_code == 400
+    assert response['msg'] == 'Sorting by relevance cannot be used with the limit parameter'
+
+    # InnoDB does not add rows to a FULLTEXT index until they are committed, and the tests never commit,
+    # so check the SQL that would run instead of the results.
+    shape, params = parse_indicator_filters({'q': '+invoice -urgent', 'q_mode': 'boolean', 'tags': 'phish'})
+    statement = str(build_indicator_statement(shape, relevance=True).compile(dialect=mysql.dialect()))
+    assert 'WHERE MATCH (indicator.value) AGAINST (%s IN BOOLEAN MODE) AND tag.value = %s' in statement
+    assert 'ORDER BY MATCH (indicator.value) AGAINST (%s IN BOOLEAN MODE) DESC, indicator.id' in statement
+    assert params['q'] == '+invoice -urgent'
+
+
+def test_bitmap():
+    """ Ensure the compressed bitmaps give the same results as sets in both container layouts """
+
+    sparse = set(range(0, 200000, 37)) | {70000, 70001}
+    dense = set(range(60000, 140000)) | {5}
+    a = bitmap.Bitmap.from_ids(sparse)
+    b = bitmap.Bitmap.from_ids(dense)
+
+    assert list(a) == sorted(sparse)
+    assert len(a) == len(sparse)
+    assert list(a & b) == sorted(sparse & dense)
+    assert list(a | b) == sorted(sparse | dense)
+    assert list(a - b) == sorted(sparse - dense)
+    assert list(b - a) == sorted(dense - sparse)
+    assert list(b.after(100000)) == sorted(x for x in dense if x > 100000)
+    assert list(a.after(70000)) == sorted(x for x in sparse if x > 70000)
+    assert a.intersects(b)
+    assert not (b - a).intersects(a)
+    assert not bitmap.Bitmap.from_ids([])
+    assert list(bitmap.iter_bitmap_chunks(bitmap.Bitmap.from_ids([3, 1, 70000]), 2)) == [[1, 3], [70000]]
+
+    # Chunks with more than 4096 IDs use 8 KB each and the others 2 bytes per ID.
+    assert a.size() == 2 * len(sparse)
+    assert b.size() == 3 * 8192
+
+
+def test_read_bitmap_index(app, client):
+    """ Ensure the bitmap index returns the same indicators as the SQL tag and campaign filters """
+
+    create_campaign(client, 'LOLcats')
+    create_campaign(client, 'Derpsters')
+    for i in range(1, 7):
+        tags = ['phish', 'tag{}'.format(i % 2)] if i < 5 else []
+        campaigns = ['LOLcats'] if i % 3 else ['Derpsters']
+        request, response = create_indicator(client, 'asdf', 'asdf{}'.format(i), 'analyst', campaigns=campaigns,
+                                             tags=tags)
+        assert request.status_code == 201
+
+    urls = ['/api/indicators?tags=phish,tag1', '/api/indicators?tags=[OR]tag0,tag1', '/api/indicators?not_tags=tag1',
+            '/api/indicators?no_tags', '/api/indicators?campaigns=Derpsters', '/api/indicators?not_campaigns=LOLcats',
+            '/api/indicators?tags=phish&campaigns=LOLcats&value=asdf', '/api/indicators?tags=asdf',
+            '/api/indicators?tags=phish&limit=1&after_id=0', '/api/indicators?tags=phish&count',
+            '/api/indicators?tags=phish&value=asdf2&count', '/api/indicators?tags=phish&stream=true']
+
+    def read_all():
+        results = []
+        for url in urls:
+            request = client.get(url)
+            assert request.status_code == 200
+            data = request.data if 'count' in url else gzip.decompress(request.data)
+            results.append(json.loads(data.decode('utf-8')))
+        return results
+
+    expected = read_all()
+
+    app.config['INDICATOR_BITMAP_INDEX'] = True
+    app.config['INDICATOR_BITMAP_REFRESH_SECONDS'] = 0
+    try:
+        bitmap.bitmap_index = None
+        assert read_all() == expected
+
+        # Changing the tags of an indicator is picked up by the next refresh.
+        _id = expected[0][0]['id']
+        request = client.put('/api/indicators/{}'.format(_id), json={'tags': ['tag0']})
+        assert request.status_code == 200
+
+        request = client.get('/api/indicators?tags=phish,tag1')
+        response = json.loads(gzip.decompress(request.data).decode('utf-8'))
+        assert _id not in [i['id'] for i in response]
+
+        request = client.get('/api/indicators?tags=tag0&count')
+        response = json.loads(request.data.decode())
+        assert response['count'] == 3
+
+        request = client.get('/api/cache')
+        response = json.loads(request.data.decode())
+        assert response['bitmap_index']['indicators'] == 6
+
+        # Deleted indicators are found from their tombstones.
+        request = client.delete('/api/indicators/{}'.format(_id))
+        assert request.status_code == 204
+
+        request = client.get('/api/indicators?tags=tag0&count')
+        response = json.loads(request.data.decode())
+        assert response['count'] == 2
+
+        request = client.get('/api/cache')
+        response = json.loads(request.data.decode())
+        assert response['bitmap_index']['indicators'] == 5
+    finally:
+        app.config['INDICATOR_BITMAP_INDEX'] = False
+        app.config['INDICATOR_BITMAP_REFRESH_SECONDS'] = 60
+        bitmap.bitmap_index = None
+
+
+def test_read_count_tables(client):
+    """ Ensure the counts from the count tables match the indicator lists as indicators change """
+
+    create_campaign(client, 'LOLcats')
+    create_indicator_status(client, 'Analyzed')
+    request, response = create_indicator(client, 'IP', '1.1.1.1', 'analyst', campaigns=['LOLcats'], tags=['phish'])
+    assert request.status_code == 201
+    _id = response['id']
+    request, response = create_indicator(client, 'Email', 'asdf@asdf.com', 'analyst', tags=['phish', 'from_address'])
+    assert request.status_code == 201
+
+    data = {'indicators': [{'type': 'IP', 'value': '2.2.2.2', 'username': 'analyst', 'tags': ['phish']},
+                           {'type': 'Email', 'value': 'abcd@abcd.com', 'username': 'analyst', 'campaigns': ['LOLcats'],
+                            'status': 'Analyzed'}]}
+    request = client.post('/api/indicators/bulk', json=data)
+    assert request.status_code == 204
+
+    filters = ['', 'type=IP', 'types=IP,Email', 'status=New', 'status=Analyzed&type=Email', 'confidence=LOW',
+               'impact=LOW&type=IP', 'tags=phish', 'tags=from_address', 'campaigns=LOLcats', 'tags=asdf']
+
+    def check_counts():
+        for f in filters:
+            request = client.get('/api/indicators?{}&count'.format(f))
+            count = json.loads(request.data.decode())['count']
+            request = client.get('/api/indicators?{}'.format(f))
+            response = json.loads(gzip.decompress(request.data).decode('utf-8'))
+            assert count == len(response), f
+
+    check_counts()
+
+    request = client.put('/api/indicators/{}'.format(_id), json={'status': 'Analyzed', 'tags': ['from_address']})
+    assert request.status_code == 200
+    check_counts()
+
+    request = client.delete('/api/indicators/{}'.format(_id))
+    assert request.status_code == 204
+    check_counts()
+
+    request = client.get('/api/indicators?tags=from_address&count')
+    assert json.loads(request.data.decode())['count'] == 1
+
+
+def test_read_facets(app, client):
+    """ Ensure the facets count the values of the indicators that match the filters """
+
+    create_campaign(client, 'LOLcats')
+    request, response = create_indicator(client, 'IP', '1.1.1.1', 'analyst', campaigns=['LOLcats'], tags=['phish'],
+                                         intel_reference='http://blahblah.com', intel_source='OSINT')
+    assert request.status_code == 201
+    request, response = create_indicator(client, 'Email', 'asdf@asdf.com', 'analyst', impact='HIGH',
+                                         tags=['phish', 'from_address'])
+    assert request.status_code == 201
+    request, response = create_indicator(client, 'Email', 'abcd@abcd.com', 'analyst')
+    assert request.status_code == 201
+
+    request = client.get('/api/indicators/facets?tags=phish')
+    response = json.loads(request.data.decode())
+    assert request.status_code == 200
+    assert response['count'] == 2
+    assert response['facets'] == {'campaigns': {'LOLcats': 1},
+                                  'confidence': {'LOW': 2},
+                                  'impact': {'HIGH': 1, 'LOW': 1},
+                                  'sources': {'OSINT': 1},
+                                  'status': {'New': 2},
+                                  'tags': {'from_address': 1, 'phish': 2},
+                                  'types': {'Email': 1, 'IP': 1}}
+
+    request = client.get('/api/indicators/facets?types=Email&no_tags')
+    response = json.loads(request.data.decode())
+    assert response['count'] == 1
+    assert response['facets']['types'] == {'Email': 1}
+    assert response['facets']['tags'] == {}
+
+    # The temporary table is dropped after each request, and the bitmap index gives the same facets.
+    app.config['INDICATOR_BITMAP_INDEX'] = True
+    try:
+        bitmap.bitmap_index = None
+        request = client.get('/api/indicators/facets?types=Email&no_tags')
+        assert json.loads(request.data.decode()) == response
+    finally:
+        app.config['INDICATOR_BITMAP_INDEX'] = False
+        bitmap.bitmap_index = None
+
+    request = client.get('/api/indicators/facets?q=asdf&q_mode=asdf')
+    response = json.loads(request.data.decode())
+    assert request.status_code == 400
+    assert response['msg'] == 'q_mode must be boolean or natural'
+
+
+def test_read_result_cache(app, client, tmpdir):
+    """ Ensure repeated reads are served from the result cache until something is written """
+
+    app.config['INDICATOR_RESULT_CACHE_SIZE'] = 1024 * 1024
+    app.config['INDICATOR_RESULT_CACHE_DIR'] = str(tmpdir)
+    try:
+        cache.result_cache = None
+
+        request, response = create_indicator(client, 'IP', '1.1.1.1', 'analyst', tags=['phish'])
+        assert request.status_code == 201
+
+        def read(url):
+            request = client.get(url)
+            assert request.status_code == 200
+            data = request.data if 'count' in url else gzip.decompress(request.data)
+            return json.loads(data.decode('utf-8'))
+
+        assert len(read('/api/indicators?tags=phish')) == 1
+        assert read('/api/indicators?tags=phish&count')['count'] == 1
+        assert cache.result_cache.misses == 2
+        assert len(read('/api/indicators?tags=phish&stream=true')) == 1
+        assert read('/api/indicators?tags=phish&count')['count'] == 1
+        assert cache.result_cache.hits == 2
+
+        # Another worker with an empty memory cache reads the responses from the shared directory.
+        cache.result_cache = None
+        assert read('/api/indicators?tags=phish&count')['count'] == 1
+        assert cache.result_cache.disk_hits == 1
+
+        # Any write starts a new generation.
+        request, response = create_indicator(client, 'IP', '2.2.2.2', 'analyst', tags=['phish'])
+        assert request.status_code == 201
+        assert len(read('/api/indicators?tags=phish')) == 2
+        assert read('/api/indicators?tags=phish&count')['count'] == 2
+        assert cache.result_cache.misses == 2
+    finally:
+        app.config['INDICATOR_RESULT_CACHE_SIZE'] = 0
+        app.config['INDICATOR_RESULT_CACHE_DIR'] = None
+        cache.result_cache = None
+
+
+def test_read_facets_chunked(app, client):
+    """ Ensure the facets count every matching indicator when the IDs take several chunks """
+
+    for i in range(5):
+        request, response = create_indicator(client, 'IP', '{0}.{0}.{0}.{0}'.format(i + 1), 'analyst',
+                                             tags=['phish'] if i % 2 else [])
+        assert request.status_code == 201
+
+    urls = ['/api/indicators/facets', '/api/indicators/facets?no_tags', '/api/indicators/facets?no_tags&type=IP']
+    app.config['INDICATOR_BITMAP_CHUNK_SIZE'] = 2
+    try:
+        expected = [json.loads(client.get(url).data.decode()) for url in urls]
+        assert [x['count'] for x in expected] == [5, 3, 3]
+        assert expected[0]['facets']['tags'] == {'phish': 2}
+
+        app.config['INDICATOR_BITMAP_INDEX'] = True
+        bitmap.bitmap_index = None
+        assert [json.loads(client.get(url).data.decode()) for url in urls] == expected
+    finally:
+        app.config['INDICATOR_BITMAP_CHUNK_SIZE'] = 1000
+        app.config['INDICATOR_BITMAP_INDEX'] = False
+        bitmap.bitmap_index = None
+
+
+def test_read_changes(client):
+    """ Ensure the change feed returns the created, updated and deleted indicators after the cursor """
+
+    request = client.get('/api/indicators/changes?since=asdf')
+    response = json.loads(request.data.decode())
+    assert request.status_code == 400
+    assert response['msg'] == 'since must be a cursor from a previous response'
+
+    request = client.get('/api/indicators/changes?limit=0')
+    response = json.loads(request.data.decode())
+    assert request.status_code == 400
+    assert response['msg'] == 'limit must be a positive integer'
+
+    request, response = create_indicator(client, 'IP', '1.1.1.1', 'analyst')
+    assert request.status_code == 201
+    id1 = response['id']
+    request, response = create_indicator(client, 'IP', '2.2.2.2', 'analyst')
+    assert request.status_code == 201
+    id2 = response['id']
+
+    request = client.get('/api/indicators/changes?limit=1')
+    response = json.loads(request.data.decode())
+    assert request.status_code == 200
+    assert [(x['change'], x['id']) for x in response['items']] == [('created', id1)]
+    assert response['items'][0]['indicator']['value'] == '1.1.1.1'
+
+    request = client.get(response['_links']['next'])
+    response = json.loads(request.data.decode())
+    assert [(x['change'], x['id']) for x in response['items']] == [('created', id2)]
+    assert response['_links']['next'] is None
+    since = response['_meta']['next_since']
+
+    # Nothing has changed since the cursor, so it is returned as is.
+    request = client.get('/api/indicators/changes?since={}'.format(since))
+    response = json.loads(request.data.decode())
+    assert response['items'] == []
+    assert response['_meta']['next_since'] == since
+
+    request = client.post('/api/tags', json={'value': 'phish'})
+    assert request.status_code == 201
+    request = client.put('/api/indicators/{}'.format(id1), json={'tags': ['phish']})
+    assert request.status_code == 200
+    request = client.delete('/api/indicators/{}'.format(id2))
+    assert request.status_code == 204
+    request, response = create_indicator(client, 'IP', '3.3.3.3', 'analyst')
+    assert request.status_code == 201
+    id3 = response['id']
+
+    request = client.get('/api/indicators/changes?since={}'.format(since))
+    response = json.loads(request.data.decode())
+    assert [(x['change'], x['id']) for x in response['items']] == [('updated', id1), ('deleted', id2),
+                                                                  ('created', id3)]
+    assert response['items'][0]['indicator']['tags'] == ['phish']
+    assert response['items'][1]['indicator'] is None
+
+
+def test_read_changes_query_count(client):
+    """ Ensure the number of queries of the change feed does not grow with the number of changed indicators """
+
+    create_campaign(client, 'LOLcats')
+
+    def create(value):
+        request, response = create_indicator(client, 'IP', value, 'analyst', campaigns=['LOLcats'],
+                                             tags=['phish', value], intel_reference='http://{}.com'.format(value),
+                                             intel_source='OSINT')
+        assert request.status_code == 201
+
+    create('1.1.1.1')
+    with count_queries() as one_indicator:
+        request = client.get('/api/indicators/changes')
+    assert len(json.loads(request.data.decode())['items']) == 1
+
+    for i in range(2, 6):
+        create('{0}.{0}.{0}.{0}'.format(i))
+    with count_queries() as five_indicators:
+        request = client.get('/api/indicators/changes')
+    response = json.loads(request.data.decode())
+    assert request.status_code == 200
+    assert len(response['items']) == 5
+    assert all(x['indicator']['references'] for x in response['items'])
+    assert five_indicators.count == one_indicator.count
+
+
+def test_read_changes_relationships(client):
+    """ Ensure the change feed returns every indicator whose equal group or hierarchy changed """
+
+    ids = []
+    for i in range(5):
+        request, response = create_indicator(client, 'IP', '{0}.{0}.{0}.{0}'.format(i + 1), 'analyst')
+        assert request.status_code == 201
+        ids.append(response['id'])
+    assert client.post('/api/indicators/{}/{}/equal'.format(ids[0], ids[1])).status_code == 204
+    assert client.post('/api/indicators/{}/{}/equal'.format(ids[2], ids[3])).status_code == 204
+
+    def changed_since(since):
+        request = client.get('/api/indicators/changes?since={}'.format(since))
+        response = json.loads(request.data.decode())
+        return sorted(x['id'] for x in response['items']), response['_meta']['next_since']
+
+    ignored, since = changed_since('')
+    assert client.post('/api/indicators/{}/{}/equal'.format(ids[1], ids[2])).status_code == 204
+    changed, since = changed_since(since)
+    assert changed == ids[:4]
+
+    assert client.post('/api/indicators/{}/{}/relationship'.format(ids[0], ids[4])).status_code == 204
+    ignored, since = changed_since(since)
+    assert client.post('/api/indicators/{}/{}/relationship'.format(ids[4], ids[3])).status_code == 204
+    changed, since = changed_since(since)
+    assert changed == [ids[0], ids[3], ids[4]]
+
+
+def test_read_bloom(client):
+    """ Ensure the Bloom filter contains the lowercase values of the matching indicators """
+
+    for rate in ['asdf', '0', '1', '0.0000000001', 'nan']:
+        request = client.get('/api/indicators/bloom?false_positive_rate={}'.format(rate))
+        response = json.loads(request.data.decode())
+        assert request.status_code == 400
+        assert response['msg'] == 'false_positive_rate must be at least 1e-06 and less than 1'
+
+    request = client.get('/api/indicators/bloom')
+    assert request.status_code == 200
+    assert BloomFilter(request.data).count == 0
+
+    values = ['{}.evil.com'.format(i) for i in range(200)]
+    for value in values:
+        request, response = create_indicator(client, 'URI - Domain Name', value, 'analyst', status='Analyzed')
+        assert request.status_code == 201
+    request, response = create_indicator(client, 'IP', '1.1.1.1', 'analyst', status='Analyzed')
+    assert request.status_code == 201
+    request, response = create_indicator(client, 'URI - Domain Name', 'new.evil.com', 'analyst')
+    assert request.status_code == 201
+
+    request = client.get('/api/indicators/bloom?status=Analyzed&type=URI - Domain Name&false_positive_rate=0.01')
+    assert request.status_code == 200
+    assert request.headers['Content-Type'] == 'application/octet-stream'
+    bloom = BloomFilter(request.data)
+    assert bloom.count == 200
+    assert all(value.upper() in bloom for value in values)
+    assert '1.1.1.1' not in bloom and 'new.evil.com' not in bloom
+    assert sum('{}.good.com'.format(i) in bloom for i in range(1000)) < 50
+
+    request = client.get('/api/indicators/bloom?types=IP,URI - Domain Name')
+    bloom = BloomFilter(request.data)
+    assert bloom.count == 202
+    assert '1.1.1.1' in bloom and 'new.evil.com' in bloom
+
+
+def test_lookup(app, client):
+    """ Ensure the lookup finds the indicators of the values with the right types and case """
+
+    request = client.post('/api/indicators/lookup', json={'values': []})
+    response = json.loads(request.data.decode())
+    assert request.status_code == 400
+    assert 'Request JSON does not match schema' in response['msg']
+
+    app.config['INDICATOR_LOOKUP_MAX_VALUES'] = 2
+    try:
+        # The number of values is checked before the values themselves.
+        request = client.post('/api/indicators/lookup', json={'values': ['a', 'b', 3]})
+        response = json.loads(request.data.decode())
+        assert request.status_code == 400
+        assert response['msg'] == 'Cannot look up more than 2 values at once'
+    finally:
+        app.config['INDICATOR_LOOKUP_MAX_VALUES'] = 100000
+
+    request = client.post('/api/tags', json={'value': 'phish'})
+    assert request.status_code == 201
+    request, response = create_indicator(client, 'Email - Address', 'badguy@evil.com', 'analyst', tags=['phish'])
+    assert request.status_code == 201
+    email_id = response['id']
+    request, response = create_indicator(client, 'URI - Domain Name', 'badguy@evil.com', 'analyst')
+    assert request.status_code == 201
+    domain_id = response['id']
+    request, response = create_indicator(client, 'URI - Path', '/Evil.php', 'analyst', case_sensitive=True,
+                                         status='Analyzed')
+    assert request.status_code == 201
+    path_id = response['id']
+
+    # Use small chunks to make sure the values are split across queries.
+    app.config['BULK_QUERY_CHUNK_SIZE'] = 1
+    try:
+        request = client.post('/api/indicators/lookup', json={'values': [
+            'BadGuy@evil.com', {'type': 'Email - Address', 'value': 'BADGUY@EVIL.COM'}, '/evil.php', '/Evil.php',
+            {'type': 'asdf', 'value': 'badguy@evil.com'}, 'goodguy@example.com']})
+    finally:
+        app.config['BULK_QUERY_CHUNK_SIZE'] = 1000
+    response = json.loads(request.data.decode())
+    assert request.status_code == 200
+    assert [x['id'] for x in response] == [email_id, domain_id, path_id]
+    assert response[0]['matched'] == ['BADGUY@EVIL.COM', 'BadGuy@evil.com']
+    assert response[0]['tags'] == ['phish']
+    assert response[1]['matched'] == ['BadGuy@evil.com']
+    assert response[2]['matched'] == ['/Evil.php']
+    assert response[2]['status'] == 'Analyzed'
+
+    request = client.post('/api/indicators/lookup', json={'values': [{'type': 'URI - Path', 'value': '/EVIL.PHP'}]})
+    assert json.loads(request.data.decode()) == []
+
+
+def test_read_by_ip(client):
+    """ Ensure the IPv4 address lookup returns the exact addresses and the CIDR blocks that contain it """
+
+    for addr in ['asdf', '10.1.2', '10.1.2.256', '::1']:
+        request = client.get('/api/indicators/ip/{}'.format(addr))
+        response = json.loads(request.data.decode())
+        assert request.status_code == 400
+        assert response['msg'] == 'Invalid IPv4 address'
+
+    ids = {}
+    for value in ['10.0.0.0/8', '10.1.2.0/24', '10.1.2.3', '10.1.2.4', '10.1.2.7/30', '11.0.0.0/8', '0.0.0.0/0',
+                  '10.1.2.3.evil.com']:
+        request, response = create_indicator(client, 'Address - ipv4-addr', value, 'analyst')
+        assert request.status_code == 201
+        ids[value] = response['id']
+
+    # The bulk route writes the indicators without the ORM.
+    data = {'indicators': [{'type': 'Address - ipv4-addr', 'value': '10.1.0.0/16', 'username': 'analyst',
+                            'confidence': 'LOW', 'impact': 'LOW', 'status': 'New'}]}
+    request = client.post('/api/indicators/bulk', json=data)
+    assert request.status_code == 204
+
+    request = client.get('/api/indicators/ip/10.1.2.3')
+    response = json.loads(request.data.decode())
+    assert request.status_code == 200
+    assert [x['id'] for x in response['exact']] == [ids['10.1.2.3']]
+    assert [x['value'] for x in response['ranges']] == ['10.1.2.0/24', '10.1.0.0/16', '10.0.0.0/8', '0.0.0.0/0']
+
+    request = client.get('/api/indicators/ip/10.1.2.5')
+    response = json.loads(request.data.decode())
+    assert response['exact'] == []
+    assert [x['value'] for x in response['ranges']] == ['10.1.2.7/30', '10.1.2.0/24', '10.1.0.0/16', '10.0.0.0/8',
+                                                        '0.0.0.0/0']
+
+
+def test_read_etag(client):
+    """ Ensure unchanged reads return 304 Not Modified until something is written """
+
+    request, response = create_indicator(client, 'IP', '1.1.1.1', 'analyst')
+    assert request.status_code == 201
+    _id = response['id']
+
+    for url in ['/api/indicators?type=IP', '/api/indicators?type=IP&count', '/api/indicators/{}'.format(_id)]:
+        request = client.get(url)
+        assert request.status_code == 200
+        etag = request.headers['ETag']
+
+        request = client.get(url, headers={'If-None-Match': etag})
+        assert request.status_code == 304
+        assert request.headers['ETag'] == etag
+        assert not request.data
+
+    request = client.get('/api/indicators?type=IP')
+    etag = request.headers['ETag']
+    assert client.get('/api/indicators?type=IP&stream=true', headers={'If-None-Match': etag}).status_code == 304
+    assert client.get('/api/indicators?type=asdf', headers={'If-None-Match': etag}).status_code == 200
+
+    # Any write starts a new generation.
+    request, response = create_indicator(client, 'IP', '2.2.2.2', 'analyst')
+    assert request.status_code == 201
+    request = client.get('/api/indicators?type=IP', headers={'If-None-Match': etag})
+    assert request.status_code == 200
+    assert request.headers['ETag'] != etag
+    assert len(json.loads(gzip.decompress(request.data).decode('utf-8'))) == 2
+
+
 def test_read_by_id(client):
     """ Ensure indicators can be read by their ID """
 
@@ -197,3 +197,57 @@ def test_delete(client):
     response = json.loads(request.data.decode())
     assert request.status_code == 404
     assert response['msg'] == 'Relationship does not exist or the indicators are not directly equal'
+
+
+def test_delete_splits_group(client):
+    """ Ensure removing a link splits the indirectly equal indicators into separate groups """
+
+    ids = []
+    for value in ['asdf', 'asdf2', 'asdf3', 'asdf4']:
+        request, response = create_indicator(client, 'asdf', value, 'analyst')
+        assert request.status_code == 201
+        ids.append(response['id'])
+
+    # Link the indicators in a chain: 1 = 2 = 3 = 4
+    for a, b in zip(ids, ids[1:]):
+        request = client.post('/api/indicators/{}/{}/equal'.format(a, b))
+        assert request.status_code == 204
+
+    request = client.get('/api/indicators/{}'.format(ids[3]))
+    response = json.loads(request.data.decode())
+    assert response['equal'] == [ids[2]]
+    assert response['all_equal'] == ids[:3]
+
+    # Break the chain in the middle: 1 = 2 and 3 = 4
+    request = client.delete('/api/indicators/{}/{}/equal'.format(ids[1], ids[2]))
+    assert request.status_code == 204
+
+    request = client.get('/api/indicators/{}'.format(ids[0]))
+    response = json.loads(request.data.decode())
+    assert response['all_equal'] == [ids[1]]
+
+    request = client.get('/api/indicators/{}'.format(ids[3]))
+    response = json.loads(request.data.decode())
+    assert response['all_equal'] == [ids[2]]
+
+    # The split groups can be joined again.
+    request = client.post('/api/indicators/{}/{}/equal'.format(ids[0], ids[3]))
+    assert request.status_code == 204
+
+    request = client.get('/api/indicators/{}'.format(ids[2]))
+    response = json.loads(request.data.decode())
+    assert response['all_equal'] == [ids[0], ids[1], ids[3]]
+
+    # Deleting an indicator removes it from its group.
+    request = client.delete('/api/indicators/{}'.format(ids[0]))
+    assert request.status_code == 204
+
+    request = client.get('/api/indicators/{}'.format(ids[2]))
+    response = json.loads(request.data.decode())
+    assert response['all_equal'] == [ids[3]]
+
+    # The error rolls back the test transaction, so it is checked last.
+    request = client.post('/api/indicators/{}/{}/equal'.format(ids[2], ids[3]))
+    response = json.loads(request.data.decode())
+    assert request.status_code == 409
+    assert response['msg'] == 'The indicators are already directly or indirectly equal'
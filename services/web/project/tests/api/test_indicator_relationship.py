@@ -51,6 +51,28 @@ def test_create_duplicate(client):
     assert response['msg'] == 'Child indicator already has a parent'
 
 
+def test_create_loop(client):
+    """ Ensure an indicator cannot become the child of one of its own descendants """
+
+    indicator1_request, indicator1_response = create_indicator(client, 'asdf', 'asdf', 'analyst')
+    indicator2_request, indicator2_response = create_indicator(client, 'asdf', 'asdf2', 'analyst')
+    indicator3_request, indicator3_response = create_indicator(client, 'asdf', 'asdf3', 'analyst')
+    assert indicator1_request.status_code == 201
+    assert indicator2_request.status_code == 201
+    assert indicator3_request.status_code == 201
+
+    request = client.post('/api/indicators/{}/{}/relationship'.format(indicator1_response['id'], indicator2_response['id']))
+    assert request.status_code == 204
+
+    request = client.post('/api/indicators/{}/{}/relationship'.format(indicator2_response['id'], indicator3_response['id']))
+    assert request.status_code == 204
+
+    request = client.post('/api/indicators/{}/{}/relationship'.format(indicator3_response['id'], indicator1_response['id']))
+    response = json.loads(request.data.decode())
+    assert request.status_code == 400
+    assert response['msg'] == 'Child indicator is an ancestor of the parent indicator'
+
+
 def test_create_missing_api_key(app, client):
     """ Ensure an API key is given if the config requires it """
 
@@ -197,3 +219,60 @@ def test_delete(client):
     response = json.loads(request.data.decode())
     assert request.status_code == 404
     assert response['msg'] == 'Relationship does not exist'
+
+
+def test_delete_grandchildren(client):
+    """ Ensure removing a relationship removes the whole subtree from the ancestors """
+
+    indicator1_request, indicator1_response = create_indicator(client, 'asdf', 'asdf', 'analyst')
+    indicator2_request, indicator2_response = create_indicator(client, 'asdf', 'asdf2', 'analyst')
+    indicator3_request, indicator3_response = create_indicator(client, 'asdf', 'asdf3', 'analyst')
+    indicator4_request, indicator4_response = create_indicator(client, 'asdf', 'asdf4', 'analyst')
+    id1 = indicator1_response['id']
+    id2 = indicator2_response['id']
+    id3 = indicator3_response['id']
+    id4 = indicator4_response['id']
+
+    # Build the tree from the bottom up so existing subtrees get attached to new ancestors.
+    request = client.post('/api/indicators/{}/{}/relationship'.format(id3, id4))
+    assert request.status_code == 204
+    request = client.post('/api/indicators/{}/{}/relationship'.format(id2, id3))
+    assert request.status_code == 204
+    request = client.post('/api/indicators/{}/{}/relationship'.format(id1, id2))
+    assert request.status_code == 204
+
+    request = client.get('/api/indicators/{}'.format(id1))
+    response = json.loads(request.data.decode())
+    assert response['children'] == [id2]
+    assert response['all_children'] == [id2, id3, id4]
+
+    request = client.get('/api/indicators/{}'.format(id4))
+    response = json.loads(request.data.decode())
+    assert response['parent'] == id3
+
+    request = client.delete('/api/indicators/{}/{}/relationship'.format(id2, id3))
+    assert request.status_code == 204
+
+    request = client.get('/api/indicators/{}'.format(id1))
+    response = json.loads(request.data.decode())
+    assert response['all_children'] == [id2]
+
+    request = client.get('/api/indicators/{}'.format(id3))
+    response = json.loads(request.data.decode())
+    assert response['parent'] is None
+    assert response['all_children'] == [id4]
+
+    # Deleting an indicator in the middle of the tree detaches its children.
+    request = client.post('/api/indicators/{}/{}/relationship'.format(id2, id3))
+    assert request.status_code == 204
+    request = client.delete('/api/indicators/{}'.format(id2))
+    assert request.status_code == 204
+
+    request = client.get('/api/indicators/{}'.format(id1))
+    response = json.loads(request.data.decode())
+    assert response['all_children'] == []
+
+    request = client.get('/api/indicators/{}'.format(id3))
+    response = json.loads(request.data.decode())
+    assert response['parent'] is None
+    assert response['all_children'] == [id4]
@@ -340,6 +340,25 @@ def test_read_all_values(client):
     assert len(response) == 3
 
 
+def test_read_full_text(client):
+    """ Ensure the full-text search parameters are validated """
+
+    request = client.get('/api/intel/reference?q=malware&q_mode=asdf')
+    response = json.loads(request.data.decode())
+    assert request.status_code == 400
+    assert response['msg'] == 'q_mode must be boolean or natural'
+
+    request = client.get('/api/intel/reference?q=malware&sort=asdf')
+    response = json.loads(request.data.decode())
+    assert request.status_code == 400
+    assert response['msg'] == 'sort must be id or relevance'
+
+    request = client.get('/api/intel/reference?sort=relevance')
+    response = json.loads(request.data.decode())
+    assert request.status_code == 400
+    assert response['msg'] == 'Sorting by relevance requires the q parameter'
+
+
 def test_read_by_id(client):
     """ Ensure names can be read by their ID """
 
@@ -383,6 +402,39 @@ def test_read_indicators(client):
     assert response['items'][0]['value'] == '127.0.0.1'
 
 
+def test_read_indicators_query_count(client):
+    """ Ensure the number of queries does not grow with the number of indicators """
+
+    create_intel_source(client, 'OSINT')
+    intel_reference_request, intel_reference_response = create_intel_reference(client, 'analyst', 'OSINT', 'http://blahblah.com')
+    assert intel_reference_request.status_code == 201
+    url = '/api/intel/reference/{}/indicators'.format(intel_reference_response['id'])
+
+    request, response = create_indicator(client, 'IP', '127.0.0.1', 'analyst', campaigns=['LOLcats'], tags=['phish'],
+                                         intel_reference='http://blahblah.com', intel_source='OSINT')
+    assert request.status_code == 201
+
+    with count_queries() as one_indicator:
+        request = client.get(url)
+    assert request.status_code == 200
+
+    for i in range(2, 6):
+        request, response = create_indicator(client, 'IP', '127.0.0.{}'.format(i), 'analyst', campaigns=['Derpsters{}'.format(i)],
+                                             tags=['phish', 'tag{}'.format(i)], intel_reference='http://blahblah.com',
+                                             intel_source='OSINT')
+        assert request.status_code == 201
+
+    with count_queries() as five_indicators:
+        request = client.get(url)
+    response = json.loads(request.data.decode())
+    assert request.status_code == 200
+    assert len(response['items']) == 5
+    assert response['items'][4]['campaigns'][0]['name'] == 'Derpsters5'
+    assert response['items'][4]['tags'] == ['phish', 'tag5']
+    assert response['items'][4]['references'][0]['source'] == 'OSINT'
+    assert five_indicators.count == one_indicator.count
+
+
 """
 UPDATE TESTS
 """
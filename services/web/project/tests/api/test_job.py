@@ -0,0 +1,128 @@
+import datetime
+import gzip
+
+from project.models import Job
+from project.tests.conftest import TEST_ANALYST_APIKEY, TEST_INACTIVE_APIKEY, TEST_INVALID_APIKEY
+from project.tests.helpers import *
+
+
+"""
+READ TESTS
+"""
+
+
+def test_read_nonexistent_id(client):
+    """ Ensure a nonexistent ID does not work """
+
+    request = client.get('/api/jobs/100000')
+    response = json.loads(request.data.decode())
+    assert request.status_code == 404
+    assert response['msg'] == 'Job ID not found'
+
+
+def test_read_missing_api_key(app, client):
+    """ Ensure an API key is given if the config requires it """
+
+    app.config['GET'] = 'analyst'
+
+    request = client.get('/api/jobs/1')
+    response = json.loads(request.data.decode())
+    assert request.status_code == 401
+    assert response['msg'] == 'Bad or missing API key'
+
+
+def test_read_invalid_api_key(app, client):
+    """ Ensure an API key not found in the database does not work """
+
+    app.config['GET'] = 'analyst'
+
+    headers = {'Authorization': 'Apikey ' + TEST_INVALID_APIKEY}
+    request = client.get('/api/jobs/1', headers=headers)
+    response = json.loads(request.data.decode())
+    assert request.status_code == 401
+    assert response['msg'] == 'API user does not exist'
+
+
+def test_read_inactive_api_key(app, client):
+    """ Ensure an inactive API key does not work """
+
+    app.config['GET'] = 'analyst'
+
+    headers = {'Authorization': 'Apikey ' + TEST_INACTIVE_APIKEY}
+    request = client.get('/api/jobs/1', headers=headers)
+    response = json.loads(request.data.decode())
+    assert request.status_code == 401
+    assert response['msg'] == 'API user is not active'
+
+
+def test_read_invalid_role(app, client):
+    """ Ensure the given API key has the proper role access """
+
+    app.config['GET'] = 'user_does_not_have_this_role'
+
+    headers = {'Authorization': 'Apikey ' + TEST_ANALYST_APIKEY}
+    request = client.get('/api/jobs/1', headers=headers)
+    response = json.loads(request.data.decode())
+    assert request.status_code == 401
+    assert response['msg'] == 'Insufficient privileges'
+
+
+def test_read_by_id(client):
+    """ Ensure an async bulk request creates a job that reports its progress """
+
+    request, response = create_indicator(client, 'asdf', 'asdf', 'analyst')
+    assert request.status_code == 201
+
+    data = {'indicators': [
+        {'type': 'asdf', 'value': 'asdf', 'username': 'analyst'},
+        {'type': 'asdf', 'value': 'asdf2', 'username': 'analyst'},
+        {'type': 'asdf', 'value': 'asdf3', 'username': 'this_user_does_not_exist'},
+        {'type': 'asdf', 'value': 'asdf4', 'username': 'analyst'}
+    ]}
+
+    request = client.post('/api/indicators/bulk?async=1', json=data)
+    response = json.loads(request.data.decode())
+    assert request.status_code == 202
+    assert response['total'] == 4
+
+    request = client.get(request.headers['Location'])
+    response = json.loads(request.data.decode())
+    assert request.status_code == 200
+    assert response['status'] == 'finished'
+    assert response['created'] == 2
+    assert response['skipped'] == 1
+    assert response['failed'] == 1
+    assert response['processed'] == 4
+    assert response['errors'] == [{'index': 2, 'msg': 'User not found by username'}]
+
+
+def test_read_stale(app, client):
+    """ Ensure a job left unfinished by a restarted worker is resumed when it is read """
+
+    request, response = create_indicator(client, 'asdf', 'asdf', 'analyst')
+    assert request.status_code == 201
+
+    items = [{'type': 'asdf', 'value': 'asdf{}'.format(i), 'username': 'analyst'} for i in range(1, 4)]
+    job = Job(payload=gzip.compress(json.dumps(items).encode('utf-8')), status='running', total=3, created=1,
+              errors='[]')
+    db.session.add(job)
+    db.session.commit()
+
+    # The job is not stale yet.
+    request = client.get('/api/jobs/{}'.format(job.id))
+    response = json.loads(request.data.decode())
+    assert response['status'] == 'running'
+
+    # The first item was already created before the worker stopped, so the job picks up after it.
+    job.modified_time = datetime.datetime.utcnow() - datetime.timedelta(seconds=app.config['BULK_JOB_STALE_SECONDS'])
+    db.session.commit()
+
+    request = client.get('/api/jobs/{}'.format(job.id))
+    response = json.loads(request.data.decode())
+    assert request.status_code == 200
+    assert response['status'] == 'finished'
+    assert response['created'] == 3
+    assert response['processed'] == 3
+
+    request = client.get('/api/indicators?value=asdf1')
+    assert json.loads(gzip.decompress(request.data).decode('utf-8')) == []
@@ -0,0 +1,118 @@
+from project.api.matcher import AhoCorasick
+from project.tests.conftest import TEST_ANALYST_APIKEY, TEST_INACTIVE_APIKEY, TEST_INVALID_APIKEY
+from project.tests.helpers import *
+
+
+"""
+CREATE TESTS
+"""
+
+
+def test_automaton():
+    """ Ensure the automaton finds overlapping and nested patterns """
+
+    automaton = AhoCorasick({'he': 1, 'she': 2, 'his': 3, 'hers': 4, 'sheriff': 5})
+    assert sorted(automaton.find('ushers')) == [1, 2, 4]
+    assert sorted(automaton.find('his sheriff')) == [1, 2, 3, 5]
+    assert automaton.find('xyz') == []
+    assert AhoCorasick({}).find('he') == []
+
+
+def test_create_missing_api_key(app, client):
+    """ Ensure an API key is given if the config requires it """
+
+    app.config['POST'] = 'analyst'
+
+    request = client.post('/api/match', data='asdf')
+    response = json.loads(request.data.decode())
+    assert request.status_code == 401
+    assert response['msg'] == 'Bad or missing API key'
+
+
+def test_create_invalid_api_key(app, client):
+    """ Ensure an API key not found in the database does not work """
+
+    app.config['POST'] = 'analyst'
+
+    headers = {'Authorization': 'Apikey ' + TEST_INVALID_APIKEY}
+    request = client.post('/api/match', data='asdf', headers=headers)
+    response = json.loads(request.data.decode())
+    assert request.status_code == 401
+    assert response['msg'] == 'API user does not exist'
+
+
+def test_create_inactive_api_key(app, client):
+    """ Ensure an inactive API key does not work """
+
+    app.config['POST'] = 'analyst'
+
+    headers = {'Authorization': 'Apikey ' + TEST_INACTIVE_APIKEY}
+    request = client.post('/api/match', data='asdf', headers=headers)
+    response = json.loads(request.data.decode())
+    assert request.status_code == 401
+    assert response['msg'] == 'API user is not active'
+
+
+def test_create_invalid_role(app, client):
+    """ Ensure the given API key has the proper role access """
+
+    app.config['POST'] = 'user_does_not_have_this_role'
+
+    headers = {'Authorization': 'Apikey ' + TEST_ANALYST_APIKEY}
+    request = client.post('/api/match', data='asdf', headers=headers)
+    response = json.loads(request.data.decode())
+    assert request.status_code == 401
+    assert response['msg'] == 'Insufficient privileges'
+
+
+def test_create_too_large(app, client):
+    """ Ensure bodies over the maximum length do not work """
+
+    app.config['INDICATOR_MATCH_MAX_LENGTH'] = 4
+    try:
+        request = client.post('/api/match', data='asdfasdf')
+        response = json.loads(request.data.decode())
+        assert request.status_code == 413
+        assert response['msg'] == 'Request body is too large'
+    finally:
+        app.config['INDICATOR_MATCH_MAX_LENGTH'] = 10 * 1024 * 1024
+
+
+def test_create(client):
+    """ Ensure the matching substring indicators are returned and the matcher is rebuilt after writes """
+
+    request, response = create_indicator(client, 'Email - Subject', 'Account Suspended', 'analyst', status='Analyzed',
+                                         substring=True)
+    assert request.status_code == 201
+    insensitive_id = response['id']
+    request, response = create_indicator(client, 'URI - Path', '/Login.php', 'analyst', case_sensitive=True,
+                                         status='Analyzed', substring=True)
+    assert request.status_code == 201
+    sensitive_id = response['id']
+    request, response = create_indicator(client, 'URI - Path', '/wp-admin', 'analyst', status='New', substring=True)
+    assert request.status_code == 201
+    request, response = create_indicator(client, 'URI - Path', 'http', 'analyst', status='Analyzed')
+    assert request.status_code == 201
+
+    request = client.post('/api/match', data='Your ACCOUNT SUSPENDED: http://evil.com/wp-admin/Login.php')
+    response = json.loads(request.data.decode())
+    assert request.status_code == 200
+    assert [x['id'] for x in response] == [insensitive_id, sensitive_id]
+
+    request = client.post('/api/match', data='http://evil.com/login.php'.encode('utf-16'),
+                          content_type='text/plain; charset=utf-16')
+    assert json.loads(request.data.decode()) == []
+
+    request = client.post('/api/match', data=b'\xff\xfe/Login.php\x00', content_type='application/octet-stream')
+    assert [x['value'] for x in json.loads(request.data.decode())] == ['/Login.php']
+
+    request = client.post('/api/match', data='asdf', content_type='text/plain; charset=asdf')
+    response = json.loads(request.data.decode())
+    assert request.status_code == 400
+    assert response['msg'] == 'Unknown charset'
+
+    # The next write starts a new generation, so the matcher picks up the new indicator.
+    request, response = create_indicator(client, 'URI - Path', '/evil', 'analyst', status='Analyzed', substring=True)
+    assert request.status_code == 201
+    request = client.post('/api/match', data='http://evil.com/evil')
+    assert [x['id'] for x in json.loads(request.data.decode())] == [response['id']]
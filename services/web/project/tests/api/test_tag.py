@@ -204,6 +204,28 @@ def test_read_all_values(client):
     assert len(response) == 3
 
 
+def test_read_etag(client):
+    """ Ensure unchanged reads return 304 Not Modified until something is written """
+
+    data = {'value': 'asdf'}
+    request = client.post('/api/tags', json=data)
+    assert request.status_code == 201
+
+    request = client.get('/api/tags')
+    etag = request.headers['ETag']
+    request = client.get('/api/tags', headers={'If-None-Match': etag})
+    assert request.status_code == 304
+
+    data = {'value': 'asdf2'}
+    request = client.post('/api/tags', json=data)
+    assert request.status_code == 201
+
+    request = client.get('/api/tags', headers={'If-None-Match': etag})
+    response = json.loads(request.data.decode())
+    assert request.status_code == 200
+    assert len(response) == 2
+
+
 def test_read_by_id(client):
     """ Ensure names can be read by their ID """
 
@@ -1,5 +1,26 @@
 import json
 
+from sqlalchemy import event
+
+from project import db
+
+
+class count_queries:
+    """ Counts the SQL statements executed by the database engine inside of a with block. """
+
+    def __init__(self):
+        self.count = 0
+
+    def _increment(self, *args, **kwargs):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(db.engine, 'before_cursor_execute', self._increment)
+        return self
+
+    def __exit__(self, *args):
+        event.remove(db.engine, 'before_cursor_execute', self._increment)
+
 
 def create_auth_header(apikey):
     return {'Authorization': 'Apikey {}'.format(apikey)}